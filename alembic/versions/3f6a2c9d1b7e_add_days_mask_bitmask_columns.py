@@ -0,0 +1,48 @@
+"""add days_mask bitmask columns to habits and reminders
+
+Revision ID: 3f6a2c9d1b7e
+Revises: 50d4bf2d94bd
+Create Date: 2026-10-17 09:12:41.204511
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6a2c9d1b7e'
+down_revision: Union[str, None] = '50d4bf2d94bd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ALL_DAYS_MASK = 127
+
+
+def _backfill(table: str, column: str) -> None:
+    """Preenche days_mask a partir da coluna texto ("1,2,3") em um único UPDATE"""
+    days_csv = f"(',' || REPLACE({column}, ' ', '') || ',')"
+    bits = " + ".join(
+        f"CASE WHEN {days_csv} LIKE '%,{day},%' THEN {1 << (day - 1)} ELSE 0 END"
+        for day in range(1, 8)
+    )
+    op.execute(
+        f"UPDATE {table} SET days_mask = {bits} "
+        f"WHERE {column} IS NOT NULL AND TRIM({column}) <> ''"
+    )
+
+
+def upgrade() -> None:
+    op.add_column('habits', sa.Column('days_mask', sa.Integer(), nullable=False, server_default=str(ALL_DAYS_MASK)))
+    op.add_column('reminders', sa.Column('days_mask', sa.Integer(), nullable=False, server_default=str(ALL_DAYS_MASK)))
+    op.create_index('ix_habits_user_active', 'habits', ['user_id', 'is_active'], unique=False)
+
+    _backfill('habits', 'days_of_week')
+    _backfill('reminders', 'days')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_habits_user_active', table_name='habits')
+    op.drop_column('reminders', 'days_mask')
+    op.drop_column('habits', 'days_mask')
@@ -0,0 +1,58 @@
+"""add log_date to daily_logs
+
+Revision ID: 8c4e1f7a2d93
+Revises: 3f6a2c9d1b7e
+Create Date: 2026-10-17 10:03:18.552107
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e1f7a2d93'
+down_revision: Union[str, None] = '3f6a2c9d1b7e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _date_expr(column: str) -> str:
+    """Expressão SQL que extrai o dia de um timestamp no dialeto atual"""
+    if op.get_context().dialect.name == "sqlite":
+        return f"DATE({column})"
+    return f"CAST({column} AS DATE)"
+
+
+def upgrade() -> None:
+    op.add_column('daily_logs', sa.Column('log_date', sa.Date(), nullable=True))
+
+    # Backfill: dia da conclusão (ou do registro, para logs antigos) em UTC;
+    # b5d92e0c6a14 passa ao dia local do usuário
+    op.execute(
+        f"UPDATE daily_logs SET log_date = {_date_expr('COALESCE(completed_at, date)')}"
+    )
+    op.execute(
+        f"UPDATE daily_logs SET log_date = {_date_expr('CURRENT_TIMESTAMP')} "
+        "WHERE log_date IS NULL"
+    )
+
+    # Nenhum log é removido aqui: dois logs no mesmo dia UTC podem cair em
+    # dias locais diferentes. A unicidade por dia (uq_daily_log_user_habit_day)
+    # só é criada em b5d92e0c6a14, depois do recálculo no fuso do usuário.
+    with op.batch_alter_table('daily_logs') as batch_op:
+        batch_op.alter_column('log_date', existing_type=sa.Date(), nullable=False)
+        batch_op.drop_constraint('uq_daily_log_user_habit_date', type_='unique')
+
+    op.create_index('ix_daily_logs_user_log_date', 'daily_logs', ['user_id', 'log_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_daily_logs_user_log_date', table_name='daily_logs')
+
+    with op.batch_alter_table('daily_logs') as batch_op:
+        batch_op.create_unique_constraint(
+            'uq_daily_log_user_habit_date', ['user_id', 'habit_id', 'date']
+        )
+        batch_op.drop_column('log_date')
@@ -0,0 +1,190 @@
+"""add timezone to users
+
+Revision ID: b5d92e0c6a14
+Revises: 8c4e1f7a2d93
+Create Date: 2026-10-17 11:26:04.913825
+
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Sequence, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d92e0c6a14'
+down_revision: Union[str, None] = '8c4e1f7a2d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+DEFAULT_TIMEZONE = 'America/Sao_Paulo'
+
+BATCH_SIZE = 1000
+
+# Colunas de daily_logs nesta revisão (copiadas para daily_logs_archive)
+ARCHIVE_COLUMNS = [
+    ('id', sa.Integer()),
+    ('user_id', sa.Integer()),
+    ('habit_id', sa.Integer()),
+    ('completed', sa.Boolean()),
+    ('completed_at', sa.DateTime()),
+    ('xp_earned', sa.Integer()),
+    ('streak_bonus', sa.Integer()),
+    ('notes', sa.Text()),
+    ('mood_rating', sa.Float()),
+    ('energy_rating', sa.Float()),
+    ('craving_level', sa.Integer()),
+    ('date', sa.DateTime()),
+    ('log_date', sa.Date()),
+]
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def _as_datetime(value):
+    # SQLite devolve timestamps como texto em SQL textual
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _date_expr(column: str) -> str:
+    """Expressão SQL que extrai o dia de um timestamp no dialeto atual"""
+    if op.get_context().dialect.name == "sqlite":
+        return f"DATE({column})"
+    return f"CAST({column} AS DATE)"
+
+
+def _rebucket_log_dates(local: bool):
+    """
+    Recalcula log_date como o dia de COALESCE(completed_at, date) no fuso do
+    usuário (``local``) ou em UTC. Roda sem a unicidade por dia, pois os
+    dias mudam em sequência.
+
+    UTC e PostgreSQL (AT TIME ZONE) são SQL puro e funcionam também com
+    ``--sql``; nos demais dialetos o dia local é calculado em Python, lendo
+    os logs em lotes, o que exige conexão.
+    """
+    moment_sql = "COALESCE(completed_at, date)"
+    if not local:
+        op.execute(
+            f"UPDATE daily_logs SET log_date = {_date_expr(moment_sql)} WHERE {moment_sql} IS NOT NULL"
+        )
+        return
+
+    if op.get_context().dialect.name == "postgresql":
+        # Fusos desconhecidos pelo PostgreSQL caem no fuso padrão
+        op.execute(
+            "UPDATE daily_logs AS l SET log_date = CAST("
+            "(COALESCE(l.completed_at, l.date) AT TIME ZONE 'UTC') "
+            f"AT TIME ZONE COALESCE(z.name, '{DEFAULT_TIMEZONE}') AS DATE) "
+            "FROM users u LEFT JOIN pg_timezone_names z ON z.name = u.timezone "
+            "WHERE u.id = l.user_id AND COALESCE(l.completed_at, l.date) IS NOT NULL"
+        )
+        return
+
+    if context.is_offline_mode():
+        logger.warning(
+            "Modo offline: log_date mantido em UTC (o recálculo por fuso "
+            "exige conexão neste dialeto)"
+        )
+        return
+
+    bind = op.get_bind()
+
+    # Percorre os logs em lotes por id (memória limitada a um lote)
+    select_batch = sa.text(
+        "SELECT l.id, COALESCE(l.completed_at, l.date) AS moment, l.log_date, u.timezone "
+        "FROM daily_logs l JOIN users u ON u.id = l.user_id "
+        "WHERE l.id > :last_id ORDER BY l.id LIMIT :limit"
+    )
+    update = sa.text("UPDATE daily_logs SET log_date = :log_date WHERE id = :id")
+    last_id = 0
+    while True:
+        rows = bind.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        changes = []
+        for row in rows:
+            if row.moment is None:
+                continue
+            moment = _as_datetime(row.moment).replace(tzinfo=timezone.utc)
+            day = moment.astimezone(_zone(row.timezone)).date()
+            if str(day) != str(row.log_date):
+                changes.append({"id": row.id, "log_date": day})
+        if changes:
+            bind.execute(update, changes)
+
+
+def _archive_duplicate_logs():
+    """
+    Move para daily_logs_archive os logs que repetem (usuário, hábito, dia
+    local), mantendo o primeiro em daily_logs. Nada é apagado em definitivo:
+    o downgrade devolve os logs arquivados.
+    """
+    op.create_table(
+        'daily_logs_archive',
+        *[sa.Column(name, type_) for name, type_ in ARCHIVE_COLUMNS],
+        sa.Column('archived_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+    columns = ", ".join(name for name, _ in ARCHIVE_COLUMNS)
+    duplicates = (
+        "SELECT id FROM daily_logs WHERE id NOT IN ("
+        "SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM daily_logs "
+        "GROUP BY user_id, habit_id, log_date) AS first_logs)"
+    )
+    op.execute(
+        f"INSERT INTO daily_logs_archive ({columns}) "
+        f"SELECT {columns} FROM daily_logs WHERE id IN ({duplicates})"
+    )
+    op.execute("DELETE FROM daily_logs WHERE id IN (SELECT id FROM daily_logs_archive)")
+
+
+def _restore_archived_logs():
+    """Devolve a daily_logs os logs arquivados por _archive_duplicate_logs"""
+    columns = ", ".join(name for name, _ in ARCHIVE_COLUMNS)
+    op.execute(f"INSERT INTO daily_logs ({columns}) SELECT {columns} FROM daily_logs_archive")
+    op.drop_table('daily_logs_archive')
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('timezone', sa.String(length=50), nullable=False, server_default=DEFAULT_TIMEZONE))
+
+    # Usuários com lembrete configurado herdam o fuso do lembrete
+    op.execute(
+        "UPDATE users SET timezone = (SELECT MIN(r.timezone) FROM reminders r "
+        "WHERE r.user_id = users.id AND r.timezone IS NOT NULL) "
+        "WHERE EXISTS (SELECT 1 FROM reminders r "
+        "WHERE r.user_id = users.id AND r.timezone IS NOT NULL)"
+    )
+
+    # log_date foi preenchido em UTC (8c4e1f7a2d93): passa ao dia local e só
+    # então aplica a unicidade por dia
+    _rebucket_log_dates(local=True)
+    _archive_duplicate_logs()
+    with op.batch_alter_table('daily_logs') as batch_op:
+        batch_op.create_unique_constraint(
+            'uq_daily_log_user_habit_day', ['user_id', 'habit_id', 'log_date']
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('daily_logs') as batch_op:
+        batch_op.drop_constraint('uq_daily_log_user_habit_day', type_='unique')
+    _restore_archived_logs()
+    _rebucket_log_dates(local=False)
+    op.drop_column('users', 'timezone')
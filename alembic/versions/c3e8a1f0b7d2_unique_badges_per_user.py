@@ -0,0 +1,39 @@
+"""unique badge and achievement names per user
+
+Revision ID: c3e8a1f0b7d2
+Revises: f2c8d6b41a97
+Create Date: 2026-10-17 22:10:05.301442
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f0b7d2'
+down_revision: Union[str, None] = 'f2c8d6b41a97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table, constraint in (
+        ('badges', 'uq_badge_user_name'),
+        ('achievements', 'uq_achievement_user_name'),
+    ):
+        # Remove concessões duplicadas (mantém a primeira)
+        op.execute(
+            f"DELETE FROM {table} WHERE id NOT IN ("
+            f"SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM {table} "
+            "GROUP BY user_id, name) AS first_awards)"
+        )
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_unique_constraint(constraint, ['user_id', 'name'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('achievements') as batch_op:
+        batch_op.drop_constraint('uq_achievement_user_name', type_='unique')
+    with op.batch_alter_table('badges') as batch_op:
+        batch_op.drop_constraint('uq_badge_user_name', type_='unique')
@@ -0,0 +1,35 @@
+"""add last_active_date to users
+
+Revision ID: d41a7c3e9f25
+Revises: b5d92e0c6a14
+Create Date: 2026-10-17 12:40:18.207361
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41a7c3e9f25'
+down_revision: Union[str, None] = 'b5d92e0c6a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('last_active_date', sa.Date(), nullable=True))
+
+    # Último dia com conclusão a partir do histórico existente
+    op.execute(
+        "UPDATE users SET last_active_date = (SELECT MAX(l.log_date) FROM daily_logs l "
+        "WHERE l.user_id = users.id AND l.completed = true)"
+    )
+
+    op.create_index('ix_users_timezone_last_active', 'users', ['timezone', 'last_active_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_users_timezone_last_active', table_name='users')
+    op.drop_column('users', 'last_active_date')
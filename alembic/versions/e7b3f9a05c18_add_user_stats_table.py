@@ -0,0 +1,53 @@
+"""add user_stats aggregate table
+
+Revision ID: e7b3f9a05c18
+Revises: d41a7c3e9f25
+Create Date: 2026-10-17 14:05:51.630294
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3f9a05c18'
+down_revision: Union[str, None] = 'd41a7c3e9f25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_habits', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('active_habits', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('total_logs', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('completed_logs', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('total_badges', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('rare_badges', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('completed_today', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('today_date', sa.Date(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Carga inicial a partir das tabelas de origem (contador de hoje começa zerado)
+    op.execute(
+        "INSERT INTO user_stats (user_id, total_habits, active_habits, total_logs, "
+        "completed_logs, total_badges, rare_badges, completed_today) "
+        "SELECT u.id, "
+        "(SELECT COUNT(*) FROM habits h WHERE h.user_id = u.id), "
+        "(SELECT COUNT(*) FROM habits h WHERE h.user_id = u.id AND h.is_active = true), "
+        "(SELECT COUNT(*) FROM daily_logs l WHERE l.user_id = u.id), "
+        "(SELECT COUNT(*) FROM daily_logs l WHERE l.user_id = u.id AND l.completed = true), "
+        "(SELECT COUNT(*) FROM badges b WHERE b.user_id = u.id), "
+        "(SELECT COUNT(*) FROM badges b WHERE b.user_id = u.id AND b.is_rare = true), "
+        "0 FROM users u"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_stats')
@@ -0,0 +1,134 @@
+"""add daily_rollups table
+
+Revision ID: f2c8d6b41a97
+Revises: e7b3f9a05c18
+Create Date: 2026-10-17 15:12:37.518046
+
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Sequence, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8d6b41a97'
+down_revision: Union[str, None] = 'e7b3f9a05c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+DEFAULT_TIMEZONE = 'America/Sao_Paulo'
+
+BATCH_SIZE = 1000
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(DEFAULT_TIMEZONE)
+
+
+def _as_datetime(value):
+    # SQLite devolve timestamps como texto em SQL textual
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _backfill_ratings():
+    """
+    Grava as avaliações no rollup do dia local do usuário (como em
+    ``record_rating_rollup``): a avaliação mais recente do dia prevalece.
+
+    No PostgreSQL é SQL puro (funciona também com ``--sql``); nos demais
+    dialetos o dia local é calculado em Python, o que exige conexão.
+    """
+    if op.get_context().dialect.name == "postgresql":
+        # Fusos desconhecidos pelo PostgreSQL caem no fuso padrão
+        op.execute(
+            "INSERT INTO daily_rollups (user_id, day, completions, xp_earned, mood_rating, energy_rating) "
+            "SELECT DISTINCT ON (user_id, day) user_id, day, 0, 0, mood_rating, energy_rating FROM ("
+            "SELECT r.id, r.user_id, r.mood_rating, r.energy_rating, CAST("
+            "(r.date AT TIME ZONE 'UTC') "
+            f"AT TIME ZONE COALESCE(z.name, '{DEFAULT_TIMEZONE}') AS DATE) AS day "
+            "FROM daily_ratings r JOIN users u ON u.id = r.user_id "
+            "LEFT JOIN pg_timezone_names z ON z.name = u.timezone "
+            "WHERE r.date IS NOT NULL) AS rated "
+            "ORDER BY user_id, day, id DESC "
+            "ON CONFLICT (user_id, day) DO UPDATE SET "
+            "mood_rating = EXCLUDED.mood_rating, energy_rating = EXCLUDED.energy_rating"
+        )
+        return
+
+    if context.is_offline_mode():
+        logger.warning(
+            "Modo offline: avaliações não carregadas em daily_rollups (o "
+            "cálculo do dia local exige conexão neste dialeto)"
+        )
+        return
+
+    bind = op.get_bind()
+    select_batch = sa.text(
+        "SELECT r.id, r.user_id, r.date, r.mood_rating, r.energy_rating, u.timezone "
+        "FROM daily_ratings r JOIN users u ON u.id = r.user_id "
+        "WHERE r.id > :last_id AND r.date IS NOT NULL ORDER BY r.id LIMIT :limit"
+    )
+    update = sa.text(
+        "UPDATE daily_rollups SET mood_rating = :mood, energy_rating = :energy "
+        "WHERE user_id = :user_id AND day = :day"
+    )
+    insert = sa.text(
+        "INSERT INTO daily_rollups (user_id, day, completions, xp_earned, mood_rating, energy_rating) "
+        "VALUES (:user_id, :day, 0, 0, :mood, :energy)"
+    )
+
+    last_id = 0
+    while True:
+        rows = bind.execute(select_batch, {"last_id": last_id, "limit": BATCH_SIZE}).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        latest = {}
+        for row in rows:
+            moment = _as_datetime(row.date).replace(tzinfo=timezone.utc)
+            day = moment.astimezone(_zone(row.timezone)).date()
+            latest[(row.user_id, day)] = (row.mood_rating, row.energy_rating)
+
+        for (user_id, day), (mood, energy) in latest.items():
+            params = {"user_id": user_id, "day": day, "mood": mood, "energy": energy}
+            if not bind.execute(update, params).rowcount:
+                bind.execute(insert, params)
+
+
+def upgrade() -> None:
+    op.create_table('daily_rollups',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('completions', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('xp_earned', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('mood_rating', sa.Float(), nullable=True),
+    sa.Column('energy_rating', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+    # Carga inicial: conclusões por dia local (log_date) + avaliações no
+    # dia local do usuário
+    op.execute(
+        "INSERT INTO daily_rollups (user_id, day, completions, xp_earned) "
+        "SELECT user_id, log_date, COUNT(*), COALESCE(SUM(xp_earned), 0) "
+        "FROM daily_logs WHERE completed = true GROUP BY user_id, log_date"
+    )
+    _backfill_ratings()
+
+
+def downgrade() -> None:
+    op.drop_table('daily_rollups')
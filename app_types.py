@@ -2,7 +2,8 @@
 Tipos e enums para o HabitBot
 """
 
-from typing import TypedDict, Protocol, Literal, Union, Optional
+from dataclasses import dataclass
+from typing import TypedDict, Protocol, Optional
 from enum import Enum
 from datetime import datetime
 
@@ -62,6 +63,65 @@ class HabitData(TypedDict):
     created_at: datetime
 
 
+@dataclass(frozen=True, slots=True)
+class HabitRecord:
+    """
+    Registro imutável de um hábito, desacoplado da sessão do SQLAlchemy.
+
+    É o que o repositório guarda no cache: acesso a atributos nunca dispara
+    lazy load nem DetachedInstanceError, e ``__slots__`` reduz a memória por
+    item em relação à instância ORM.
+    """
+    id: int
+    name: str
+    description: Optional[str]
+    category: Optional[str]
+    xp_reward: int
+    is_active: bool
+    current_streak: int
+    longest_streak: int
+    total_completions: int
+    days_of_week: Optional[str]
+    days_mask: int
+    time_minutes: Optional[int]
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_orm(cls, habit) -> "HabitRecord":
+        """Cria o registro a partir de uma instância ``models.Habit``"""
+        return cls(**{field: getattr(habit, field) for field in cls.__dataclass_fields__})
+
+    def to_dict(self) -> HabitData:
+        """Converte para o formato ``HabitData``"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "xp_reward": self.xp_reward,
+            "is_active": self.is_active,
+            "current_streak": self.current_streak,
+            "longest_streak": self.longest_streak,
+            "total_completions": self.total_completions,
+            "created_at": self.created_at,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class LevelInfo:
+    """Nível de um total de XP e o progresso dentro dele"""
+    level: int
+    xp_into_level: int  # XP acumulado dentro do nível atual
+    xp_for_level: int  # XP total do nível atual (até o próximo)
+
+    @property
+    def xp_to_next_level(self) -> int:
+        return self.xp_for_level - self.xp_into_level
+
+    @property
+    def progress(self) -> float:
+        """Percentual do nível atual já concluído"""
+        return (self.xp_into_level / self.xp_for_level * 100) if self.xp_for_level else 0
+
+
 class ReminderData(TypedDict):
     """Dados de um lembrete"""
     id: int
@@ -94,7 +154,7 @@ class DailyProgress(TypedDict):
 class RepositoryProtocol(Protocol):
     """Protocolo para repositórios"""
     
-    def get_habits(self, user_id: int, active_only: bool = True) -> list[HabitData]:
+    def get_habits(self, user_id: int, active_only: bool = True) -> list[HabitRecord]:
         """Busca hábitos do usuário"""
         ...
     
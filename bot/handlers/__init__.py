@@ -10,7 +10,11 @@ from .commands import (
     dashboard_command,
     rating_command,
     weekly_command,
+    monthly_command,
+    insights_command,
+    report_command,
     habits_command,
+    timezone_command,
 )
 from .crud import (
     add_habit_command,
@@ -54,7 +58,11 @@ __all__ = [
     "dashboard_command",
     "rating_command",
     "weekly_command",
+    "monthly_command",
+    "insights_command",
+    "report_command",
     "habits_command",
+    "timezone_command",
     "add_habit_command",
     "edit_habit_command",
     "delete_habit_command",
@@ -4,12 +4,15 @@ Handlers base e utilitários
 
 import asyncio
 import functools
+import time
 from typing import Callable, Any
 from telegram import Update
 from telegram.ext import ContextTypes
-from utils.observability import log_event, log_error
-from utils.idempotency import is_duplicate_callback
-from utils.rate_limit import rate_limited
+from utils.observability import increment_metric, log_event, log_error, observe_metric
+from utils.query_tracking import track_queries
+from utils.tracing import SPAN_KIND_SERVER, start_span
+from utils.idempotency import is_duplicate_callback_async
+from utils.rate_limit import rate_limited_async
 from utils.branding import get_error_message_with_branding
 from utils.logging_config import get_logger
 
@@ -24,6 +27,7 @@ def safe_handler(func: Callable) -> Callable:
         user = update.effective_user
         user_id = user.id if user else "unknown"
         command = func.__name__
+        started = time.perf_counter()
         
         try:
             # Log início do comando
@@ -33,8 +37,12 @@ def safe_handler(func: Callable) -> Callable:
                 "chat_type": update.effective_chat.type if update.effective_chat else None
             })
             
-            # Executa handler
-            result = await func(update, context)
+            # Executa handler (span raiz do update; consultas SQL atribuídas a ele)
+            attributes = {"handler": command, "user.id": user_id}
+            with start_span(f"handler {command}", SPAN_KIND_SERVER, attributes), track_queries(command):
+                result = await func(update, context)
+            
+            observe_metric("handler_latency_ms", (time.perf_counter() - started) * 1000, handler=command)
             
             # Log sucesso
             log_event("command_success", {
@@ -45,6 +53,8 @@ def safe_handler(func: Callable) -> Callable:
             return result
             
         except Exception as e:
+            increment_metric("handler_errors", handler=command)
+            
             # Log erro
             log_error(e, {
                 "user_id": user_id,
@@ -73,8 +83,8 @@ def track_command(command_name: str) -> Callable:
             user = update.effective_user
             user_id = user.id if user else "unknown"
             
-            # Rate limiting
-            if rate_limited(f"{command_name}:{user_id}", 1):
+            # Rate limiting (Redis consultado fora do event loop)
+            if await rate_limited_async(f"{command_name}:{user_id}", 1):
                 await update.message.reply_text(
                     get_error_message_with_branding("rate_limit"),
                     parse_mode="Markdown"
@@ -84,12 +94,22 @@ def track_command(command_name: str) -> Callable:
             # Idempotência para callbacks
             if update.callback_query:
                 callback_id = update.callback_query.id
-                if is_duplicate_callback(callback_id):
+                if await is_duplicate_callback_async(callback_id):
                     await update.callback_query.answer("Comando já processado")
                     return
             
             # Executa comando
-            return await func(update, context)
+            started = time.perf_counter()
+            status = "error"
+            try:
+                attributes = {"command": command_name, "user.id": user_id}
+                with start_span(f"command {command_name}", SPAN_KIND_SERVER, attributes), track_queries(command_name):
+                    result = await func(update, context)
+                status = "success"
+                return result
+            finally:
+                increment_metric("commands_executed", command=command_name, status=status)
+                observe_metric("command_latency_ms", (time.perf_counter() - started) * 1000, command=command_name)
         
         return wrapper
     return decorator
@@ -5,17 +5,21 @@ Handlers para callbacks inline
 from functools import partial
 from telegram import Update
 from telegram.ext import ContextTypes
-from db.session import get_db
-from models.models import User, Habit, DailyLog, DailyRating
+from db.session import run_db
+from models.models import User, DailyRating
 from utils.gamification import (
-    calculate_xp_earned,
-    update_user_progress,
+    complete_habit,
+    complete_habits,
+    create_daily_rating,
     get_user_stats,
     get_daily_progress,
     get_motivational_message,
 )
 from utils.branding import add_branding, get_success_message_with_branding
+from utils.day_boundary import user_day_by_id
+from utils.formatters import format_new_badges
 from utils.idempotency import is_duplicate_callback
+from utils.snapshot import get_today_snapshot
 from utils.keyboards import (
     create_habit_edit_keyboard,
     create_reminder_config_keyboard,
@@ -30,6 +34,24 @@ from app_types import CallbackAction
 from .base import safe_handler
 
 
+def _register_habit_completion(db, callback_id: str, telegram_user_id: int, habit_id: int):
+    """Registra a conclusão de um hábito (síncrono, executado fora do event loop)"""
+    # ✅ ADICIONAR IDEMPOTÊNCIA
+    if is_duplicate_callback(callback_id, db):
+        return {"status": "duplicate"}
+
+    # Busca usuário
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return {"status": "user_not_found"}
+
+    result = complete_habit(db, db_user_id, habit_id)
+    if not result["success"]:
+        return {"status": "failed", "message": result["message"]}
+
+    return {"status": "completed", **result}
+
+
 async def _complete_habit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Callback para completar um hábito"""
     query = update.callback_query
@@ -41,89 +63,64 @@ async def _complete_habit_callback(update: Update, context: ContextTypes.DEFAULT
         habit_id = callback_data["habit_id"]
         user_id = query.from_user.id
         
-        db = next(get_db())
+        result = await run_db(_register_habit_completion, query.id, user_id, habit_id)
         
-        try:
-            # ✅ ADICIONAR IDEMPOTÊNCIA
-            if is_duplicate_callback(query.id, db):
-                await query.edit_message_text("Comando já processado")
-                return
-            
-            # Busca usuário e hábito
-            db_user = db.query(User).filter(User.telegram_user_id == user_id).first()
-            if not db_user:
-                await query.edit_message_text("❌ Usuário não encontrado.")
-                return
-            
-            habit = db.query(Habit).filter(
-                Habit.id == habit_id,
-                Habit.user_id == db_user.id,
-                Habit.is_active == True
-            ).first()
-            
-            if not habit:
-                await query.edit_message_text("❌ Hábito não encontrado.")
-                return
-            
-            # Verifica se já foi completado hoje
-            from datetime import date
-            today = date.today()
-            
-            existing_log = db.query(DailyLog).filter(
-                DailyLog.user_id == db_user.id,
-                DailyLog.habit_id == habit_id,
-                DailyLog.completed_at >= today
-            ).first()
-            
-            if existing_log:
-                await query.edit_message_text("✅ Este hábito já foi completado hoje!")
-                return
-            
-            # Registra conclusão
-            xp_earned = calculate_xp_earned(habit.xp_reward, habit.current_streak)
-            
-            log = DailyLog(
-                user_id=db_user.id,
-                habit_id=habit_id,
-                xp_earned=xp_earned
-            )
-            db.add(log)
-            
-            # Atualiza progresso do usuário
-            update_user_progress(db, db_user.id, habit_id, xp_earned)
-            
-            # Atualiza streak do hábito
-            habit.current_streak += 1
-            habit.total_completions += 1
-            if habit.current_streak > habit.longest_streak:
-                habit.longest_streak = habit.current_streak
-            
-            db.commit()
-            
-            # Mensagem de sucesso
-            success_message = f"""
+        if result["status"] == "duplicate":
+            await query.edit_message_text("Comando já processado")
+            return
+        if result["status"] == "user_not_found":
+            await query.edit_message_text("❌ Usuário não encontrado.")
+            return
+        if result["status"] == "failed":
+            await query.edit_message_text(f"❌ {result['message']}")
+            return
+        
+        # Mensagem de sucesso
+        success_message = f"""
 ✅ *Hábito Completado!*
 
-🎯 **{habit.name}**
-⭐ +{xp_earned} XP ganho
-🔥 Streak: {habit.current_streak} dias
-📊 Total: {habit.total_completions} vezes
-
+🎯 **{result['habit_name']}**
+⭐ +{result['xp_earned']} XP ganho
+🔥 Streak: {result['current_streak']} dias
+📊 Total: {result['total_completions']} vezes
+{format_new_badges(result.get('new_badges'))}
 {get_motivational_message('habit_completed')}
 """
-            
-            await query.edit_message_text(
-                add_branding(success_message),
-                parse_mode="Markdown"
-            )
-            
-        finally:
-            db.close()
+        
+        await query.edit_message_text(
+            add_branding(success_message),
+            parse_mode="Markdown"
+        )
     
     except Exception as e:
         await query.edit_message_text(f"❌ Erro: {str(e)}")
 
 
+# Botões da avaliação do dia (1-4) na escala de humor/energia (1-10)
+DAY_RATING_SCALE = {1: 2.5, 2: 5.0, 3: 7.5, 4: 10.0}
+
+
+def _save_day_rating(db, telegram_user_id: int, rating_value: int):
+    """Registra ou atualiza a avaliação do dia (síncrono); None se o usuário não existir"""
+    # Busca usuário
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return None
+    
+    # Verifica se já avaliou hoje (dia local do usuário)
+    window = user_day_by_id(db, db_user_id)
+    already_rated = db.query(DailyRating.id).filter(
+        DailyRating.user_id == db_user_id,
+        DailyRating.date >= window.start,
+        DailyRating.date < window.end
+    ).first() is not None
+    
+    score = DAY_RATING_SCALE.get(rating_value, DAY_RATING_SCALE[2])
+    create_daily_rating(db, db_user_id, mood_rating=score, energy_rating=score)
+    
+    return "⭐ Avaliação atualizada!" if already_rated else "⭐ Avaliação registrada!"
+
+
 async def _rating_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Callback para avaliar o dia"""
     query = update.callback_query
@@ -135,45 +132,16 @@ async def _rating_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         rating_value = int(callback_data["extra"])
         user_id = query.from_user.id
         
-        db = next(get_db())
+        message = await run_db(_save_day_rating, user_id, rating_value)
+        if message is None:
+            await query.edit_message_text("❌ Usuário não encontrado.")
+            return
         
-        try:
-            # Busca usuário
-            db_user = db.query(User).filter(User.telegram_user_id == user_id).first()
-            if not db_user:
-                await query.edit_message_text("❌ Usuário não encontrado.")
-                return
-            
-            # Verifica se já avaliou hoje
-            from datetime import date
-            today = date.today()
-            
-            existing_rating = db.query(DailyRating).filter(
-                DailyRating.user_id == db_user.id,
-                DailyRating.rating_date == today
-            ).first()
-            
-            if existing_rating:
-                existing_rating.rating = rating_value
-                message = "⭐ Avaliação atualizada!"
-            else:
-                rating = DailyRating(
-                    user_id=db_user.id,
-                    rating=rating_value
-                )
-                db.add(rating)
-                message = "⭐ Avaliação registrada!"
-            
-            db.commit()
-            
-            # Emojis para cada rating
-            emojis = {1: "😞", 2: "😐", 3: "😊", 4: "🤩"}
-            emoji = emojis.get(rating_value, "⭐")
-            
-            await query.edit_message_text(f"{emoji} {message}")
-            
-        finally:
-            db.close()
+        # Emojis para cada rating
+        emojis = {1: "😞", 2: "😐", 3: "😊", 4: "🤩"}
+        emoji = emojis.get(rating_value, "⭐")
+        
+        await query.edit_message_text(f"{emoji} {message}")
     
     except Exception as e:
         await query.edit_message_text(f"❌ Erro: {str(e)}")
@@ -191,27 +159,19 @@ async def _show_progress_callback(update: Update, context: ContextTypes.DEFAULT_
     
     print(f"📝 Callback data: {callback_data}")
     
-    db = next(get_db())
+    # Snapshot do dia: navegação entre as telas não consulta o banco
+    snapshot = await get_today_snapshot(user_id)
+    if snapshot is None:
+        await query.edit_message_text("❌ Usuário não encontrado.")
+        return
     
-    try:
-        # Busca usuário
-        db_user = db.query(User).filter(User.telegram_user_id == user_id).first()
-        if not db_user:
-            await query.edit_message_text("❌ Usuário não encontrado.")
-            return
-        
-        # Busca estatísticas
-        from utils.gamification import get_user_stats
-        stats = get_user_stats(db, db_user.id)
-        
-        # Busca progresso diário
-        from utils.gamification import get_daily_progress
-        progress = get_daily_progress(db, db_user.id)
-        
-        # Determina o tipo de progresso baseado no callback
-        if callback_data == "show_progress":
-            # Mostra menu de opções
-            message = f"""
+    stats = snapshot.to_stats()
+    progress = snapshot.to_progress()
+    
+    # Determina o tipo de progresso baseado no callback
+    if callback_data == "show_progress":
+        # Mostra menu de opções
+        message = f"""
 📊 *Progresso Detalhado*
 
 🎯 **Hoje**:
@@ -221,6 +181,7 @@ async def _show_progress_callback(update: Update, context: ContextTypes.DEFAULT_
 🏆 **Geral**:
 • Nível: {stats['current_level']}
 • XP Total: {stats['total_xp_earned']:,}
+• Próximo nível: faltam {stats['xp_to_next_level']:,} XP ({stats['level_progress']:.0f}%)
 • Streak: {stats['current_streak']} dias
 • Melhor Streak: {stats['longest_streak']} dias
 
@@ -230,11 +191,11 @@ async def _show_progress_callback(update: Update, context: ContextTypes.DEFAULT_
 
 Escolha o que você quer visualizar:
 """
-            keyboard = create_progress_keyboard()
-        
-        elif callback_data == "progress_today":
-            # Mostra progresso de hoje
-            message = f"""
+        keyboard = create_progress_keyboard()
+    
+    elif callback_data == "progress_today":
+        # Mostra progresso de hoje
+        message = f"""
 📊 *Progresso de Hoje*
 
 🎯 **Status Atual**:
@@ -248,38 +209,45 @@ Escolha o que você quer visualizar:
 🔥 **Motivação**:
 {progress.get('motivation', 'Continue assim! Você está no caminho certo!')}
 """
-            keyboard = create_navigation_keyboard()
+        keyboard = create_navigation_keyboard()
+    
+    elif callback_data == "progress_week":
+        # Mostra progresso da semana
+        from utils.gamification import get_weekly_summary
+        weekly = await run_db(get_weekly_summary, snapshot.user_id)
         
-        elif callback_data == "progress_week":
-            # Mostra progresso da semana
-            from utils.gamification import get_weekly_summary
-            weekly = get_weekly_summary(db, db_user.id)
-            
-            if weekly:
-                success_rate = (weekly['total_completed'] / len(weekly['week_logs']) * 100) if weekly['week_logs'] else 0
-                message = f"""
+        if weekly:
+            message = f"""
 📅 *Progresso da Semana*
 
 📊 **Esta semana**:
 • Hábitos completados: {weekly['total_completed']}
 • Dias ativos: {weekly['active_days']}/7
-• Taxa de sucesso: {success_rate:.1f}%
+• Taxa de sucesso: {weekly['success_rate']:.1f}%
 • XP ganho: {weekly['total_xp_earned']}
 
 ⭐ **Avaliações médias**:
 • Humor: {weekly['avg_mood']}/10
 • Energia: {weekly['avg_energy']}/10
 """
-            else:
-                message = "📅 *Progresso da Semana*\n\nNenhum dado disponível para esta semana."
-            
-            keyboard = create_navigation_keyboard()
+        else:
+            message = "📅 *Progresso da Semana*\n\nNenhum dado disponível para esta semana."
         
-        elif callback_data == "progress_month":
-            # Mostra progresso do mês
-            message = f"""
+        keyboard = create_navigation_keyboard()
+    
+    elif callback_data == "progress_month":
+        # Mostra progresso do mês
+        from utils.gamification import get_monthly_summary
+        monthly = await run_db(get_monthly_summary, snapshot.user_id)
+        
+        message = f"""
 📈 *Progresso do Mês*
 
+📅 **Últimos 30 dias**:
+• Hábitos completados: {monthly['total_completed']}
+• Dias ativos: {monthly['active_days']}/30
+• XP ganho: {monthly['total_xp_earned']:,}
+
 🏆 **Resumo mensal**:
 • Nível atual: {stats['current_level']}
 • XP total: {stats['total_xp_earned']:,}
@@ -291,14 +259,14 @@ Escolha o que você quer visualizar:
 • Dias desde início: {stats['days_since_start']}
 • Hábitos ativos: {stats['active_habits']}
 """
-            keyboard = create_navigation_keyboard()
+        keyboard = create_navigation_keyboard()
+    
+    elif callback_data.startswith("help_"):
+        # Callbacks de ajuda
+        help_type = callback_data.replace("help_", "")
         
-        elif callback_data.startswith("help_"):
-            # Callbacks de ajuda
-            help_type = callback_data.replace("help_", "")
-            
-            if help_type == "how_it_works":
-                message = """
+        if help_type == "how_it_works":
+            message = """
 🎯 *Como Funciona*
 
 O HabitBot é seu assistente pessoal para criar e manter hábitos saudáveis!
@@ -320,8 +288,8 @@ O HabitBot é seu assistente pessoal para criar e manter hábitos saudáveis!
 • Suba de nível e desbloqueie conquistas
 • Receba mensagens motivacionais
 """
-            elif help_type == "commands":
-                message = """
+        elif help_type == "commands":
+            message = """
 📝 *Comandos Disponíveis*
 
 **Comandos principais:**
@@ -342,8 +310,8 @@ O HabitBot é seu assistente pessoal para criar e manter hábitos saudáveis!
 • `/health` - Status do bot
 • `/backup` - Backup dos dados
 """
-            elif help_type == "achievements":
-                message = """
+        elif help_type == "achievements":
+            message = """
 🏆 *Conquistas*
 
 **Conquistas disponíveis:**
@@ -363,8 +331,8 @@ O HabitBot é seu assistente pessoal para criar e manter hábitos saudáveis!
 • Mês perfeito
 • Nível máximo
 """
-            elif help_type == "streaks":
-                message = """
+        elif help_type == "streaks":
+            message = """
 🔥 *Sistema de Streaks*
 
 **Como funcionam:**
@@ -384,8 +352,8 @@ O HabitBot é seu assistente pessoal para criar e manter hábitos saudáveis!
 • Complete pelo menos 1 hábito por dia
 • Use lembretes para não esquecer
 """
-            elif help_type == "settings":
-                message = """
+        elif help_type == "settings":
+            message = """
 ⚙️ *Configurações*
 
 **Configurações disponíveis:**
@@ -405,8 +373,8 @@ O HabitBot é seu assistente pessoal para criar e manter hábitos saudáveis!
 • Ajuste dificuldade
 • Personalize XP
 """
-            elif help_type == "faq":
-                message = """
+        elif help_type == "faq":
+            message = """
 ❓ *Perguntas Frequentes*
 
 **Q: Como criar um hábito?**
@@ -424,27 +392,24 @@ A: Use "Lembretes" no menu
 **Q: Como resetar meu progresso?**
 A: Entre em contato com o suporte
 """
-            else:
-                message = "❓ *Ajuda*\n\nEscolha uma opção para obter ajuda."
-            
-            keyboard = create_navigation_keyboard()
-        
         else:
-            # Fallback para outros callbacks
-            message = "📊 *Progresso*\n\nEscolha uma opção para visualizar seu progresso."
-            keyboard = create_progress_keyboard()
-        
-        print(f"📤 Enviando mensagem de progresso: {callback_data}")
+            message = "❓ *Ajuda*\n\nEscolha uma opção para obter ajuda."
         
-        await query.edit_message_text(
-            add_branding(message),
-            parse_mode="Markdown",
-            reply_markup=keyboard
-        )
-        print(f"✅ Mensagem de progresso enviada com sucesso!")
+        keyboard = create_navigation_keyboard()
     
-    finally:
-        db.close()
+    else:
+        # Fallback para outros callbacks
+        message = "📊 *Progresso*\n\nEscolha uma opção para visualizar seu progresso."
+        keyboard = create_progress_keyboard()
+    
+    print(f"📤 Enviando mensagem de progresso: {callback_data}")
+    
+    await query.edit_message_text(
+        add_branding(message),
+        parse_mode="Markdown",
+        reply_markup=keyboard
+    )
+    print(f"✅ Mensagem de progresso enviada com sucesso!")
 
 
 async def _edit_habit_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -458,18 +423,15 @@ async def _edit_habit_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         habit_id = callback_data["habit_id"]
         user_id = query.from_user.id
         
-        db = next(get_db())
+        # Busca hábito
+        from utils.repository import HabitRepository
+        habit = await run_db(HabitRepository.get_habit, habit_id, user_id)
         
-        try:
-            # Busca hábito
-            from utils.repository import HabitRepository
-            habit = HabitRepository.get_habit(db, habit_id, user_id)
-            
-            if not habit:
-                await query.edit_message_text("❌ Hábito não encontrado.")
-                return
-            
-            message = f"""
+        if not habit:
+            await query.edit_message_text("❌ Hábito não encontrado.")
+            return
+        
+        message = f"""
 ✏️ *Editar Hábito*
 
 🎯 **{habit.name}**
@@ -479,17 +441,14 @@ async def _edit_habit_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 
 Escolha uma opção:
 """
-            
-            keyboard = create_habit_edit_keyboard(habit_id, habit.is_active)
-            
-            await query.edit_message_text(
-                add_branding(message),
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
-            
-        finally:
-            db.close()
+        
+        keyboard = create_habit_edit_keyboard(habit_id, habit.is_active)
+        
+        await query.edit_message_text(
+            add_branding(message),
+            reply_markup=keyboard,
+            parse_mode="Markdown"
+        )
     
     except Exception as e:
         await query.edit_message_text(f"❌ Erro: {str(e)}")
@@ -506,18 +465,15 @@ async def _delete_habit_callback(update: Update, context: ContextTypes.DEFAULT_T
         habit_id = callback_data["habit_id"]
         user_id = query.from_user.id
         
-        db = next(get_db())
+        # Busca hábito
+        from utils.repository import HabitRepository
+        habit = await run_db(HabitRepository.get_habit, habit_id, user_id)
         
-        try:
-            # Busca hábito
-            from utils.repository import HabitRepository
-            habit = HabitRepository.get_habit(db, habit_id, user_id)
-            
-            if not habit:
-                await query.edit_message_text("❌ Hábito não encontrado.")
-                return
-            
-            message = f"""
+        if not habit:
+            await query.edit_message_text("❌ Hábito não encontrado.")
+            return
+        
+        message = f"""
 🗑️ *Confirmar Exclusão*
 
 Tem certeza que deseja deletar o hábito:
@@ -526,22 +482,28 @@ Tem certeza que deseja deletar o hábito:
 
 Esta ação não pode ser desfeita.
 """
-            
-            keyboard = create_delete_confirmation_keyboard(habit_id)
-            
-            await query.edit_message_text(
-                add_branding(message),
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
-            
-        finally:
-            db.close()
+        
+        keyboard = create_delete_confirmation_keyboard(habit_id)
+        
+        await query.edit_message_text(
+            add_branding(message),
+            reply_markup=keyboard,
+            parse_mode="Markdown"
+        )
     
     except Exception as e:
         await query.edit_message_text(f"❌ Erro: {str(e)}")
 
 
+def _load_reminder_config(db, habit_id: int, telegram_user_id: int):
+    """Busca o hábito e se já existe lembrete para ele (síncrono)"""
+    from utils.repository import HabitRepository, ReminderRepository
+    habit = HabitRepository.get_habit(db, habit_id, telegram_user_id)
+    if not habit:
+        return None, False
+    return habit, ReminderRepository.get_reminder(db, telegram_user_id, habit_id) is not None
+
+
 async def _set_reminder_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Callback para configurar lembrete"""
     query = update.callback_query
@@ -553,39 +515,28 @@ async def _set_reminder_callback(update: Update, context: ContextTypes.DEFAULT_T
         habit_id = callback_data["habit_id"]
         user_id = query.from_user.id
         
-        db = next(get_db())
+        # Busca hábito e verifica se já tem lembrete
+        habit, has_reminder = await run_db(_load_reminder_config, habit_id, user_id)
         
-        try:
-            # Busca hábito
-            from utils.repository import HabitRepository
-            habit = HabitRepository.get_habit(db, habit_id, user_id)
-            
-            if not habit:
-                await query.edit_message_text("❌ Hábito não encontrado.")
-                return
-            
-            # Verifica se já tem lembrete
-            from utils.repository import ReminderRepository
-            existing_reminder = ReminderRepository.get_reminder(db, user_id, habit_id)
-            
-            message = f"""
+        if not habit:
+            await query.edit_message_text("❌ Hábito não encontrado.")
+            return
+        
+        message = f"""
 ⏰ *Configurar Lembrete*
 
 🎯 **{habit.name}**
 
 Escolha uma opção:
 """
-            
-            keyboard = create_reminder_config_keyboard(habit_id, existing_reminder is not None)
-            
-            await query.edit_message_text(
-                add_branding(message),
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
-            
-        finally:
-            db.close()
+        
+        keyboard = create_reminder_config_keyboard(habit_id, has_reminder)
+        
+        await query.edit_message_text(
+            add_branding(message),
+            reply_markup=keyboard,
+            parse_mode="Markdown"
+        )
     
     except Exception as e:
         await query.edit_message_text(f"❌ Erro: {str(e)}")
@@ -631,6 +582,15 @@ async def toggle_complete_habit_callback(update: Update, context: ContextTypes.D
         await query.edit_message_text(f"❌ Erro: {str(e)}")
 
 
+def _complete_selected_habits(db, telegram_user_id: int, habit_ids: list[int]):
+    """Completa em lote os hábitos selecionados na tabela (síncrono)"""
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return None
+    
+    return complete_habits(db, db_user_id, habit_ids)
+
+
 @safe_handler
 async def confirm_selection_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Callback para confirmar seleção de hábitos"""
@@ -645,101 +605,49 @@ async def confirm_selection_callback(update: Update, context: ContextTypes.DEFAU
             await query.edit_message_text("❌ Nenhum hábito selecionado!")
             return
         
-        db = next(get_db())
+        result = await run_db(_complete_selected_habits, user_id, selected_habits)
+        if result is None:
+            await query.edit_message_text("❌ Usuário não encontrado.")
+            return
         
-        try:
-            # Busca usuário
-            db_user = db.query(User).filter(User.telegram_user_id == user_id).first()
-            if not db_user:
-                await query.edit_message_text("❌ Usuário não encontrado.")
-                return
-            
-            total_xp_earned = 0
-            completed_habits = []
-            
-            # Completa cada hábito selecionado
-            for habit_id in selected_habits:
-                habit = db.query(Habit).filter(
-                    Habit.id == habit_id,
-                    Habit.user_id == db_user.id,
-                    Habit.is_active == True
-                ).first()
-                
-                if habit:
-                    # Verifica se já foi completado hoje
-                    from datetime import date
-                    today = date.today()
-                    
-                    existing_log = db.query(DailyLog).filter(
-                        DailyLog.user_id == db_user.id,
-                        DailyLog.habit_id == habit_id,
-                        DailyLog.completed_at >= today
-                    ).first()
-                    
-                    if not existing_log:
-                        # Registra conclusão
-                        xp_earned = calculate_xp_earned(habit.xp_reward, habit.current_streak)
-                        
-                        log = DailyLog(
-                            user_id=db_user.id,
-                            habit_id=habit_id,
-                            xp_earned=xp_earned
-                        )
-                        db.add(log)
-                        
-                        # Atualiza progresso do usuário
-                        update_user_progress(db, db_user.id, habit_id, xp_earned)
-                        
-                        # Atualiza streak do hábito
-                        habit.current_streak += 1
-                        habit.total_completions += 1
-                        if habit.current_streak > habit.longest_streak:
-                            habit.longest_streak = habit.current_streak
-                        
-                        total_xp_earned += xp_earned
-                        completed_habits.append(habit.name)
-            
-            db.commit()
-            
-            # Mensagem de sucesso
-            if completed_habits:
-                success_message = f"""
+        completed_habits = [item["habit_name"] for item in result["completed"]]
+        
+        # Mensagem de sucesso
+        if completed_habits:
+            success_message = f"""
 ✅ *Hábitos Completados com Sucesso!*
 
 **Hábitos completados:**
 {chr(10).join([f"• {name}" for name in completed_habits])}
 
-**💎 XP Ganho:** +{total_xp_earned} XP
-**📊 Total XP:** {db_user.total_xp_earned:,} XP
-**🏆 Nível:** {db_user.current_level}
-
+**💎 XP Ganho:** +{result['xp_earned']} XP
+**📊 Total XP:** {result['new_total_xp']:,} XP
+**🏆 Nível:** {result['new_level']}
+{format_new_badges(result.get('new_badges'))}
 Parabéns! Continue assim! 🚀
 
 ⏰ Menu principal em 5 segundos...
 """
-                
-                await query.edit_message_text(
-                    add_branding(success_message),
-                    parse_mode="Markdown"
-                )
-                
-                # Limpa seleção
-                context.user_data.pop('selected_habits', None)
-                
-                # Após 5 segundos, mostra menu principal
-                import asyncio
-                await asyncio.sleep(5)
-                
-                await query.edit_message_text(
-                    add_branding("🎯 *Menu Principal*\n\nEscolha uma opção:"),
-                    parse_mode="Markdown",
-                    reply_markup=create_main_menu_keyboard()
-                )
-            else:
-                await query.edit_message_text("❌ Nenhum hábito foi completado!")
-                
-        finally:
-            db.close()
+            
+            await query.edit_message_text(
+                add_branding(success_message),
+                parse_mode="Markdown"
+            )
+            
+            # Limpa seleção
+            context.user_data.pop('selected_habits', None)
+            
+            # Após 5 segundos, mostra menu principal
+            import asyncio
+            await asyncio.sleep(5)
+            
+            await query.edit_message_text(
+                add_branding("🎯 *Menu Principal*\n\nEscolha uma opção:"),
+                parse_mode="Markdown",
+                reply_markup=create_main_menu_keyboard()
+            )
+        else:
+            await query.edit_message_text("❌ Nenhum hábito foi completado!")
         
     except Exception as e:
         await query.edit_message_text(f"❌ Erro: {str(e)}")
@@ -774,18 +682,15 @@ async def edit_habit_full_callback(update: Update, context: ContextTypes.DEFAULT
         habit_id = int(query.data.split('_')[-1])
         user_id = query.from_user.id
         
-        db = next(get_db())
+        # Busca hábito
+        from utils.repository import HabitRepository
+        habit = await run_db(HabitRepository.get_habit, habit_id, user_id)
         
-        try:
-            # Busca hábito
-            from utils.repository import HabitRepository
-            habit = HabitRepository.get_habit(db, habit_id, user_id)
-            
-            if not habit:
-                await query.edit_message_text("❌ Hábito não encontrado.")
-                return
-            
-            message = f"""
+        if not habit:
+            await query.edit_message_text("❌ Hábito não encontrado.")
+            return
+        
+        message = f"""
 ✏️ *Editar Hábito*
 
 🎯 **{habit.name}**
@@ -797,17 +702,14 @@ async def edit_habit_full_callback(update: Update, context: ContextTypes.DEFAULT
 
 Escolha o que deseja editar:
 """
-            
-            keyboard = create_habit_edit_keyboard(habit_id)
-            
-            await query.edit_message_text(
-                add_branding(message),
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
-            
-        finally:
-            db.close()
+        
+        keyboard = create_habit_edit_keyboard(habit_id)
+        
+        await query.edit_message_text(
+            add_branding(message),
+            reply_markup=keyboard,
+            parse_mode="Markdown"
+        )
     
     except Exception as e:
         await query.edit_message_text(f"❌ Erro: {str(e)}")
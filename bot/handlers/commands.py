@@ -5,16 +5,20 @@ Handlers para comandos principais
 from functools import partial
 from telegram import Update
 from telegram.ext import ContextTypes
-from db.session import get_db
+from config import ADMIN_USER_IDS
+from db.session import run_db
 from models.models import User, Habit, DailyLog
 from utils.gamification import (
     calculate_xp_earned,
     update_user_progress,
     get_user_stats,
-    get_daily_progress,
     get_weekly_summary,
+    get_monthly_summary,
     get_motivational_message,
 )
+from utils.analytics import WEEKDAY_NAMES, global_report, user_insights
+from utils.day_boundary import is_valid_timezone, set_user_timezone
+from utils.snapshot import get_today_snapshot
 from utils.branding import (
     add_branding,
     get_welcome_message,
@@ -28,6 +32,63 @@ from app_types import CallbackAction
 from .base import track_command, safe_handler
 
 
+def _load_or_create_start_user(db, telegram_user_id: int, username, first_name, last_name):
+    """
+    Busca ou cria o usuário do /start (síncrono). Retorna None para usuário
+    novo (criado com os hábitos padrão) ou o progresso do usuário existente.
+    """
+    db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
+    
+    if not db_user:
+        print(f"👤 Criando novo usuário {telegram_user_id}...")
+        # Cria novo usuário
+        db_user = User(
+            telegram_user_id=telegram_user_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name
+        )
+        db.add(db_user)
+        db.commit()
+        db.refresh(db_user)
+        print(f"✅ Usuário criado com ID {db_user.id}")
+        
+        # Cria hábitos padrão
+        default_habits = [
+            ("Leitura", 12, "Leia pelo menos 20 minutos para expandir conhecimentos"),
+            ("Exercício físico", 15, "Mova-se pelo menos 30 minutos por dia"),
+            ("Meditação", 10, "Respire fundo e relaxe por 10-15 minutos"),
+            ("Banho de água gelada", 20, "Tome um banho de água gelada para aumentar energia e resistência"),
+        ]
+        
+        for name, xp, desc in default_habits:
+            habit = Habit(
+                user_id=db_user.id,
+                name=name,
+                xp_reward=xp,
+                description=desc,
+                category="personal"
+            )
+            db.add(habit)
+        
+        db.commit()
+        return None
+    
+    from utils.gamification import get_daily_goal_progress
+    
+    print(f"👤 Usuário {telegram_user_id} já existe (ID: {db_user.id})")
+    print("📊 Buscando progresso diário...")
+    # Busca progresso diário
+    progress = get_daily_goal_progress(db, db_user.id)
+    print(f"✅ Progresso: {progress}")
+    
+    return {
+        "current_level": db_user.current_level,
+        "total_xp_earned": db_user.total_xp_earned,
+        "progress": progress,
+    }
+
+
 @track_command("start")
 async def _start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler para o comando /start"""
@@ -39,60 +100,25 @@ async def _start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         print(f"📝 Buscando usuário {telegram_user_id} no banco...")
         
-        db = next(get_db())
-        
-        # Busca ou cria usuário
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
+        data = await run_db(
+            _load_or_create_start_user,
+            telegram_user_id,
+            user.username,
+            user.first_name,
+            user.last_name,
+        )
         
-        if not db_user:
-            print(f"👤 Criando novo usuário {telegram_user_id}...")
-            # Cria novo usuário
-            db_user = User(
-                telegram_user_id=telegram_user_id,
-                username=user.username,
-                first_name=user.first_name,
-                last_name=user.last_name
-            )
-            db.add(db_user)
-            db.commit()
-            db.refresh(db_user)
-            print(f"✅ Usuário criado com ID {db_user.id}")
-            
-            # Cria hábitos padrão
-            default_habits = [
-                ("Leitura", 12, "Leia pelo menos 20 minutos para expandir conhecimentos"),
-                ("Exercício físico", 15, "Mova-se pelo menos 30 minutos por dia"),
-                ("Meditação", 10, "Respire fundo e relaxe por 10-15 minutos"),
-                ("Banho de água gelada", 20, "Tome um banho de água gelada para aumentar energia e resistência"),
-            ]
-            
-            for name, xp, desc in default_habits:
-                habit = Habit(
-                    user_id=db_user.id,
-                    name=name,
-                    xp_reward=xp,
-                    description=desc,
-                    category="personal"
-                )
-                db.add(habit)
-            
-            db.commit()
-            
+        if data is None:
             print("📝 Enviando mensagem de boas-vindas...")
             welcome_message = get_welcome_message()
             await update.message.reply_text(welcome_message, parse_mode="Markdown")
             print("✅ Mensagem de boas-vindas enviada")
             
         else:
-            print(f"👤 Usuário {telegram_user_id} já existe (ID: {db_user.id})")
             # Usuário já existe - mostra menu principal
             from utils.keyboards import create_main_menu_keyboard
-            from utils.gamification import get_daily_goal_progress
             
-            print("📊 Buscando progresso diário...")
-            # Busca progresso diário
-            progress = get_daily_goal_progress(db, db_user.id)
-            print(f"✅ Progresso: {progress}")
+            progress = data["progress"]
             
             message = f"""
 🎉 *Bem-vindo de volta, {user.first_name}!*
@@ -100,8 +126,8 @@ async def _start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 **📊 Seu Progresso Hoje:**
 • ✅ {progress['completed']}/{progress['goal']} hábitos completados
 • 📈 {progress['progress']:.1f}% da meta diária
-• 🏆 Nível {db_user.current_level}
-• 💎 {db_user.total_xp_earned:,} XP total
+• 🏆 Nível {data['current_level']}
+• 💎 {data['total_xp_earned']:,} XP total
 
 **Escolha uma opção:**
 """
@@ -122,11 +148,7 @@ async def _start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print(f"❌ Tipo de erro: {type(e).__name__}")
         import traceback
         print(f"❌ Traceback: {traceback.format_exc()}")
-        db.rollback()
         raise e
-    finally:
-        db.close()
-        print("🔒 Conexão com banco fechada")
 
 
 @track_command("habit")
@@ -135,70 +157,69 @@ async def _habit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     telegram_user_id = user.id
     
-    db = next(get_db())
+    snapshot = await get_today_snapshot(telegram_user_id)
+    if snapshot is None:
+        await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
+        return
     
-    try:
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
-            return
-        
-        # Busca hábitos ativos
-        habits = db.query(Habit).filter(
-            Habit.user_id == db_user.id,
-            Habit.is_active == True
-        ).all()
-        
-        if not habits:
-            message = """
+    # Hábitos ativos
+    habits = snapshot.habits
+    
+    if not habits:
+        message = """
 📝 *Nenhum hábito encontrado*
 
 Use /add_habit para criar seu primeiro hábito!
 """
-            await update.message.reply_text(add_branding(message), parse_mode="Markdown")
-            return
-        
-        # Busca progresso diário
-        progress = get_daily_progress(db, db_user.id)
-        
-        # Monta mensagem
-        message = f"""
+        await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+        return
+    
+    # Progresso diário
+    progress = snapshot.to_progress()
+    
+    # Monta mensagem
+    message = f"""
 🎯 *Seus Hábitos de Hoje*
 
 📊 Progresso: {progress['completed']}/{progress['goal']} ({progress['progress']:.1f}%)
 
 """
-        
-        # Adiciona hábitos
-        for habit in habits:
-            completed = any(log.habit_id == habit.id for log in progress['logs'])
-            status = "✅" if completed else "⭕"
-            message += f"{status} {habit.name} (+{habit.xp_reward} XP)\n"
-        
-        # Adiciona teclado
-        keyboard = create_habit_list_keyboard(
-            [{"id": h.id, "name": h.name, "xp_reward": h.xp_reward} for h in habits],
-            CallbackAction.COMPLETE_HABIT,
-            show_status=False
-        )
-        
-        await update.message.reply_text(
-            add_branding(message),
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-        
-        # Verifica se completou todos os hábitos
-        if progress['completed'] == progress['goal'] and progress['goal'] > 0:
-            perfect_message = f"""
+    
+    # Adiciona hábitos
+    for habit in habits:
+        status = "✅" if snapshot.is_completed(habit.id) else "⭕"
+        message += f"{status} {habit.name} (+{habit.xp_reward} XP)\n"
+    
+    # Adiciona teclado
+    keyboard = create_habit_list_keyboard(
+        [{"id": h.id, "name": h.name, "xp_reward": h.xp_reward} for h in habits],
+        CallbackAction.COMPLETE_HABIT,
+        show_status=False
+    )
+    
+    await update.message.reply_text(
+        add_branding(message),
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    
+    # Verifica se completou todos os hábitos
+    if progress['completed'] == progress['goal'] and progress['goal'] > 0:
+        perfect_message = f"""
 ✨ *DIA PERFEITO!* ✨
 Você completou todos os seus hábitos hoje!
 {get_motivational_message('streak_milestone')}
 """
-            await update.message.reply_text(add_branding(perfect_message), parse_mode="Markdown")
+        await update.message.reply_text(add_branding(perfect_message), parse_mode="Markdown")
+
+
+def _load_user_stats(db, telegram_user_id: int):
+    """Carrega as estatísticas do usuário (leitura da tabela user_stats)"""
+    db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
+    if not db_user:
+        return None
     
-    finally:
-        db.close()
+    return {"stats": get_user_stats(db, db_user.id)}
 
 
 @track_command("stats")
@@ -207,38 +228,33 @@ async def _stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     telegram_user_id = user.id
     
-    db = next(get_db())
+    data = await run_db(_load_user_stats, telegram_user_id)
+    if not data:
+        await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
+        return
     
-    try:
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
-            return
-        
-        stats = get_user_stats(db, db_user.id)
-        
-        message = f"""
+    stats = data["stats"]
+    
+    message = f"""
 📊 *Suas Estatísticas*
 
 🏆 Nível: {stats['current_level']}
 ⭐ XP Total: {stats['total_xp_earned']:,}
+📈 Próximo nível: faltam {stats['xp_to_next_level']:,} XP ({stats['level_progress']:.0f}%)
 🔥 Streak Atual: {stats['current_streak']} dias
 🏅 Melhor Streak: {stats['longest_streak']} dias
 📅 Dias desde o início: {stats['days_since_start']}
 ✅ Hábitos completados hoje: {stats['habits_completed_today']}
 📝 Total de hábitos: {stats['total_habits']}
 """
-        
-        keyboard = create_progress_keyboard()
-        
-        await update.message.reply_text(
-            add_branding(message),
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
     
-    finally:
-        db.close()
+    keyboard = create_progress_keyboard()
+    
+    await update.message.reply_text(
+        add_branding(message),
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
 
 
 @track_command("dashboard")
@@ -247,28 +263,28 @@ async def _dashboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user = update.effective_user
     telegram_user_id = user.id
     
-    db = next(get_db())
+    data = await run_db(_load_user_stats, telegram_user_id)
+    if not data:
+        await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
+        return
     
-    try:
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
-            return
-        
-        stats = get_user_stats(db, db_user.id)
-        progress = get_daily_progress(db, db_user.id)
-        
-        message = f"""
+    stats = data["stats"]
+    # Progresso de hoje pelos contadores do user_stats, sem varrer os logs
+    completed, goal = stats['habits_completed_today'], stats['active_habits']
+    progress_percentage = (completed / goal * 100) if goal > 0 else 0
+    
+    message = f"""
 🎛️ *Dashboard Completo*
 
 👤 **Usuário**: {user.first_name}
 🏆 **Nível**: {stats['current_level']}
 ⭐ **XP Total**: {stats['total_xp_earned']:,}
+📈 **Próximo Nível**: faltam {stats['xp_to_next_level']:,} XP ({stats['level_progress']:.0f}%)
 🔥 **Streak Atual**: {stats['current_streak']} dias
 🏅 **Melhor Streak**: {stats['longest_streak']} dias
 
 📊 **Hoje**:
-• Progresso: {progress['completed']}/{progress['goal']} ({progress['progress']:.1f}%)
+• Progresso: {completed}/{goal} ({progress_percentage:.1f}%)
 • Hábitos completados: {stats['habits_completed_today']}
 • Total de hábitos: {stats['total_habits']}
 
@@ -276,11 +292,13 @@ async def _dashboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 • Dias desde o início: {stats['days_since_start']}
 • Hábitos ativos: {stats['total_habits']}
 """
-        
-        await update.message.reply_text(add_branding(message), parse_mode="Markdown")
     
-    finally:
-        db.close()
+    await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+
+
+def _load_user_id(db, telegram_user_id: int):
+    """Busca o id interno do usuário (síncrono)"""
+    return db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
 
 
 @track_command("rating")
@@ -289,42 +307,43 @@ async def _rating_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     telegram_user_id = user.id
     
-    db = next(get_db())
+    if not await run_db(_load_user_id, telegram_user_id):
+        await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
+        return
     
-    try:
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
-            return
-        
-        message = """
+    message = """
 ⭐ *Como você avalia seu dia hoje?*
 
 Clique em uma opção abaixo:
 """
-        
-        from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-        from app_types import CallbackAction, CALLBACK_VERSION
-        
-        keyboard = [
-            [
-                InlineKeyboardButton("😞 Ruim", callback_data=f"{CALLBACK_VERSION}:{CallbackAction.RATE_DAY.value}:0:1"),
-                InlineKeyboardButton("😐 Regular", callback_data=f"{CALLBACK_VERSION}:{CallbackAction.RATE_DAY.value}:0:2"),
-            ],
-            [
-                InlineKeyboardButton("😊 Bom", callback_data=f"{CALLBACK_VERSION}:{CallbackAction.RATE_DAY.value}:0:3"),
-                InlineKeyboardButton("🤩 Excelente", callback_data=f"{CALLBACK_VERSION}:{CallbackAction.RATE_DAY.value}:0:4"),
-            ]
+    
+    from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+    from app_types import CallbackAction, CALLBACK_VERSION
+    
+    keyboard = [
+        [
+            InlineKeyboardButton("😞 Ruim", callback_data=f"{CALLBACK_VERSION}:{CallbackAction.RATE_DAY.value}:0:1"),
+            InlineKeyboardButton("😐 Regular", callback_data=f"{CALLBACK_VERSION}:{CallbackAction.RATE_DAY.value}:0:2"),
+        ],
+        [
+            InlineKeyboardButton("😊 Bom", callback_data=f"{CALLBACK_VERSION}:{CallbackAction.RATE_DAY.value}:0:3"),
+            InlineKeyboardButton("🤩 Excelente", callback_data=f"{CALLBACK_VERSION}:{CallbackAction.RATE_DAY.value}:0:4"),
         ]
-        
-        await update.message.reply_text(
-            add_branding(message),
-            reply_markup=InlineKeyboardMarkup(keyboard),
-            parse_mode="Markdown"
-        )
+    ]
     
-    finally:
-        db.close()
+    await update.message.reply_text(
+        add_branding(message),
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="Markdown"
+    )
+
+
+def _load_weekly_summary(db, telegram_user_id: int):
+    """Carrega o resumo semanal do usuário (síncrono)"""
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return None
+    return {"summary": get_weekly_summary(db, db_user_id)}
 
 
 @track_command("weekly")
@@ -333,31 +352,24 @@ async def _weekly_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     telegram_user_id = user.id
     
-    db = next(get_db())
+    data = await run_db(_load_weekly_summary, telegram_user_id)
+    if not data:
+        await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
+        return
     
-    try:
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
-            return
-        
-        weekly = get_weekly_summary(db, db_user.id)
-        
-        if not weekly:
-            await update.message.reply_text("❌ Erro ao buscar resumo semanal.")
-            return
-        
-        # Calcula taxa de sucesso
-        total_habits_week = len(weekly['week_logs'])
-        success_rate = (weekly['total_completed'] / total_habits_week * 100) if total_habits_week > 0 else 0
-        
-        message = f"""
+    weekly = data["summary"]
+    
+    if not weekly:
+        await update.message.reply_text("❌ Erro ao buscar resumo semanal.")
+        return
+    
+    message = f"""
 📅 *Resumo Semanal*
 
 📊 **Esta semana**:
 • Hábitos completados: {weekly['total_completed']}
 • Dias ativos: {weekly['active_days']}/7
-• Taxa de sucesso: {success_rate:.1f}%
+• Taxa de sucesso: {weekly['success_rate']:.1f}%
 • XP ganho: {weekly['total_xp_earned']}
 
 🔥 **Streaks**:
@@ -368,11 +380,163 @@ async def _weekly_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Humor: {weekly['avg_mood']}/10
 • Energia: {weekly['avg_energy']}/10
 """
-        
-        await update.message.reply_text(add_branding(message), parse_mode="Markdown")
     
-    finally:
-        db.close()
+    await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+
+
+def _load_monthly_summary(db, telegram_user_id: int):
+    """Carrega o resumo mensal do usuário (síncrono)"""
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return None
+    return get_monthly_summary(db, db_user_id)
+
+
+@track_command("monthly")
+async def _monthly_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler para o comando /monthly"""
+    monthly = await run_db(_load_monthly_summary, update.effective_user.id)
+    if not monthly:
+        await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
+        return
+    
+    best_day = (
+        f"{monthly['best_day'].strftime('%d/%m')} ({monthly['best_day_completions']} hábitos)"
+        if monthly['best_day'] else "-"
+    )
+    
+    message = f"""
+📈 *Resumo Mensal* (últimos {monthly['days']} dias)
+
+📊 **Este mês**:
+• Hábitos completados: {monthly['total_completed']}
+• Dias ativos: {monthly['active_days']}/{monthly['days']}
+• XP ganho: {monthly['total_xp_earned']:,}
+• Melhor dia: {best_day}
+
+🔥 **Streaks**:
+• Streak atual: {monthly['user'].current_streak} dias
+• Melhor streak: {monthly['user'].longest_streak} dias
+
+⭐ **Avaliações médias**:
+• Humor: {monthly['avg_mood']}/10
+• Energia: {monthly['avg_energy']}/10
+"""
+    
+    await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+
+
+def _format_rate(rate) -> str:
+    return "-" if rate is None else f"{rate:.0f}%"
+
+
+def _format_correlation(value) -> str:
+    return "dados insuficientes" if value is None else f"{value:+.2f}"
+
+
+def _format_weekday_rates(rates) -> str:
+    return " | ".join(f"{name} {_format_rate(rate)}" for name, rate in zip(WEEKDAY_NAMES, rates, strict=True))
+
+
+def _load_user_insights(db, telegram_user_id: int):
+    """Calcula os insights do usuário (síncrono)"""
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return None
+    return user_insights(db, db_user_id)
+
+
+@track_command("insights")
+async def _insights_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler para o comando /insights"""
+    insights = await run_db(_load_user_insights, update.effective_user.id)
+    if not insights:
+        await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
+        return
+    
+    habit_lines = "\n".join(
+        f"• {name}: {rate:.0f}%" for name, rate in insights['habit_rates'][:5]
+    ) or "• Nenhum hábito agendado no período"
+    
+    message = f"""
+🔎 *Insights* (últimos {insights['days']} dias)
+
+📊 **Consistência**:
+• Taxa de conclusão: {insights['completion_rate']:.1f}%
+• Últimos 7 dias: {_format_rate(insights['rolling_7d'])} (antes: {_format_rate(insights['previous_7d'])})
+• Dias ativos: {insights['active_days']}/{insights['days']}
+• Sequência atual: {insights['current_run']} dias (maior: {insights['longest_run']})
+
+🏆 **Por hábito**:
+{habit_lines}
+
+📅 **Por dia da semana**:
+{_format_weekday_rates(insights['weekday_rates'])}
+
+⭐ **Humor e energia × conclusões** ({insights['rated_days']} dias avaliados):
+• Humor: {_format_correlation(insights['mood_correlation'])}
+• Energia: {_format_correlation(insights['energy_correlation'])}
+"""
+    
+    await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+
+
+@track_command("report")
+async def _report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler para o comando /report - relatório geral (apenas administradores)"""
+    if update.effective_user.id not in ADMIN_USER_IDS:
+        await update.message.reply_text("❌ Comando disponível apenas para administradores.")
+        return
+    
+    report = await run_db(global_report)
+    
+    message = f"""
+🛠 *Relatório Geral* (últimos {report['days']} dias)
+
+👥 **Usuários**:
+• Total: {report['total_users']:,}
+• Ativos no período: {report['active_users']:,}
+• Média diária de ativos: {report['avg_daily_active_users']:.1f}
+
+✅ **Conclusões**:
+• Total: {report['total_completions']:,} ({report['avg_completions_per_active_user']:.1f} por usuário ativo)
+• Taxa de conclusão: {report['completion_rate']:.1f}%
+• XP distribuído: {report['total_xp']:,}
+
+📅 **Por dia da semana**:
+{_format_weekday_rates(report['weekday_rates'])}
+
+⭐ **Humor e energia × conclusões** ({report['rated_days']} avaliações):
+• Humor: {_format_correlation(report['mood_correlation'])}
+• Energia: {_format_correlation(report['energy_correlation'])}
+"""
+    
+    await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+
+
+def _load_active_habits(db, telegram_user_id: int):
+    """Lista os hábitos ativos do usuário, mais recentes primeiro (síncrono)"""
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return None
+    
+    habits = db.query(Habit).filter(
+        Habit.user_id == db_user_id,
+        Habit.is_active == True
+    ).order_by(Habit.created_at.desc()).all()
+    
+    return [
+        {
+            "id": h.id,
+            "name": h.name,
+            "description": h.description,
+            "xp_reward": h.xp_reward,
+            "is_active": h.is_active,
+            "current_streak": h.current_streak,
+            "total_completions": h.total_completions,
+        }
+        for h in habits
+    ]
 
 
 @track_command("habits")
@@ -381,53 +545,94 @@ async def _habits_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     telegram_user_id = user.id
     
-    db = next(get_db())
+    habits = await run_db(_load_active_habits, telegram_user_id)
+    if habits is None:
+        await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
+        return
     
-    try:
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
-            return
-        
-        habits = db.query(Habit).filter(
-            Habit.user_id == db_user.id,
-            Habit.is_active == True
-        ).order_by(Habit.created_at.desc()).all()
-        
-        if not habits:
-            message = """
+    if not habits:
+        message = """
 📝 *Nenhum hábito encontrado*
 
 Use /add_habit para criar seu primeiro hábito!
 """
-            await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+        await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+        return
+    
+    message = f"""
+📝 *Seus Hábitos* ({len(habits)} total)
+
+"""
+    
+    for habit in habits:
+        status = "✅" if habit["is_active"] else "❌"
+        message += f"{status} **{habit['name']}** (+{habit['xp_reward']} XP)\n"
+        if habit["description"]:
+            message += f"   _{habit['description']}_\n"
+        message += f"   Streak: {habit['current_streak']} dias | Total: {habit['total_completions']}\n\n"
+    
+    keyboard = create_habit_list_keyboard(
+        [{"id": h["id"], "name": h["name"], "xp_reward": h["xp_reward"], "is_active": h["is_active"]} for h in habits],
+        CallbackAction.EDIT_HABIT
+    )
+    
+    await update.message.reply_text(
+        add_branding(message),
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+
+
+def _load_user_timezone(db, telegram_user_id: int):
+    """Busca o fuso horário do usuário (síncrono)"""
+    return db.query(User.timezone).filter(User.telegram_user_id == telegram_user_id).scalar()
+
+
+def _update_user_timezone(db, telegram_user_id: int, timezone: str):
+    """Altera o fuso horário do usuário (síncrono)"""
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return False
+    return set_user_timezone(db, db_user_id, timezone)
+
+
+@track_command("timezone")
+async def _timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handler para o comando /timezone - mostra ou altera o fuso horário"""
+    telegram_user_id = update.effective_user.id
+    
+    if not context.args:
+        current = await run_db(_load_user_timezone, telegram_user_id)
+        if current is None:
+            await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
             return
         
         message = f"""
-📝 *Seus Hábitos* ({len(habits)} total)
+🌎 *Fuso Horário*
+
+Seu fuso atual: `{current}`
+O dia (hábitos e streaks) vira à meia-noite desse fuso.
 
+Para alterar: `/timezone America/Sao_Paulo`
 """
-        
-        for habit in habits:
-            status = "✅" if habit.is_active else "❌"
-            message += f"{status} **{habit.name}** (+{habit.xp_reward} XP)\n"
-            if habit.description:
-                message += f"   _{habit.description}_\n"
-            message += f"   Streak: {habit.current_streak} dias | Total: {habit.total_completions}\n\n"
-        
-        keyboard = create_habit_list_keyboard(
-            [{"id": h.id, "name": h.name, "xp_reward": h.xp_reward, "is_active": h.is_active} for h in habits],
-            CallbackAction.EDIT_HABIT
-        )
-        
+        await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+        return
+    
+    timezone = context.args[0].strip()
+    if not is_valid_timezone(timezone):
         await update.message.reply_text(
-            add_branding(message),
-            reply_markup=keyboard,
-            parse_mode="Markdown"
+            f"❌ Fuso horário inválido: {timezone}\nUse o formato Região/Cidade, ex: America/Sao_Paulo"
         )
+        return
+    
+    if not await run_db(_update_user_timezone, telegram_user_id, timezone):
+        await update.message.reply_text("❌ Usuário não encontrado. Use /start primeiro.")
+        return
     
-    finally:
-        db.close()
+    await update.message.reply_text(
+        add_branding(f"✅ Fuso horário alterado para `{timezone}`"),
+        parse_mode="Markdown"
+    )
 
 
 # Exporta os comandos diretamente (já decorados com @track_command)
@@ -437,4 +642,8 @@ stats_command = _stats_command
 dashboard_command = _dashboard_command
 rating_command = _rating_command
 weekly_command = _weekly_command
+monthly_command = _monthly_command
+insights_command = _insights_command
+report_command = _report_command
 habits_command = _habits_command
+timezone_command = _timezone_command
@@ -5,7 +5,7 @@ Handlers para conversas estruturadas (criação de hábitos)
 import re
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
-from db.session import get_db
+from db.session import run_db
 from models.models import User, Habit
 from utils.repository import HabitRepository
 from utils.branding import add_branding
@@ -493,6 +493,22 @@ async def handle_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return CONFIRMING_HABIT
 
 
+def _create_confirmed_habit(db, telegram_user_id: int, username, first_name, last_name, fields: dict):
+    """Garante o usuário e cria o hábito confirmado na conversa (síncrono)"""
+    # Busca ou cria usuário
+    from utils.gamification import get_or_create_user
+    get_or_create_user(
+        db=db,
+        telegram_user_id=telegram_user_id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name
+    )
+    
+    # Cria o hábito usando o repositório
+    return HabitRepository.create_habit(db=db, user_id=telegram_user_id, **fields)
+
+
 @safe_handler
 async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Processa a confirmação do hábito"""
@@ -509,29 +525,21 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Cria o hábito
     user = update.effective_user
-    db = next(get_db())
-    
     try:
-        # Busca ou cria usuário
-        from utils.gamification import get_or_create_user
-        db_user = get_or_create_user(
-            db=db,
-            telegram_user_id=user.id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name
-        )
-        
-        # Cria o hábito usando o repositório
-        habit = HabitRepository.create_habit(
-            db=db,
-            user_id=user.id,  # telegram_user_id
-            name=context.user_data['habit_name'],
-            description=context.user_data.get('habit_description'),
-            xp_reward=context.user_data['xp_reward'],
-            category=context.user_data['category'],
-            days_of_week=context.user_data.get('days_of_week', '1,2,3,4,5,6,7'),
-            time_minutes=context.user_data.get('time_minutes', 30)
+        habit = await run_db(
+            _create_confirmed_habit,
+            user.id,
+            user.username,
+            user.first_name,
+            user.last_name,
+            {
+                "name": context.user_data['habit_name'],
+                "description": context.user_data.get('habit_description'),
+                "xp_reward": context.user_data['xp_reward'],
+                "category": context.user_data['category'],
+                "days_of_week": context.user_data.get('days_of_week', '1,2,3,4,5,6,7'),
+                "time_minutes": context.user_data.get('time_minutes', 30),
+            },
         )
         
         # Mensagem de sucesso
@@ -575,8 +583,6 @@ async def handle_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE
             f"❌ Erro ao criar hábito: {str(e)}",
             reply_markup=ReplyKeyboardRemove()
         )
-    finally:
-        db.close()
     
     return ConversationHandler.END
 
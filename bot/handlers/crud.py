@@ -5,7 +5,7 @@ Handlers para comandos CRUD (Create, Read, Update, Delete)
 from functools import partial
 from telegram import Update
 from telegram.ext import ContextTypes
-from db.session import get_db
+from db.session import run_db
 from models.models import User, Habit, Reminder
 from utils.repository import HabitRepository, ReminderRepository
 from utils.branding import add_branding, get_success_message_with_branding
@@ -42,8 +42,6 @@ Exemplo:
         await update.message.reply_text(add_branding(message), parse_mode="Markdown")
         return
     
-    db = next(get_db())
-    
     try:
         # Parse dos argumentos
         args = context.args
@@ -61,8 +59,8 @@ Exemplo:
             description = " ".join(args[2:])
         
         # Cria hábito
-        habit = HabitRepository.create_habit(
-            db=db,
+        habit = await run_db(
+            HabitRepository.create_habit,
             user_id=telegram_user_id,
             name=name,
             xp_reward=xp_reward,
@@ -78,8 +76,6 @@ Exemplo:
     except Exception as e:
         error_message = f"❌ Erro ao criar hábito: {str(e)}"
         await update.message.reply_text(error_message)
-    finally:
-        db.close()
 
 
 @track_command("edit_habit")
@@ -88,42 +84,36 @@ async def _edit_habit_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     user = update.effective_user
     telegram_user_id = user.id
     
-    db = next(get_db())
+    # Busca hábitos do usuário
+    habits = await run_db(HabitRepository.get_habits, telegram_user_id, active_only=True)
     
-    try:
-        # Busca hábitos do usuário
-        habits = HabitRepository.get_habits(db, telegram_user_id, active_only=True)
-        
-        if not habits:
-            message = """
+    if not habits:
+        message = """
 📝 *Nenhum hábito encontrado*
 
 Use /add_habit para criar seu primeiro hábito!
 """
-            await update.message.reply_text(add_branding(message), parse_mode="Markdown")
-            return
-        
-        message = """
+        await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+        return
+    
+    message = """
 ✏️ *Editar Hábito*
 
 Escolha um hábito para editar:
 """
-        
-        from utils.keyboards import create_habit_list_keyboard
-        
-        keyboard = create_habit_list_keyboard(
-            [{"id": h.id, "name": h.name, "xp_reward": h.xp_reward} for h in habits],
-            CallbackAction.EDIT_HABIT
-        )
-        
-        await update.message.reply_text(
-            add_branding(message),
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
     
-    finally:
-        db.close()
+    from utils.keyboards import create_habit_list_keyboard
+    
+    keyboard = create_habit_list_keyboard(
+        [{"id": h.id, "name": h.name, "xp_reward": h.xp_reward} for h in habits],
+        CallbackAction.EDIT_HABIT
+    )
+    
+    await update.message.reply_text(
+        add_branding(message),
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
 
 
 @track_command("delete_habit")
@@ -132,42 +122,36 @@ async def _delete_habit_command(update: Update, context: ContextTypes.DEFAULT_TY
     user = update.effective_user
     telegram_user_id = user.id
     
-    db = next(get_db())
+    # Busca hábitos do usuário
+    habits = await run_db(HabitRepository.get_habits, telegram_user_id, active_only=True)
     
-    try:
-        # Busca hábitos do usuário
-        habits = HabitRepository.get_habits(db, telegram_user_id, active_only=True)
-        
-        if not habits:
-            message = """
+    if not habits:
+        message = """
 📝 *Nenhum hábito encontrado*
 
 Use /add_habit para criar seu primeiro hábito!
 """
-            await update.message.reply_text(add_branding(message), parse_mode="Markdown")
-            return
-        
-        message = """
+        await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+        return
+    
+    message = """
 🗑️ *Deletar Hábito*
 
 Escolha um hábito para deletar:
 """
-        
-        from utils.keyboards import create_habit_list_keyboard
-        
-        keyboard = create_habit_list_keyboard(
-            [{"id": h.id, "name": h.name, "xp_reward": h.xp_reward} for h in habits],
-            CallbackAction.DELETE_HABIT
-        )
-        
-        await update.message.reply_text(
-            add_branding(message),
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
     
-    finally:
-        db.close()
+    from utils.keyboards import create_habit_list_keyboard
+    
+    keyboard = create_habit_list_keyboard(
+        [{"id": h.id, "name": h.name, "xp_reward": h.xp_reward} for h in habits],
+        CallbackAction.DELETE_HABIT
+    )
+    
+    await update.message.reply_text(
+        add_branding(message),
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
 
 
 @track_command("set_reminder")
@@ -176,42 +160,36 @@ async def _set_reminder_command(update: Update, context: ContextTypes.DEFAULT_TY
     user = update.effective_user
     telegram_user_id = user.id
     
-    db = next(get_db())
+    # Busca hábitos do usuário
+    habits = await run_db(HabitRepository.get_habits, telegram_user_id, active_only=True)
     
-    try:
-        # Busca hábitos do usuário
-        habits = HabitRepository.get_habits(db, telegram_user_id, active_only=True)
-        
-        if not habits:
-            message = """
+    if not habits:
+        message = """
 📝 *Nenhum hábito encontrado*
 
 Use /add_habit para criar seu primeiro hábito!
 """
-            await update.message.reply_text(add_branding(message), parse_mode="Markdown")
-            return
-        
-        message = """
+        await update.message.reply_text(add_branding(message), parse_mode="Markdown")
+        return
+    
+    message = """
 ⏰ *Configurar Lembrete*
 
 Escolha um hábito para configurar lembretes:
 """
-        
-        from utils.keyboards import create_habit_list_keyboard
-        
-        keyboard = create_habit_list_keyboard(
-            [{"id": h.id, "name": h.name, "xp_reward": h.xp_reward} for h in habits],
-            CallbackAction.SET_REMINDER
-        )
-        
-        await update.message.reply_text(
-            add_branding(message),
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
     
-    finally:
-        db.close()
+    from utils.keyboards import create_habit_list_keyboard
+    
+    keyboard = create_habit_list_keyboard(
+        [{"id": h.id, "name": h.name, "xp_reward": h.xp_reward} for h in habits],
+        CallbackAction.SET_REMINDER
+    )
+    
+    await update.message.reply_text(
+        add_branding(message),
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
 
 
 # Exporta os comandos CRUD diretamente (já decorados com @track_command)
@@ -4,7 +4,7 @@ Handler para o menu principal e navegação
 
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
-from db.session import get_db
+from db.session import run_db
 from models.models import User
 from utils.branding import add_branding
 from utils.keyboards import (
@@ -19,31 +19,40 @@ from utils.keyboards import (
     create_navigation_keyboard
 )
 from utils.gamification import get_or_create_user, get_daily_goal_progress
-from .base import track_command
+from utils.snapshot import get_today_snapshot
+from .base import safe_handler, track_command
+
+
+def _load_menu_data(db, user):
+    """Carrega usuário e progresso diário para o menu (síncrono)"""
+    # Obtém ou cria usuário
+    db_user = get_or_create_user(
+        db,
+        user.id,
+        username=user.username,
+        first_name=user.first_name,
+        last_name=user.last_name,
+    )
+    
+    # Busca progresso diário
+    progress = get_daily_goal_progress(db, db_user.id)
+    
+    return {
+        "progress": progress,
+        "current_level": db_user.current_level,
+        "total_xp_earned": db_user.total_xp_earned,
+    }
 
 
 @track_command("menu")
 async def _menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handler para o comando /menu - mostra menu principal"""
     user = update.effective_user
-    telegram_user_id = user.id
     
-    db = next(get_db())
+    data = await run_db(_load_menu_data, user)
+    progress = data["progress"]
     
-    try:
-        # Obtém ou cria usuário
-        db_user = get_or_create_user(
-            db,
-            telegram_user_id,
-            username=user.username,
-            first_name=user.first_name,
-            last_name=user.last_name,
-        )
-        
-        # Busca progresso diário
-        progress = get_daily_goal_progress(db, db_user.id)
-        
-        message = f"""
+    message = f"""
 🎯 *Menu Principal - HabitBot*
 
 Olá, {user.first_name}! 👋
@@ -51,22 +60,19 @@ Olá, {user.first_name}! 👋
 **📊 Seu Progresso Hoje:**
 • ✅ {progress['completed']}/{progress['goal']} hábitos completados
 • 📈 {progress['progress']:.1f}% da meta diária
-• 🏆 Nível {db_user.current_level}
-• 💎 {db_user.total_xp_earned:,} XP total
+• 🏆 Nível {data['current_level']}
+• 💎 {data['total_xp_earned']:,} XP total
 
 **Escolha uma opção:**
 """
-        
-        keyboard = create_main_menu_keyboard()
-        
-        await update.message.reply_text(
-            add_branding(message),
-            parse_mode="Markdown",
-            reply_markup=keyboard
-        )
     
-    finally:
-        db.close()
+    keyboard = create_main_menu_keyboard()
+    
+    await update.message.reply_text(
+        add_branding(message),
+        parse_mode="Markdown",
+        reply_markup=keyboard
+    )
 
 
 async def _menu_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -161,69 +167,66 @@ Exemplo: "Beber água", "Exercício físico", "Ler 20 páginas"
     )
 
 
+def _load_user_habits(db, telegram_user_id: int, active_only: bool = True):
+    """Lista os hábitos do usuário no formato dos teclados (síncrono)"""
+    from models.models import Habit
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return None
+    
+    query = db.query(Habit).filter(Habit.user_id == db_user_id)
+    if active_only:
+        query = query.filter(Habit.is_active == True)
+    
+    return [
+        {
+            "id": h.id,
+            "name": h.name,
+            "xp_reward": h.xp_reward,
+            "current_streak": h.current_streak,
+            "is_active": h.is_active
+        }
+        for h in query.all()
+    ]
+
+
 async def _show_habits_list(query, context, action):
     """Mostra lista de hábitos para uma ação específica"""
     user = query.from_user
     telegram_user_id = user.id
     
-    db = next(get_db())
-    
-    try:
-        # Busca usuário primeiro
-        from models.models import Habit, User
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await query.edit_message_text("❌ Usuário não encontrado.")
-            return
-        
-        # Busca hábitos do usuário
-        habits = db.query(Habit).filter(
-            Habit.user_id == db_user.id,
-            Habit.is_active == True
-        ).all()
-        
-        if not habits:
-            message = """
+    habits_data = await run_db(_load_user_habits, telegram_user_id)
+    if habits_data is None:
+        await query.edit_message_text("❌ Usuário não encontrado.")
+        return
+    
+    if not habits_data:
+        message = """
 📝 *Nenhum hábito encontrado*
 
 Use "Criar Hábito" para adicionar seu primeiro hábito!
 """
-            keyboard = create_navigation_keyboard()
-            await query.edit_message_text(
-                add_branding(message),
-                parse_mode="Markdown",
-                reply_markup=keyboard
-            )
-            return
-        
-        # Converte para formato esperado pelo keyboard
-        habits_data = [
-            {
-                "id": h.id,
-                "name": h.name,
-                "xp_reward": h.xp_reward,
-                "is_active": h.is_active
-            }
-            for h in habits
-        ]
-        
-        if action == "edit":
-            message = "✏️ *Editar Hábitos*\n\nEscolha um hábito para editar:"
-            from app_types import CallbackAction
-            keyboard = create_habit_list_keyboard(habits_data, CallbackAction.EDIT_HABIT)
-        else:  # complete
-            message = "✅ *Completar Hábitos*\n\nEscolha um hábito para marcar como completo:"
-            from app_types import CallbackAction
-            keyboard = create_habit_list_keyboard(habits_data, CallbackAction.COMPLETE_HABIT)
-        
+        keyboard = create_navigation_keyboard()
         await query.edit_message_text(
             add_branding(message),
             parse_mode="Markdown",
             reply_markup=keyboard
         )
+        return
+    
+    from app_types import CallbackAction
+    if action == "edit":
+        message = "✏️ *Editar Hábitos*\n\nEscolha um hábito para editar:"
+        keyboard = create_habit_list_keyboard(habits_data, CallbackAction.EDIT_HABIT)
+    else:  # complete
+        message = "✅ *Completar Hábitos*\n\nEscolha um hábito para marcar como completo:"
+        keyboard = create_habit_list_keyboard(habits_data, CallbackAction.COMPLETE_HABIT)
     
-    finally:
-        db.close()
+    await query.edit_message_text(
+        add_branding(message),
+        parse_mode="Markdown",
+        reply_markup=keyboard
+    )
 
 
 async def _show_habits_table(query, context):
@@ -231,52 +234,44 @@ async def _show_habits_table(query, context):
     user = query.from_user
     telegram_user_id = user.id
     
-    db = next(get_db())
-    
-    try:
-        # Busca usuário primeiro
-        from models.models import Habit, User
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await query.edit_message_text("❌ Usuário não encontrado.")
-            return
-        
-        # Busca hábitos do usuário
-        habits = db.query(Habit).filter(
-            Habit.user_id == db_user.id,
-            Habit.is_active == True
-        ).all()
-        
-        if not habits:
-            message = """
+    # Snapshot do dia: re-renderizações (toggle) não consultam o banco
+    snapshot = await get_today_snapshot(telegram_user_id)
+    if snapshot is None:
+        await query.edit_message_text("❌ Usuário não encontrado.")
+        return
+    
+    habits = snapshot.habits
+    
+    if not habits:
+        message = """
 📝 *Nenhum hábito encontrado*
 
 Use "Criar Hábito" para adicionar seu primeiro hábito!
 """
-            keyboard = create_navigation_keyboard()
-            await query.edit_message_text(
-                add_branding(message),
-                parse_mode="Markdown",
-                reply_markup=keyboard
-            )
-            return
-        
-        # Converte para formato esperado pelo keyboard
-        habits_data = [
-            {
-                "id": h.id,
-                "name": h.name,
-                "xp_reward": h.xp_reward,
-                "time_minutes": h.time_minutes,
-                "is_active": h.is_active
-            }
-            for h in habits
-        ]
-        
-        # Pega hábitos selecionados do contexto
-        selected_habits = context.user_data.get('selected_habits', [])
-        
-        message = """
+        keyboard = create_navigation_keyboard()
+        await query.edit_message_text(
+            add_branding(message),
+            parse_mode="Markdown",
+            reply_markup=keyboard
+        )
+        return
+    
+    # Converte para formato esperado pelo keyboard
+    habits_data = [
+        {
+            "id": h.id,
+            "name": h.name,
+            "xp_reward": h.xp_reward,
+            "time_minutes": h.time_minutes,
+            "is_active": h.is_active
+        }
+        for h in habits
+    ]
+    
+    # Pega hábitos selecionados do contexto
+    selected_habits = context.user_data.get('selected_habits', [])
+    
+    message = """
 📋 *Hábitos*
 
 Toque nos hábitos que você completou hoje:
@@ -284,17 +279,14 @@ Toque nos hábitos que você completou hoje:
 • ✅ = Completado
 
 """
-        
-        keyboard = create_habits_table_keyboard(habits_data, selected_habits)
-        
-        await query.edit_message_text(
-            add_branding(message),
-            parse_mode="Markdown",
-            reply_markup=keyboard
-        )
     
-    finally:
-        db.close()
+    keyboard = create_habits_table_keyboard(habits_data, selected_habits)
+    
+    await query.edit_message_text(
+        add_branding(message),
+        parse_mode="Markdown",
+        reply_markup=keyboard
+    )
 
 
 async def _show_edit_habits_list(query, context):
@@ -302,63 +294,38 @@ async def _show_edit_habits_list(query, context):
     user = query.from_user
     telegram_user_id = user.id
     
-    db = next(get_db())
-    
-    try:
-        # Busca usuário primeiro
-        from models.models import Habit, User
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await query.edit_message_text("❌ Usuário não encontrado.")
-            return
-        
-        # Busca hábitos do usuário
-        habits = db.query(Habit).filter(
-            Habit.user_id == db_user.id
-        ).all()
-        
-        if not habits:
-            message = """
+    habits_data = await run_db(_load_user_habits, telegram_user_id, active_only=False)
+    if habits_data is None:
+        await query.edit_message_text("❌ Usuário não encontrado.")
+        return
+    
+    if not habits_data:
+        message = """
 📝 *Nenhum hábito encontrado*
 
 Use "Criar Hábito" para adicionar seu primeiro hábito!
 """
-            keyboard = create_navigation_keyboard()
-            await query.edit_message_text(
-                add_branding(message),
-                parse_mode="Markdown",
-                reply_markup=keyboard
-            )
-            return
-        
-        # Converte para formato esperado pelo keyboard
-        habits_data = [
-            {
-                "id": h.id,
-                "name": h.name,
-                "xp_reward": h.xp_reward,
-                "current_streak": h.current_streak,
-                "is_active": h.is_active
-            }
-            for h in habits
-        ]
-        
-        message = """
-✏️ *Editar Hábitos*
-
-Escolha um hábito para editar completamente:
-"""
-        
-        keyboard = create_habit_edit_list_keyboard(habits_data)
-        
+        keyboard = create_navigation_keyboard()
         await query.edit_message_text(
             add_branding(message),
             parse_mode="Markdown",
             reply_markup=keyboard
         )
+        return
+    
+    message = """
+✏️ *Editar Hábitos*
+
+Escolha um hábito para editar completamente:
+"""
+    
+    keyboard = create_habit_edit_list_keyboard(habits_data)
     
-    finally:
-        db.close()
+    await query.edit_message_text(
+        add_branding(message),
+        parse_mode="Markdown",
+        reply_markup=keyboard
+    )
 
 
 async def _show_progress_options(query, context):
@@ -378,46 +345,44 @@ Escolha o que você quer visualizar:
     )
 
 
+def _load_weekly_summary(db, telegram_user_id: int):
+    """Carrega o resumo semanal do usuário (síncrono)"""
+    from utils.gamification import get_weekly_summary
+    db_user_id = db.query(User.id).filter(User.telegram_user_id == telegram_user_id).scalar()
+    if not db_user_id:
+        return None
+    return {"summary": get_weekly_summary(db, db_user_id)}
+
+
 async def _show_weekly_summary(query, context):
     """Mostra resumo semanal"""
     user = query.from_user
     telegram_user_id = user.id
     
-    db = next(get_db())
-    
-    try:
-        # Busca usuário primeiro
-        from models.models import User
-        db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
-        if not db_user:
-            await query.edit_message_text("❌ Usuário não encontrado.")
-            return
-        
-        # Busca resumo semanal
-        from utils.gamification import get_weekly_summary
-        weekly = get_weekly_summary(db, db_user.id)
-        
-        if not weekly:
-            message = "❌ Erro ao buscar resumo semanal."
-            keyboard = create_navigation_keyboard()
-            await query.edit_message_text(
-                add_branding(message),
-                parse_mode="Markdown",
-                reply_markup=keyboard
-            )
-            return
-        
-        # Calcula taxa de sucesso
-        total_habits_week = len(weekly['week_logs'])
-        success_rate = (weekly['total_completed'] / total_habits_week * 100) if total_habits_week > 0 else 0
-        
-        message = f"""
+    data = await run_db(_load_weekly_summary, telegram_user_id)
+    if not data:
+        await query.edit_message_text("❌ Usuário não encontrado.")
+        return
+    
+    weekly = data["summary"]
+    
+    if not weekly:
+        message = "❌ Erro ao buscar resumo semanal."
+        keyboard = create_navigation_keyboard()
+        await query.edit_message_text(
+            add_branding(message),
+            parse_mode="Markdown",
+            reply_markup=keyboard
+        )
+        return
+    
+    message = f"""
 📅 *Resumo Semanal*
 
 📊 **Esta semana:**
 • Hábitos completados: {weekly['total_completed']}
 • Dias ativos: {weekly['active_days']}/7
-• Taxa de sucesso: {success_rate:.1f}%
+• Taxa de sucesso: {weekly['success_rate']:.1f}%
 • XP ganho: {weekly['total_xp_earned']}
 
 🔥 **Streaks:**
@@ -428,17 +393,14 @@ async def _show_weekly_summary(query, context):
 • Humor: {weekly['avg_mood']}/10
 • Energia: {weekly['avg_energy']}/10
 """
-        
-        keyboard = create_navigation_keyboard()
-        
-        await query.edit_message_text(
-            add_branding(message),
-            parse_mode="Markdown",
-            reply_markup=keyboard
-        )
     
-    finally:
-        db.close()
+    keyboard = create_navigation_keyboard()
+    
+    await query.edit_message_text(
+        add_branding(message),
+        parse_mode="Markdown",
+        reply_markup=keyboard
+    )
 
 
 async def _show_rating_form(query, context):
@@ -509,4 +471,4 @@ Escolha um tópico para saber mais:
 
 # Exporta os handlers
 menu_command = _menu_command
-menu_callback = _menu_callback
+menu_callback = safe_handler(_menu_callback)
@@ -4,8 +4,8 @@ Handlers para mensagens de texto livre
 
 from telegram import Update
 from telegram.ext import ContextTypes
-from db.session import get_db
-from models.models import User, Habit
+from db.session import run_db
+from models.models import User
 from utils.repository import HabitRepository
 from utils.branding import add_branding
 from utils.keyboards import create_main_menu_keyboard
@@ -30,18 +30,12 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Para outros tipos de conversa, deixa o ConversationHandler processar
         return
     
-    db = next(get_db())
-    
     try:
-        # Busca usuário
-        db_user = db.query(User).filter(User.telegram_user_id == user.id).first()
-        if not db_user:
+        response = await run_db(_respond_to_text, user.id, text, context)
+        if response is None:
             await update.message.reply_text("❌ Usuário não encontrado. Use /start para se registrar.")
             return
         
-        # Processa o texto baseado no conteúdo
-        response = await process_text_input(db, db_user, text, context)
-        
         await update.message.reply_text(
             add_branding(response), 
             parse_mode="Markdown",
@@ -51,12 +45,20 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     except Exception as e:
         error_message = f"❌ Erro ao processar mensagem: {str(e)}"
         await update.message.reply_text(error_message)
-    finally:
-        db.close()
 
 
-async def process_text_input(db, db_user, text: str, context: ContextTypes.DEFAULT_TYPE):
-    """Processa diferentes tipos de entrada de texto"""
+def _respond_to_text(db, telegram_user_id: int, text: str, context: ContextTypes.DEFAULT_TYPE):
+    """Busca o usuário e monta a resposta ao texto (síncrono); None se não existir"""
+    db_user = db.query(User).filter(User.telegram_user_id == telegram_user_id).first()
+    if not db_user:
+        return None
+    
+    # Processa o texto baseado no conteúdo
+    return process_text_input(db, db_user, text, context)
+
+
+def process_text_input(db, db_user, text: str, context: ContextTypes.DEFAULT_TYPE):
+    """Processa diferentes tipos de entrada de texto (síncrono, roda via run_db)"""
     
     text_lower = text.lower()
     
@@ -85,15 +87,16 @@ async def process_text_input(db, db_user, text: str, context: ContextTypes.DEFAU
     
     # Verificar status/progresso
     if any(word in text_lower for word in ['status', 'progresso', 'como estou', 'estatísticas']):
-        from utils.gamification import get_daily_goal_progress
         from utils.formatters import create_progress_table, create_summary_card
+        from utils.snapshot import load_today_snapshot
         
-        progress = get_daily_goal_progress(db, db_user.id)
+        snapshot = load_today_snapshot(db, db_user.telegram_user_id)
+        progress = snapshot.to_progress(goal=snapshot.daily_goal)
         
         # Adiciona dados extras para o card
-        progress['current_level'] = db_user.current_level
-        progress['current_streak'] = db_user.current_streak
-        progress['xp_earned_today'] = sum(log.xp_earned for log in progress.get('logs', []))
+        progress['current_level'] = snapshot.current_level
+        progress['current_streak'] = snapshot.current_streak
+        progress['xp_earned_today'] = snapshot.xp_today
         
         # Cria tabela e card
         table = create_progress_table(progress)
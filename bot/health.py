@@ -78,6 +78,7 @@ async def _health_command(update, context):
 • Errors: {metrics['errors_total']}
 • Habits: {metrics['habits_completed']}
 • DB Queries: {metrics['db_queries']}
+• DB p50/p99: {metrics['db_latency_p50_ms']}ms / {metrics['db_latency_p99_ms']}ms
 
 **Status:** {'🟢 Healthy' if db_ok and migration_ok else '🔴 Unhealthy'}
 """
@@ -32,6 +32,9 @@ async def _help(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • /dashboard - Dashboard completo
 • /rating - Avaliar seu dia
 • /weekly - Resumo semanal
+• /monthly - Resumo mensal (últimos 30 dias)
+• /insights - Padrões e tendências dos seus hábitos
+• /timezone - Ver ou alterar seu fuso horário
 
 *Sistema:*
 • /health - Status do bot
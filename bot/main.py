@@ -1,9 +1,12 @@
 from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters
 
 from config import TELEGRAM_BOT_TOKEN
+from utils.outbox import outbox
 from utils.scheduler import init_scheduler, stop_scheduler
 from utils.cache import start_cache_cleanup
 from utils.logging_config import get_logger
+from utils.observability import start_metrics_server
+from utils.tracing import TracedRequest, shutdown_tracing, tracer
 
 from .backup import backup_command
 from .handlers import (
@@ -24,7 +27,11 @@ from .handlers import (
     show_progress_callback,
     start_command,
     stats_command,
+    timezone_command,
     weekly_command,
+    monthly_command,
+    insights_command,
+    report_command,
     handle_text_message,
     handle_voice_message,
     habit_creation_handler,
@@ -49,7 +56,11 @@ def main():
         return
 
     # Cria a aplicação com configurações de rede
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    builder = Application.builder().token(TELEGRAM_BOT_TOKEN)
+    if tracer.enabled:
+        # Spans das chamadas à API (mesmo pool padrão do builder)
+        builder = builder.request(TracedRequest(connection_pool_size=256))
+    application = builder.build()
 
     # Registra handlers de comandos
     application.add_handler(CommandHandler("start", start_command))
@@ -58,11 +69,15 @@ def main():
     application.add_handler(CommandHandler("dashboard", dashboard_command))
     application.add_handler(CommandHandler("rating", rating_command))
     application.add_handler(CommandHandler("weekly", weekly_command))
+    application.add_handler(CommandHandler("monthly", monthly_command))
+    application.add_handler(CommandHandler("insights", insights_command))
+    application.add_handler(CommandHandler("report", report_command))
     application.add_handler(CommandHandler("habits", habits_command))
     application.add_handler(CommandHandler("health", health_command))
     application.add_handler(CommandHandler("help", help_cmd))
     application.add_handler(CommandHandler("backup", backup_command))
     application.add_handler(CommandHandler("menu", menu_command))
+    application.add_handler(CommandHandler("timezone", timezone_command))
 
     # Comandos CRUD (exceto addhabits que usa ConversationHandler)
     application.add_handler(CommandHandler("edithabits", edit_habit_command))
@@ -123,12 +138,18 @@ def main():
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text_message))
     application.add_handler(MessageHandler(filters.VOICE, handle_voice_message))
 
+    # Vincula a fila de envio (lembretes/broadcasts) ao bot
+    outbox.bind(application.bot)
+
     # Inicializa scheduler
     init_scheduler(application)
     
     # Inicia limpeza automática do cache
     start_cache_cleanup()
 
+    # Exposição de métricas Prometheus (se METRICS_PORT configurado)
+    start_metrics_server()
+
     # Inicia o bot
     logger.info("Bot iniciado!")
 
@@ -149,6 +170,7 @@ def main():
         logger.error(f"Traceback: {traceback.format_exc()}")
     finally:
         stop_scheduler()
+        shutdown_tracing()
         logger.info("Bot parado!")
 
 
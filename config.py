@@ -49,6 +49,8 @@ DEFAULT_HABITS = {
     },
 }
 
+# Regras declarativas: "metric" (ver utils/badges.METRICS) e "threshold"
+# ("target" nas conquistas). Itens sem "metric" não são concedidos automaticamente.
 BADGES = {
     "first_habit": {
         "name": "Primeiro Passo",
@@ -57,6 +59,8 @@ BADGES = {
         "category": "inicio",
         "is_rare": False,
         "xp_bonus": 50,
+        "metric": "total_xp",
+        "threshold": 1,
     },
     "week_streak": {
         "name": "Semana Perfeita",
@@ -65,6 +69,8 @@ BADGES = {
         "category": "streak",
         "is_rare": False,
         "xp_bonus": 100,
+        "metric": "current_streak",
+        "threshold": 7,
     },
     "month_streak": {
         "name": "Mestre da Consistência",
@@ -73,6 +79,8 @@ BADGES = {
         "category": "streak",
         "is_rare": True,
         "xp_bonus": 500,
+        "metric": "current_streak",
+        "threshold": 30,
     },
     "level_5": {
         "name": "Aprendiz",
@@ -81,6 +89,8 @@ BADGES = {
         "category": "nivel",
         "is_rare": False,
         "xp_bonus": 200,
+        "metric": "current_level",
+        "threshold": 5,
     },
     "level_10": {
         "name": "Veterano",
@@ -89,6 +99,8 @@ BADGES = {
         "category": "nivel",
         "is_rare": False,
         "xp_bonus": 500,
+        "metric": "current_level",
+        "threshold": 10,
     },
     "level_20": {
         "name": "Mestre",
@@ -97,6 +109,8 @@ BADGES = {
         "category": "nivel",
         "is_rare": True,
         "xp_bonus": 1000,
+        "metric": "current_level",
+        "threshold": 20,
     },
     "perfect_day": {
         "name": "Dia Perfeito",
@@ -105,6 +119,8 @@ BADGES = {
         "category": "perfeicao",
         "is_rare": False,
         "xp_bonus": 150,
+        "metric": "perfect_day",
+        "threshold": 1,
     },
     "exercise_week": {
         "name": "Atleta da Semana",
@@ -132,6 +148,7 @@ ACHIEVEMENTS = {
         "xp_reward": 1000,
         "is_hidden": False,
         "target": 100,
+        "metric": "total_completions",
     },
     "streak_legend": {
         "name": "Lenda da Consistência",
@@ -140,6 +157,7 @@ ACHIEVEMENTS = {
         "xp_reward": 2000,
         "is_hidden": False,
         "target": 100,
+        "metric": "current_streak",
     },
     "early_bird": {
         "name": "Madrugador",
@@ -220,6 +238,7 @@ WEEKLY_BONUS = 200
 MONTHLY_BONUS = 1000
 
 # Configurações de Tempo
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "America/Sao_Paulo")
 DAILY_RESET_HOUR = 0  # Meia-noite
 WEEKLY_RESET_DAY = 0  # Domingo (0 = segunda-feira)
 MONTHLY_RESET_DAY = 1  # Primeiro dia do mês
@@ -227,11 +246,54 @@ MONTHLY_RESET_DAY = 1  # Primeiro dia do mês
 # Configurações de Logging
 LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true"
 
+# Configurações de Cache
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()  # memory | redis
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_LOCAL_TTL = int(os.getenv("CACHE_LOCAL_TTL", "30"))  # cache local do backend redis
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "10000"))
+CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", "300"))
+
+# Configurações de Rate Limiting (token bucket por "comando:usuário")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", CACHE_BACKEND).lower()  # memory | redis
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Chamadas seguidas permitidas por comando ("habit=3,menu=3"); padrão 1
+RATE_LIMIT_BURSTS = {
+    command.strip(): int(burst)
+    for command, _, burst in (
+        item.partition("=") for item in os.getenv("RATE_LIMIT_BURSTS", "habit=2,menu=2").split(",")
+    )
+    if command.strip() and burst.strip()
+}
+
+# Configurações de Idempotência de callbacks
+# memory (só o processo) | redis (entre workers) | db (tabela processed_callbacks)
+IDEMPOTENCY_BACKEND = os.getenv("IDEMPOTENCY_BACKEND", CACHE_BACKEND).lower()
+IDEMPOTENCY_WINDOW_S = int(os.getenv("IDEMPOTENCY_WINDOW_S", "3600"))
+IDEMPOTENCY_MAX_SIZE = int(os.getenv("IDEMPOTENCY_MAX_SIZE", "100000"))
+
+# Configurações de Envio (fila de mensagens dos lembretes/broadcasts)
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "25"))  # msg/s (limite do Telegram ~30)
+OUTBOX_CHAT_INTERVAL = float(os.getenv("OUTBOX_CHAT_INTERVAL", "1.0"))  # segundos entre mensagens ao mesmo chat
+OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", "8"))  # envios simultâneos
+OUTBOX_MAX_RETRIES = int(os.getenv("OUTBOX_MAX_RETRIES", "3"))
+
+# Configurações de Administração
+# IDs do Telegram com acesso aos relatórios gerais (separados por vírgula)
+ADMIN_USER_IDS = {
+    int(user_id) for user_id in os.getenv("ADMIN_USER_IDS", "").split(",") if user_id.strip()
+}
+
 # Configurações de Versão
 APP_VERSION = os.getenv("APP_VERSION", "1.0.0")
 
 # Configurações de Observabilidade
 SENTRY_DSN = os.getenv("SENTRY_DSN")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = sem endpoint /metrics
+DB_QUERY_BUDGET = int(os.getenv("DB_QUERY_BUDGET", "20"))  # consultas por handler antes do alerta
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))  # consulta logada como lenta
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0"))  # fração de updates rastreados (0 = desativado)
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")  # spans em OTLP/JSON, uma linha por lote
+TRACING_OTLP_ENDPOINT = os.getenv("TRACING_OTLP_ENDPOINT")  # ex: http://localhost:4318/v1/traces
 
 # Configurações de Branding
 OPCODES_SITE_URL = os.getenv("OPCODES_SITE_URL", "https://opcodes.com.br")
@@ -0,0 +1,89 @@
+"""
+Fixtures compartilhadas dos testes: banco SQLite em memória e usuário semeado
+"""
+
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from models.models import Base, Habit, User
+
+
+def make_engine():
+    """Engine SQLite em memória compartilhado entre threads, com as tabelas criadas"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def make_session_factory(engine=None):
+    """Fábrica de sessões sobre ``engine`` (ou um banco em memória novo)"""
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine or make_engine())
+
+
+def seed_user(db, telegram_user_id: int = 4242, xp_rewards=(10,), **user_fields):
+    """
+    Cria um usuário com um hábito ("Hábito 0", "Hábito 1", ...) para cada
+    XP de ``xp_rewards`` e limpa o cache. Retorna (id do usuário, ids dos hábitos).
+    """
+    from utils.cache import cache
+
+    cache.clear()
+    user = User(telegram_user_id=telegram_user_id, **user_fields)
+    db.add(user)
+    db.commit()
+
+    habits = [
+        Habit(user_id=user.id, name=f"Hábito {i}", xp_reward=xp)
+        for i, xp in enumerate(xp_rewards)
+    ]
+    db.add_all(habits)
+    db.commit()
+    return user.id, [h.id for h in habits]
+
+
+def count_statements(db):
+    """Lista (crescente) dos comandos SQL executados pela sessão a partir daqui"""
+    statements = []
+
+    @event.listens_for(db.get_bind(), "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    return statements
+
+
+@pytest.fixture
+def engine():
+    engine = make_engine()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return make_session_factory(engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def seeded(db):
+    """Usuário 4242 com um hábito de 10 XP: (id do usuário, [id do hábito])"""
+    return seed_user(db)
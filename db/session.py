@@ -1,15 +1,21 @@
+import asyncio
 import os
 
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from utils.query_tracking import instrument_engine
+
 # Carrega variáveis de ambiente
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./habit_bot.db")
 IS_SQLITE = DATABASE_URL.startswith("sqlite")
 
+# Camada assíncrona opcional (asyncpg / aiosqlite)
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
 connect_args = {"check_same_thread": False} if IS_SQLITE else {}
 
 engine = create_engine(
@@ -19,9 +25,16 @@ engine = create_engine(
     **({"pool_size": 5, "max_overflow": 10} if not IS_SQLITE else {}),
 )
 
+# Contagem/latência de toda consulta, atribuída ao handler corrente
+instrument_engine(engine)
+
 # Cria a sessão
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine/sessão assíncronas são criadas sob demanda (driver é opcional)
+async_engine = None
+AsyncSessionLocal = None
+
 # Base para os modelos
 Base = declarative_base()
 
@@ -35,6 +48,73 @@ def get_db():
         db.close()
 
 
+def get_async_database_url(url: str = DATABASE_URL) -> str:
+    """Converte a DATABASE_URL síncrona para o driver assíncrono equivalente"""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+
+    raise ValueError(f"Banco sem driver assíncrono suportado: {dialect}")
+
+
+def init_async_db():
+    """Cria engine e fábrica de sessões assíncronas (requer aiosqlite/asyncpg)"""
+    global async_engine, AsyncSessionLocal
+
+    if AsyncSessionLocal is not None:
+        return AsyncSessionLocal
+
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        get_async_database_url(),
+        pool_pre_ping=True,
+        **({"pool_size": 5, "max_overflow": 10} if not IS_SQLITE else {}),
+    )
+    instrument_engine(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+    return AsyncSessionLocal
+
+
+async def get_async_db():
+    """Gerador assíncrono de sessões (equivalente a get_db para AsyncSession)"""
+    session_factory = init_async_db()
+    async with session_factory() as db:
+        yield db
+
+
+def _run_in_session(fn, *args, **kwargs):
+    """Executa uma função síncrona com uma sessão própria (usado em threads)"""
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Executa uma função de banco síncrona ``fn(db, *args, **kwargs)`` sem
+    bloquear o event loop.
+
+    Com DB_ASYNC=true a função roda sobre uma AsyncSession (driver assíncrono,
+    via ``run_sync``); caso contrário é executada em uma thread do pool padrão
+    com uma sessão síncrona dedicada.
+    """
+    if DB_ASYNC:
+        session_factory = init_async_db()
+        async with session_factory() as db:
+            return await db.run_sync(fn, *args, **kwargs)
+
+    return await asyncio.to_thread(_run_in_session, fn, *args, **kwargs)
+
+
 def init_db():
     """Inicializa o banco de dados criando todas as tabelas"""
 
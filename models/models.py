@@ -4,15 +4,22 @@ from sqlalchemy import (
     BigInteger,
     Boolean,
     Column,
+    Date,
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     UniqueConstraint,
+    select,
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, relationship, validates
+
+from config import DEFAULT_TIMEZONE
+from utils.day_boundary import local_date
+from utils.weekdays import ALL_DAYS_MASK, days_to_mask
 
 Base = declarative_base()
 
@@ -39,6 +46,15 @@ class User(Base):
     energy_rating = Column(Float, default=5.0)
     # Removido craving_level - não é mais necessário
     # Removido coffee_limit - não é mais necessário
+    # Fuso IANA do usuário: define a virada do dia (streaks, logs diários)
+    timezone = Column(String(50), default=DEFAULT_TIMEZONE, nullable=False)
+    # Último dia local com conclusão: streak é mantido em O(1) a partir dele
+    last_active_date = Column(Date)
+
+    __table_args__ = (
+        # Virada de streaks em lote, por fuso
+        Index("ix_users_timezone_last_active", "timezone", "last_active_date"),
+    )
 
     # Relationships
     habits = relationship("Habit", back_populates="user")
@@ -67,12 +83,31 @@ class Habit(Base):
     longest_streak = Column(Integer, default=0)
     total_completions = Column(Integer, default=0)
     days_of_week = Column(String(20), default="1,2,3,4,5,6,7")  # "1,2,3,4,5" (segunda=1, domingo=7)
+    # Bitmask de days_of_week (bit 0 = segunda), mantido em sincronia
+    days_mask = Column(Integer, default=ALL_DAYS_MASK, nullable=False)
     time_minutes = Column(Integer, default=30)  # Tempo em minutos
 
     # Relationships
     user = relationship("User", back_populates="habits")
     daily_logs = relationship("DailyLog", back_populates="habit")
 
+    __table_args__ = (Index("ix_habits_user_active", "user_id", "is_active"),)
+
+    @validates("days_of_week")
+    def _sync_days_mask(self, key, value):
+        self.days_mask = days_to_mask(value)
+        return value
+
+
+def _default_log_date(context):
+    """Deriva log_date de completed_at (UTC) no fuso do usuário dono do log"""
+    params = context.get_current_parameters()
+    timezone = context.connection.execute(
+        select(User.timezone).where(User.id == params.get("user_id"))
+    ).scalar()
+    moment = params.get("completed_at") or params.get("date") or datetime.utcnow()
+    return local_date(moment, timezone)
+
 
 class DailyLog(Base):
     __tablename__ = "daily_logs"
@@ -89,6 +124,8 @@ class DailyLog(Base):
     energy_rating = Column(Float)
     # Removido craving_level - não é mais necessário
     date = Column(DateTime, default=datetime.utcnow)
+    # Dia do log (sem horário) - usado nas consultas diárias e na unicidade
+    log_date = Column(Date, nullable=False, default=_default_log_date)
 
     # Relationships
     user = relationship("User", back_populates="daily_logs")
@@ -97,8 +134,9 @@ class DailyLog(Base):
     # Constraints
     __table_args__ = (
         UniqueConstraint(
-            "user_id", "habit_id", "date", name="uq_daily_log_user_habit_date"
+            "user_id", "habit_id", "log_date", name="uq_daily_log_user_habit_day"
         ),
+        Index("ix_daily_logs_user_log_date", "user_id", "log_date"),
     )
 
 
@@ -118,6 +156,37 @@ class Badge(Base):
     # Relationships
     user = relationship("User", back_populates="badges")
 
+    __table_args__ = (UniqueConstraint("user_id", "name", name="uq_badge_user_name"),)
+
+
+class UserStatsAggregate(Base):
+    """Agregados por usuário mantidos incrementalmente (telas de estatísticas)"""
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total_habits = Column(Integer, default=0, nullable=False)
+    active_habits = Column(Integer, default=0, nullable=False)
+    total_logs = Column(Integer, default=0, nullable=False)
+    completed_logs = Column(Integer, default=0, nullable=False)
+    total_badges = Column(Integer, default=0, nullable=False)
+    rare_badges = Column(Integer, default=0, nullable=False)
+    # Conclusões do dia local ``today_date`` (zerado na leitura quando o dia vira)
+    completed_today = Column(Integer, default=0, nullable=False)
+    today_date = Column(Date)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DailyRollup(Base):
+    """Totais diários por usuário (dia local), base dos resumos semanais/mensais"""
+    __tablename__ = "daily_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    completions = Column(Integer, default=0, nullable=False)
+    xp_earned = Column(Integer, default=0, nullable=False)
+    mood_rating = Column(Float)
+    energy_rating = Column(Float)
+
 
 class Streak(Base):
     __tablename__ = "streaks"
@@ -180,6 +249,8 @@ class Achievement(Base):
     # Relationships
     user = relationship("User", back_populates="achievements")
 
+    __table_args__ = (UniqueConstraint("user_id", "name", name="uq_achievement_user_name"),)
+
 
 class ProcessedCallback(Base):
     __tablename__ = "processed_callbacks"
@@ -200,6 +271,7 @@ class Reminder(Base):
     time = Column(String(5), nullable=False)  # HH:MM format
     timezone = Column(String(50), default="America/Sao_Paulo")
     days = Column(String(20), nullable=False)  # "1,2,3,4,5" (segunda=1, domingo=7)
+    days_mask = Column(Integer, default=ALL_DAYS_MASK, nullable=False)
     enabled = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -212,3 +284,8 @@ class Reminder(Base):
     __table_args__ = (
         UniqueConstraint("user_id", "habit_id", name="uq_reminder_user_habit"),
     )
+
+    @validates("days")
+    def _sync_days_mask(self, key, value):
+        self.days_mask = days_to_mask(value)
+        return value
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Teste para as análises vetorizadas (insights e relatório geral)
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import seed_user
+from models.models import DailyLog, DailyRollup, Habit, User
+
+
+def _seed(db, telegram_user_id, today, completed_days):
+    """Usuário com 2 hábitos diários; o primeiro completado nos dias informados"""
+    user_id, habit_ids = seed_user(db, telegram_user_id, xp_rewards=(10, 10))
+    created = datetime.combine(today - timedelta(days=30), datetime.min.time())
+    db.query(Habit).filter(Habit.user_id == user_id).update({Habit.created_at: created})
+    db.add_all([
+        DailyLog(
+            user_id=user_id, habit_id=habit_ids[0], completed=True, xp_earned=10,
+            log_date=today - timedelta(days=ago),
+        )
+        for ago in completed_days
+    ])
+    db.commit()
+    return user_id
+
+
+def test_runs_and_rolling_rate():
+    """Testa sequências e média móvel sobre vetores"""
+    from utils.analytics import rolling_rate, runs
+
+    assert runs(np.array([True, True, False, True, True, True, False])) == (0, 3)
+    assert runs(np.array([False, True, False, True, True])) == (2, 2)
+    assert runs(np.array([], dtype=bool)) == (0, 0)
+
+    done = np.array([1, 0, 1, 0])
+    scheduled = np.array([1, 1, 1, 0])
+    rates = rolling_rate(done, scheduled, window=2)
+    assert np.allclose(rates, [1.0, 0.5, 0.5, 1.0])
+
+    print("✅ Sequências e média móvel")
+
+
+def test_user_insights(db):
+    """Testa insights de um usuário sobre a matriz dia × hábito"""
+    from utils.analytics import user_insights
+    from utils.day_boundary import local_day
+
+    today = local_day().day
+    user_id = _seed(db, 7171, today, completed_days=[0, 1, 2, 5, 6])
+    # Humor acompanha as conclusões: alto nos dias completos, baixo nos demais
+    db.add_all([
+        DailyRollup(user_id=user_id, day=today - timedelta(days=ago), completions=0, xp_earned=0,
+                    mood_rating=9 if ago in (0, 1, 2, 5, 6) else 3, energy_rating=5)
+        for ago in range(8)
+    ])
+    db.commit()
+
+    insights = user_insights(db, user_id, days=14)
+    assert insights["active_days"] == 5
+    assert (insights["current_run"], insights["longest_run"]) == (3, 3)
+    assert insights["total_xp"] == 50
+    # 5 conclusões em 14 dias × 2 hábitos
+    assert round(insights["completion_rate"], 2) == round(5 / 28 * 100, 2)
+    assert insights["habit_rates"][0] == ("Hábito 0", 5 / 14 * 100)
+    assert round(insights["rolling_7d"], 2) == round(5 / 14 * 100, 2)
+    assert insights["rated_days"] == 8
+    assert insights["mood_correlation"] > 0.99
+    assert insights["energy_correlation"] is None  # variância nula
+    assert len(insights["weekday_rates"]) == 7
+
+    print("✅ Insights do usuário")
+
+
+def test_global_report(db):
+    """Testa o relatório agregado de toda a base"""
+    from utils.analytics import global_report
+    from utils.day_boundary import local_day
+
+    today = local_day().day
+    _seed(db, 7272, today, completed_days=[0, 1])
+    _seed(db, 7373, today, completed_days=[0])
+    db.add(User(telegram_user_id=7474))
+    db.commit()
+
+    report = global_report(db, days=7)
+    assert (report["total_users"], report["active_users"]) == (3, 2)
+    assert report["total_completions"] == 3
+    assert report["avg_completions_per_active_user"] == 1.5
+    assert report["daily_active_users"][-2:] == [1, 2]
+    assert report["mood_correlation"] is None
+
+    print("✅ Relatório geral")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
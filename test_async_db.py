@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Teste para a camada de banco assíncrona (run_db / AsyncSession)
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.pool import StaticPool
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import seed_user
+from models.models import Base
+
+
+def test_async_database_url():
+    """Testa conversão da URL para drivers assíncronos"""
+    from db.session import get_async_database_url
+
+    assert get_async_database_url("sqlite:///./habit.db") == "sqlite+aiosqlite:///./habit.db"
+    assert (
+        get_async_database_url("postgresql+psycopg2://u:p@db:5432/habit")
+        == "postgresql+asyncpg://u:p@db:5432/habit"
+    )
+
+    with pytest.raises(ValueError):
+        get_async_database_url("mysql://u:p@db/habit")
+
+    print("✅ URL assíncrona gerada corretamente")
+
+
+def test_run_db_thread_fallback(session_factory, db):
+    """Testa run_db executando a função síncrona fora do event loop"""
+    import db.session as session_module
+    from utils.gamification import get_user_stats
+
+    user_id, _ = seed_user(db, 777)
+
+    with patch.object(session_module, "SessionLocal", session_factory), patch.object(
+        session_module, "DB_ASYNC", False
+    ):
+        stats = asyncio.run(session_module.run_db(get_user_stats, user_id))
+
+    assert stats["total_habits"] == 1
+    assert stats["current_level"] == 1
+    print("✅ run_db executa consultas em thread separada")
+
+
+def test_async_repository_run_sync():
+    """Testa repositório assíncrono sobre AsyncSession (aiosqlite)"""
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from utils.repository import AsyncHabitRepository
+
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        AsyncSessionTest = async_sessionmaker(engine, expire_on_commit=False)
+        async with AsyncSessionTest() as db:
+            await db.run_sync(seed_user, 888)
+            habits = await AsyncHabitRepository.get_habits(db, 888)
+
+        await engine.dispose()
+        return habits
+
+    habits = asyncio.run(scenario())
+    assert [h.name for h in habits] == ["Hábito 0"]
+    print("✅ Repositório assíncrono funcionando")
+
+
+def test_handlers_query_off_event_loop(session_factory, db):
+    """Testa que os handlers abrem as sessões fora da thread do event loop"""
+    import db.session as session_module
+    from bot.handlers.commands import habits_command, start_command, weekly_command
+
+    seed_user(db, 999)
+    session_threads = []
+
+    def tracked_session():
+        session_threads.append(threading.get_ident())
+        return session_factory()
+
+    def make_update(telegram_user_id):
+        update = MagicMock()
+        update.effective_user.id = telegram_user_id
+        update.effective_user.username = "async"
+        update.effective_user.first_name = "Async"
+        update.effective_user.last_name = None
+        update.message.reply_text = AsyncMock()
+        return update
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        replies = []
+        for handler in (start_command, habits_command, weekly_command):
+            update = make_update(999)
+            await handler(update, MagicMock())
+            replies.append(update.message.reply_text.await_args.args[0])
+        return loop_thread, replies
+
+    with patch.object(session_module, "SessionLocal", tracked_session), patch.object(
+        session_module, "DB_ASYNC", False
+    ):
+        loop_thread, replies = asyncio.run(scenario())
+
+    assert session_threads and loop_thread not in session_threads
+    assert "Bem-vindo de volta" in replies[0]
+    assert "Hábito 0" in replies[1]
+    assert "Resumo Semanal" in replies[2]
+    print("✅ Handlers consultam o banco fora do event loop")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Teste para o motor de regras de badges
+"""
+
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import count_statements, seed_user
+from models.models import Achievement, Badge, User, UserStatsAggregate
+
+
+def test_completion_awards_badges_once(db):
+    """Testa concessão em lote na conclusão, sem repetir badges"""
+    from utils.gamification import complete_habit
+
+    user_id, (first, second) = seed_user(db, 9191, xp_rewards=(10, 10))
+
+    result = complete_habit(db, user_id, first)
+    assert [b["key"] for b in result["new_badges"]] == ["first_habit"]
+
+    result = complete_habit(db, user_id, second)
+    assert [b["key"] for b in result["new_badges"]] == ["perfect_day"]
+
+    names = sorted(name for (name,) in db.query(Badge.name).filter(Badge.user_id == user_id))
+    assert names == ["Dia Perfeito", "Primeiro Passo"]
+
+    print("✅ Badges concedidas na conclusão")
+
+
+def test_rules_filtered_by_changed_metrics(db):
+    """Testa que só regras das métricas alteradas são avaliadas"""
+    from utils.badges import evaluate_badges
+    from utils.gamification import check_and_award_badges
+
+    user_id, _ = seed_user(db, 9191)
+    user = db.get(User, user_id)
+    user.current_level, user.current_streak = 10, 100
+    db.commit()
+
+    # Valores conhecidos abaixo do limite dispensam o banco
+    statements = count_statements(db)
+    assert evaluate_badges(db, user_id, {"current_level"}, known={"current_level": 4}) == []
+    assert statements == []
+
+    # Uma única consulta agregada para avaliar as regras de nível
+    awarded = evaluate_badges(db, user_id, {"current_level"})
+    assert sorted(b["key"] for b in awarded) == ["level_10", "level_5"]
+    assert sum(s.lstrip().upper().startswith("SELECT") for s in statements) == 2
+
+    awarded = check_and_award_badges(db, user_id)
+    assert sorted(b["key"] for b in awarded) == ["month_streak", "streak_legend", "week_streak"]
+    assert db.query(Achievement).filter(Achievement.user_id == user_id).one().name == "Lenda da Consistência"
+    assert check_and_award_badges(db, user_id) == []
+
+    print("✅ Regras filtradas pelas métricas alteradas")
+
+
+def test_total_completions_from_user_stats(db):
+    """Testa a métrica total_completions lida do user_stats, com fallback nos logs"""
+    from utils.badges import evaluate_badges
+    from utils.gamification import get_user_stats
+
+    user_id, _ = seed_user(db, 9191)
+    # Sem linha no user_stats: conta os logs (nenhum)
+    assert evaluate_badges(db, user_id, {"total_completions"}) == []
+
+    get_user_stats(db, user_id)
+    db.get(UserStatsAggregate, user_id).completed_logs = 100
+    db.commit()
+
+    awarded = evaluate_badges(db, user_id, {"total_completions"})
+    assert [b["key"] for b in awarded] == ["habit_master"]
+
+    print("✅ total_completions lido do user_stats")
+
+
+def test_awards_inserted_in_bulk(db):
+    """Testa um único INSERT por tabela ao conceder várias regras"""
+    from utils.badges import evaluate_badges
+
+    user_id, _ = seed_user(db, 9191)
+    user = db.get(User, user_id)
+    user.current_level, user.current_streak = 10, 100
+    db.commit()
+
+    statements = count_statements(db)
+    awarded = evaluate_badges(db, user_id, {"current_level", "current_streak"})
+
+    assert len(awarded) == 5
+    inserts = [s.split("(")[0].split() for s in statements if s.lstrip().upper().startswith("INSERT")]
+    assert sorted(insert[2] for insert in inserts) == ["achievements", "badges"]
+
+    print("✅ Concessões inseridas em lote")
+
+
+def test_concurrent_award_is_ignored(db):
+    """Testa que a mesma badge concedida por duas avaliações concorrentes fica única"""
+    from sqlalchemy import false
+
+    from utils.badges import evaluate_badges
+
+    user_id, _ = seed_user(db, 9191)
+    user = db.get(User, user_id)
+    user.current_level = 5
+    db.commit()
+
+    # Simula a corrida: a checagem "ainda não conquistada" passa nas duas
+    with patch("utils.badges._earned_flag", lambda rule, user_id: false()):
+        first = evaluate_badges(db, user_id, {"current_level"})
+        second = evaluate_badges(db, user_id, {"current_level"})
+
+    assert [b["key"] for b in first] == ["level_5"]
+    assert second == []
+    assert db.query(Badge).filter(Badge.user_id == user_id).count() == 1
+
+    print("✅ Concessão concorrente ignorada")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Teste para o cache (memória LRU + TTL e backend Redis)
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cache_lru_eviction():
+    """Testa remoção do item menos usado ao exceder o tamanho máximo"""
+    from utils.cache import Cache
+
+    cache = Cache(max_size=3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper())
+
+    # "a" passa a ser o mais recente
+    assert cache.get("a") == "A"
+    cache.set("d", "D")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert len(cache) == 3
+    assert cache.get_stats()["evictions"] == 1
+
+    print("✅ Remoção LRU funcionando")
+
+
+def test_cache_ttl_expiration():
+    """Testa expiração por TTL e limpeza pelo heap"""
+    from utils.cache import Cache
+
+    cache = Cache(max_size=10)
+    cache.set("curto", 1, ttl_seconds=0.05)
+    cache.set("longo", 2, ttl_seconds=60)
+    # Regravar a chave não deve deixar a expiração antiga valendo
+    cache.set("regravado", 3, ttl_seconds=0.05)
+    cache.set("regravado", 4, ttl_seconds=60)
+
+    time.sleep(0.1)
+
+    assert cache.cleanup_expired() == 1
+    assert cache.get("curto") is None
+    assert cache.get("longo") == 2
+    assert cache.get("regravado") == 4
+
+    print("✅ Expiração por TTL funcionando")
+
+
+def test_cache_user_index():
+    """Testa invalidação pelas chaves do usuário"""
+    from utils.cache import Cache
+
+    cache = Cache(max_size=10)
+    cache.set("user_habits:1:active", [], user_id=1)
+    cache.set("user_stats:1", {}, user_id=1)
+    cache.set("user_habits:2:active", [], user_id=2)
+
+    assert cache.invalidate_user(1) == 2
+    assert cache.get("user_stats:1") is None
+    assert cache.get("user_habits:2:active") == []
+
+    # Remoção por LRU também limpa o índice
+    small = Cache(max_size=1)
+    small.set("x", 1, user_id=7)
+    small.set("y", 2, user_id=8)
+    assert small.invalidate_user(7) == 0
+
+    stats = cache.get_stats()
+    assert "keys" not in stats
+    assert stats["tracked_users"] == 1
+
+    print("✅ Índice por usuário funcionando")
+
+
+def test_cache_backend_interface():
+    """Testa que backends precisam implementar toda a interface"""
+    from utils.cache import Cache, CacheBackend
+
+    class PartialBackend(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        CacheBackend()
+    with pytest.raises(TypeError):
+        PartialBackend()
+    assert isinstance(Cache(), CacheBackend)
+
+    print("✅ Interface de backend abstrata")
+
+
+def test_invalidate_user_cache_global():
+    """Testa invalidate_user_cache sobre o cache global"""
+    from utils.cache import cache, get_user_habits_cache_key, invalidate_user_cache
+
+    cache.clear()
+    cache.set(get_user_habits_cache_key(42), ["h"], user_id=42)
+
+    assert invalidate_user_cache(42) == 1
+    assert cache.get(get_user_habits_cache_key(42)) is None
+
+    print("✅ invalidate_user_cache usa o índice por usuário")
+
+
+def test_get_habits_caches_records(session_factory):
+    """Testa que o repositório cacheia registros imutáveis, não objetos ORM"""
+    import dataclasses
+
+    from app_types import HabitRecord
+    from models.models import Habit, User
+    from utils.cache import cache
+    from utils.repository import HabitRepository
+
+    with session_factory() as db:
+        user = User(telegram_user_id=6161)
+        db.add(user)
+        db.commit()
+        db.add(Habit(user_id=user.id, name="Meditar", xp_reward=20, days_of_week="1,3"))
+        db.commit()
+
+    cache.clear()
+    with session_factory() as db:
+        habits = HabitRepository.get_habits(db, 6161)
+
+    # Sessão fechada: acesso continua seguro e o cache devolve os mesmos registros
+    assert isinstance(habits[0], HabitRecord)
+    assert (habits[0].name, habits[0].xp_reward, habits[0].days_mask) == ("Meditar", 20, 0b101)
+    with session_factory() as db:
+        assert HabitRepository.get_habits(db, 6161) is habits
+
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        habits[0].name = "Outro"
+    assert not hasattr(habits[0], "__dict__")
+
+    print("✅ Repositório cacheia registros imutáveis")
+
+
+def test_redis_values_serialized_as_json(db):
+    """Testa a serialização JSON (sem pickle) dos valores gravados no Redis"""
+    import json
+    from datetime import date, datetime
+
+    from app_types import HabitRecord
+    from conftest import seed_user
+    from utils.cache import _dumps, _loads
+    from utils.repository import HabitRepository
+    from utils.snapshot import load_today_snapshot
+
+    seed_user(db, 6262, xp_rewards=(10, 20))
+    habits = HabitRepository.get_habits(db, 6262)
+    snapshot = load_today_snapshot(db, 6262)
+    values = {
+        "day": date(2026, 10, 10),
+        "at": datetime(2026, 10, 10, 8, 30),
+        "pair": (1, "a"),
+        "ids": frozenset({1, 2}),
+        "by_id": {1: "a"},
+        "__cache_type__": "não é um tipo",
+    }
+
+    for value in (habits, snapshot, values, "America/Sao_Paulo", [1, None]):
+        payload = _dumps(7, value)
+        json.loads(payload)
+        assert _loads(payload) == (7, value)
+    assert isinstance(_loads(_dumps(None, habits))[1][0], HabitRecord)
+
+    with pytest.raises(TypeError):
+        _dumps(None, object())
+
+    print("✅ Valores do Redis serializados em JSON")
+
+
+def _redis_caches(count=2, **kwargs):
+    """Cria caches Redis (processos distintos) sobre o mesmo fakeredis"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from utils.cache import RedisCache
+
+    server = fakeredis.FakeServer()
+    return [
+        RedisCache(client=fakeredis.FakeRedis(server=server), **kwargs)
+        for _ in range(count)
+    ]
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_redis_cache_shared_values():
+    """Testa valores serializados compartilhados entre processos"""
+    writer, reader = _redis_caches(local_ttl=0)
+
+    writer.set("user_habits:9:active", [{"id": 1, "name": "Leitura"}], user_id=9)
+
+    assert reader.get("user_habits:9:active") == [{"id": 1, "name": "Leitura"}]
+    assert reader.invalidate_user(9) == 1
+    assert writer.get("user_habits:9:active") is None
+
+    writer.set("curto", 1, ttl_seconds=0.05)
+    time.sleep(0.1)
+    assert reader.get("curto") is None
+
+    print("✅ Backend Redis compartilha valores entre processos")
+
+
+def test_redis_cache_pubsub_invalidation():
+    """Testa invalidação das cópias locais via pub/sub"""
+    first, second = _redis_caches(local_ttl=60)
+    for redis_cache in (first, second):
+        redis_cache.start_listener()
+
+    try:
+        first.set("user_stats:5", {"xp": 10}, user_id=5)
+        assert _wait_for(lambda: second.get_stats()["invalidations_received"] == 1)
+
+        # Segundo processo guarda cópia local
+        assert second.get("user_stats:5") == {"xp": 10}
+        assert second.get("user_stats:5") == {"xp": 10}
+        assert second.get_stats()["local_hits"] == 1
+
+        first.invalidate_user(5)
+
+        assert _wait_for(lambda: second.get_stats()["invalidations_received"] == 2)
+        assert second.get("user_stats:5") is None
+
+        # Mensagens de outros processos chegam como JSON simples
+        first._redis.publish(first._channel, '{"origin": "outro", "key": "user_stats:5"}')
+        assert _wait_for(lambda: second.get_stats()["invalidations_received"] == 3)
+    finally:
+        for redis_cache in (first, second):
+            redis_cache.stop_listener()
+
+    print("✅ Invalidação entre processos via pub/sub")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
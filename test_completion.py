@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Teste para o serviço de conclusão de hábitos
+"""
+
+import os
+import sys
+
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import seed_user
+from models.models import DailyLog, Habit, User
+
+
+def test_complete_habit_single_transaction(db, seeded):
+    """Testa conclusão de hábito com atualização de XP e streak"""
+    from utils.gamification import complete_habit
+
+    user_id, (habit_id,) = seeded
+
+    result = complete_habit(db, user_id, habit_id)
+
+    assert result["success"] is True
+    assert result["xp_earned"] == 10
+    assert result["new_total_xp"] == 10
+    assert result["current_streak"] == 1
+    assert result["total_completions"] == 1
+
+    log = db.query(DailyLog).filter(DailyLog.habit_id == habit_id).one()
+    assert log.completed is True
+    assert log.completed_at is not None
+
+    db.expire_all()
+    user = db.get(User, user_id)
+    assert user.total_xp_earned == 10
+    assert user.current_streak == 1
+    assert user.longest_streak == 1
+
+    print("✅ Conclusão registrada em uma transação")
+
+
+def test_complete_habit_twice_same_day(db, seeded):
+    """Testa que o mesmo hábito não é completado duas vezes no dia"""
+    from utils.gamification import complete_habit
+
+    user_id, (habit_id,) = seeded
+
+    assert complete_habit(db, user_id, habit_id)["success"] is True
+    second = complete_habit(db, user_id, habit_id)
+
+    assert second["success"] is False
+    assert "já foi completado" in second["message"]
+    assert db.query(DailyLog).count() == 1
+
+    print("✅ Conclusão duplicada bloqueada")
+
+
+def test_daily_log_unique_per_day(db, seeded):
+    """Testa unicidade por dia (log_date) no banco"""
+    from datetime import datetime, timedelta
+
+    from sqlalchemy.exc import IntegrityError
+
+    user_id, (habit_id,) = seeded
+    morning = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+
+    db.add(DailyLog(user_id=user_id, habit_id=habit_id, completed=True, completed_at=morning))
+    db.commit()
+    assert db.query(DailyLog).one().log_date == morning.date()
+
+    db.add(
+        DailyLog(
+            user_id=user_id,
+            habit_id=habit_id,
+            completed=True,
+            completed_at=morning + timedelta(hours=10),
+        )
+    )
+    with pytest.raises(IntegrityError):
+        db.commit()
+    db.rollback()
+
+    print("✅ Um log por hábito por dia garantido pelo banco")
+
+
+def test_complete_habit_level_up(db, seeded):
+    """Testa subida de nível na conclusão"""
+    from utils.gamification import complete_habit
+
+    user_id, (habit_id,) = seeded
+    db.get(User, user_id).total_xp_earned = 95
+    db.commit()
+
+    result = complete_habit(db, user_id, habit_id)
+
+    assert result["level_up"] is True
+    assert result["new_level"] == 2
+
+    print("✅ Subida de nível aplicada")
+
+
+def test_complete_habit_not_found(db, seeded):
+    """Testa hábito inexistente"""
+    from utils.gamification import complete_habit
+
+    user_id, _ = seeded
+
+    result = complete_habit(db, user_id, 9999)
+    assert result["success"] is False
+
+    print("✅ Hábito inexistente tratado")
+
+
+def test_complete_habits_bulk(db):
+    """Testa conclusão em lote com XP somado aplicado uma vez"""
+    from utils.gamification import complete_habit, complete_habits
+
+    user_id, habit_ids = seed_user(db, xp_rewards=(10, 20, 30))
+
+    # Um dos hábitos já foi completado hoje
+    complete_habit(db, user_id, habit_ids[0])
+
+    result = complete_habits(db, user_id, habit_ids + [9999])
+
+    assert result["success"] is True
+    assert [item["habit_id"] for item in result["completed"]] == habit_ids[1:]
+    assert sorted(result["skipped"]) == sorted([habit_ids[0], 9999])
+    assert result["xp_earned"] == 50
+    assert result["new_total_xp"] == 60
+    assert db.query(DailyLog).count() == 3
+
+    db.expire_all()
+    assert db.get(User, user_id).total_xp_earned == 60
+    assert all(db.get(Habit, habit_id).total_completions == 1 for habit_id in habit_ids)
+
+    print("✅ Conclusão em lote funcionando")
+
+
+def test_complete_habits_concurrent_conflict(db):
+    """Testa que uma conclusão concorrente pula só o próprio hábito do lote"""
+    from unittest.mock import patch
+
+    import utils.gamification as gamification
+
+    user_id, habit_ids = seed_user(db, xp_rewards=(10, 20, 30))
+    original = gamification._insert_daily_logs
+
+    def racing_insert(db, rows):
+        # Outra requisição grava o primeiro hábito entre a leitura e o insert
+        db.add(DailyLog(user_id=user_id, habit_id=habit_ids[0], completed=True,
+                        log_date=rows[0]["log_date"]))
+        db.flush()
+        return original(db, rows)
+
+    with patch.object(gamification, "_insert_daily_logs", racing_insert):
+        result = gamification.complete_habits(db, user_id, habit_ids)
+
+    assert result["success"] is True
+    assert [item["habit_id"] for item in result["completed"]] == habit_ids[1:]
+    assert result["skipped"] == habit_ids[:1]
+    assert result["xp_earned"] == 50
+    assert db.query(DailyLog).count() == 3
+
+    db.expire_all()
+    assert db.get(User, user_id).total_xp_earned == 50
+    assert db.get(Habit, habit_ids[0]).total_completions == 0
+
+    print("✅ Conclusão concorrente pula só o hábito em conflito")
+
+
+def test_complete_habits_nothing_pending(db, seeded):
+    """Testa lote sem hábitos pendentes"""
+    from utils.gamification import complete_habits
+
+    user_id, habit_ids = seeded
+
+    complete_habits(db, user_id, habit_ids)
+    result = complete_habits(db, user_id, habit_ids)
+
+    assert result["success"] is False
+    assert result["completed"] == []
+
+    print("✅ Lote sem pendências tratado")
+
+
+def test_streak_incremental_update(db):
+    """Testa streak atualizado pelo último dia ativo, sem histórico"""
+    from datetime import timedelta
+
+    from utils.day_boundary import local_day
+    from utils.gamification import complete_habit, complete_habits
+
+    user_id, habit_ids = seed_user(db, xp_rewards=(10, 10, 10))
+    today = local_day().day
+    user = db.get(User, user_id)
+
+    # Ontem ativo: continua o streak, e várias conclusões no dia contam uma vez
+    user.current_streak, user.longest_streak = 3, 3
+    user.last_active_date = today - timedelta(days=1)
+    db.commit()
+
+    assert complete_habit(db, user_id, habit_ids[0])["success"] is True
+    complete_habits(db, user_id, habit_ids[1:])
+    db.expire_all()
+    user = db.get(User, user_id)
+    assert (user.current_streak, user.longest_streak, user.last_active_date) == (4, 4, today)
+
+    # Intervalo de dias: recomeça em 1
+    db.query(DailyLog).delete()
+    user.last_active_date = today - timedelta(days=3)
+    db.commit()
+
+    complete_habit(db, user_id, habit_ids[0])
+    db.expire_all()
+    user = db.get(User, user_id)
+    assert (user.current_streak, user.longest_streak) == (1, 4)
+
+    print("✅ Streak incremental funcionando")
+
+
+def test_habit_streak_follows_last_completion(db):
+    """Testa streak por hábito: continua após ontem, recomeça após intervalo"""
+    from datetime import timedelta
+
+    from utils.day_boundary import local_day
+    from utils.gamification import complete_habit, complete_habits
+
+    user_id, habit_ids = seed_user(db, xp_rewards=(10, 10, 10))
+    today = local_day().day
+
+    # Hábito 0: feito ontem; hábito 1: última vez há 3 dias; hábito 2: nunca
+    for habit_id, streak in zip(habit_ids, (3, 5, 2), strict=True):
+        db.get(Habit, habit_id).current_streak = streak
+        db.get(Habit, habit_id).longest_streak = 5
+    db.add_all([
+        DailyLog(user_id=user_id, habit_id=habit_ids[0], completed=True, log_date=today - timedelta(days=1)),
+        DailyLog(user_id=user_id, habit_id=habit_ids[1], completed=True, log_date=today - timedelta(days=3)),
+    ])
+    db.commit()
+
+    assert complete_habit(db, user_id, habit_ids[0])["current_streak"] == 4
+    result = complete_habits(db, user_id, habit_ids[1:])
+    assert [h["current_streak"] for h in result["completed"]] == [1, 1]
+
+    db.expire_all()
+    assert [db.get(Habit, habit_id).longest_streak for habit_id in habit_ids] == [5, 5, 5]
+
+    print("✅ Streak por hábito pela última conclusão")
+
+
+def test_reset_broken_streaks_by_timezone(db):
+    """Testa virada de streaks em lote, uma vez por dia em cada fuso"""
+    from datetime import datetime, timedelta
+
+    from utils.day_boundary import local_day
+    from utils.gamification import check_perfect_week, reset_broken_streaks
+
+    now = datetime.utcnow()
+    sp_today = local_day("America/Sao_Paulo", now).day
+    tokyo_today = local_day("Asia/Tokyo", now).day
+    users = [
+        User(telegram_user_id=1, timezone="America/Sao_Paulo", current_streak=5,
+             last_active_date=sp_today - timedelta(days=1)),
+        User(telegram_user_id=2, timezone="America/Sao_Paulo", current_streak=5,
+             last_active_date=sp_today - timedelta(days=2)),
+        User(telegram_user_id=3, timezone="Asia/Tokyo", current_streak=8,
+             last_active_date=tokyo_today - timedelta(days=2)),
+        User(telegram_user_id=4, timezone="Asia/Tokyo", current_streak=8,
+             last_active_date=tokyo_today),
+    ]
+    db.add_all(users)
+    db.commit()
+    ids = [u.id for u in users]
+
+    # Hábitos do usuário 1 (ativo ontem): um feito ontem, outro há 3 dias
+    kept = Habit(user_id=ids[0], name="Ler", current_streak=5)
+    broken = Habit(user_id=ids[0], name="Correr", current_streak=4)
+    db.add_all([kept, broken])
+    db.commit()
+    db.add_all([
+        DailyLog(user_id=ids[0], habit_id=kept.id, completed=True, log_date=sp_today - timedelta(days=1)),
+        DailyLog(user_id=ids[0], habit_id=broken.id, completed=True, log_date=sp_today - timedelta(days=3)),
+    ])
+    db.commit()
+
+    processed = {}
+    assert reset_broken_streaks(db, processed, now) == 2
+    assert processed == {"America/Sao_Paulo": sp_today, "Asia/Tokyo": tokyo_today}
+
+    db.expire_all()
+    assert [db.get(User, i).current_streak for i in ids] == [5, 0, 0, 8]
+    assert (db.get(Habit, kept.id).current_streak, db.get(Habit, broken.id).current_streak) == (5, 0)
+    assert check_perfect_week(db, ids[3]) is True
+    assert check_perfect_week(db, ids[0]) is False
+
+    # Mesmo dia local: fusos já processados são ignorados
+    db.get(User, ids[0]).last_active_date = sp_today - timedelta(days=5)
+    db.commit()
+    assert reset_broken_streaks(db, processed, now) == 0
+
+    print("✅ Virada de streaks em lote funcionando")
+
+
+def test_level_table_matches_loop():
+    """Testa a tabela de níveis contra o cálculo nível a nível"""
+    from config import XP_PER_LEVEL
+    from utils.gamification import calculate_level, get_level_info
+
+    def loop_level(total_xp):
+        level, xp_needed = 1, XP_PER_LEVEL
+        while total_xp >= xp_needed:
+            total_xp -= xp_needed
+            level += 1
+            xp_needed = int(xp_needed * 1.2)
+        return level, total_xp, xp_needed
+
+    for total_xp in [0, 1, 99, 100, 219, 220, 363, 364, 5000, 123456, 10**9]:
+        level, into_level, xp_needed = loop_level(total_xp)
+        info = get_level_info(total_xp)
+        assert calculate_level(total_xp) == level
+        assert (info.level, info.xp_into_level, info.xp_for_level) == (level, into_level, xp_needed)
+        assert info.xp_to_next_level == xp_needed - into_level
+
+    assert get_level_info(250).progress == 30 / 144 * 100
+    assert get_level_info(None).level == 1
+
+    print("✅ Tabela de níveis equivalente ao cálculo iterativo")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Teste para a fronteira do dia por fuso horário do usuário
+"""
+
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import seed_user
+from models.models import DailyLog, DailyRating, DailyRollup, Habit, User
+
+
+def test_local_day_window():
+    """Testa a janela do dia local e seus limites em UTC"""
+    from utils.day_boundary import local_day
+
+    # 02:00 UTC ainda é o dia anterior em São Paulo (UTC-3)
+    now = datetime(2024, 3, 10, 2, 0)
+    window = local_day("America/Sao_Paulo", now)
+    assert window.day == date(2024, 3, 9)
+    assert window.start == datetime(2024, 3, 9, 3, 0)
+    assert window.end == datetime(2024, 3, 10, 3, 0)
+    assert window.seconds_remaining(now) == 3600
+    assert window.days_ago(7) == date(2024, 3, 2)
+
+    assert local_day("UTC", now).day == date(2024, 3, 10)
+    assert local_day("Asia/Tokyo", now).day == date(2024, 3, 10)
+
+    # Janela reutilizada dentro do mesmo dia
+    assert local_day("America/Sao_Paulo", datetime(2024, 3, 10, 1, 0)) is window
+
+    print("✅ Janela do dia local funcionando")
+
+
+def test_invalid_timezone_falls_back():
+    """Testa fuso inválido caindo no fuso padrão"""
+    from config import DEFAULT_TIMEZONE
+    from utils.day_boundary import is_valid_timezone, local_day
+
+    assert not is_valid_timezone("Marte/Olympus")
+    assert not is_valid_timezone("")
+    assert is_valid_timezone("Europe/Lisbon")
+
+    now = datetime(2024, 3, 10, 2, 0)
+    assert local_day("Marte/Olympus", now).day == local_day(DEFAULT_TIMEZONE, now).day
+
+    print("✅ Fuso inválido usa o padrão")
+
+
+def test_log_date_uses_user_timezone(db):
+    """Testa que conclusões contam no dia local do usuário"""
+    from utils.day_boundary import local_day, set_user_timezone
+    from utils.gamification import complete_habit
+    from utils.snapshot import load_today_snapshot, peek_today_snapshot
+
+    user_id, (habit_id,) = seed_user(db, 8101, timezone="Asia/Tokyo")
+
+    complete_habit(db, user_id, habit_id)
+    log = db.query(DailyLog).filter(DailyLog.user_id == user_id).one()
+    assert log.log_date == local_day("Asia/Tokyo").day
+
+    snapshot = load_today_snapshot(db, 8101)
+    assert snapshot.timezone == "Asia/Tokyo"
+    assert snapshot.day == local_day("Asia/Tokyo").day
+
+    # Trocar o fuso descarta os caches dependentes do dia
+    assert set_user_timezone(db, user_id, "America/Sao_Paulo")
+    assert peek_today_snapshot(8101) is None
+    assert load_today_snapshot(db, 8101).day == local_day("America/Sao_Paulo").day
+    assert not set_user_timezone(db, user_id, "Marte/Olympus")
+
+    print("✅ log_date e snapshot seguem o fuso do usuário")
+
+
+def test_default_log_date_uses_owner_timezone(db):
+    """Testa o log_date padrão (insert sem log_date) no fuso do dono do log"""
+    tokyo = User(telegram_user_id=8102, timezone="Asia/Tokyo")
+    sao_paulo = User(telegram_user_id=8103, timezone="America/Sao_Paulo")
+    db.add_all([tokyo, sao_paulo])
+    db.commit()
+    habits = [Habit(user_id=u.id, name="Leitura", xp_reward=10) for u in (tokyo, sao_paulo)]
+    db.add_all(habits)
+    db.commit()
+
+    # 2026-10-10 20:00 UTC = 11/10 05:00 em Tóquio e 10/10 17:00 em São Paulo
+    completed_at = datetime(2026, 10, 10, 20, 0)
+    db.add_all([
+        DailyLog(user_id=h.user_id, habit_id=h.id, completed=True, completed_at=completed_at)
+        for h in habits
+    ])
+    db.commit()
+
+    days = {log.user_id: log.log_date for log in db.query(DailyLog)}
+    assert days == {tokyo.id: date(2026, 10, 11), sao_paulo.id: date(2026, 10, 10)}
+
+    print("✅ log_date padrão no fuso do dono")
+
+
+def test_day_rating_uses_user_day(db):
+    """Testa a avaliação do dia (botões) no dia local do usuário"""
+    from bot.handlers.callbacks import _save_day_rating
+    from utils.cache import cache
+    from utils.day_boundary import local_day
+
+    cache.clear()
+    user = User(telegram_user_id=8104, timezone="Pacific/Kiritimati")
+    db.add(user)
+    db.commit()
+
+    # Avaliação de ontem (no fuso do usuário), um minuto antes da virada
+    window = local_day("Pacific/Kiritimati")
+    db.add(DailyRating(user_id=user.id, date=window.start - timedelta(minutes=1),
+                       mood_rating=5, energy_rating=5))
+    db.commit()
+
+    assert _save_day_rating(db, 8104, 4) == "⭐ Avaliação registrada!"
+    assert _save_day_rating(db, 8104, 3) == "⭐ Avaliação atualizada!"
+    assert _save_day_rating(db, 9999, 3) is None
+
+    assert db.query(DailyRating).count() == 2
+    rollup = db.query(DailyRollup).one()
+    assert (rollup.day, rollup.mood_rating) == (window.day, 7.5)
+
+    print("✅ Avaliação do dia no dia local do usuário")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
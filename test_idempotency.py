@@ -70,10 +70,66 @@ def test_processed_callback_model():
         db.close()
 
 
+def test_recent_keys_window_and_capacity():
+    """Testa a camada em memória: janela de tempo e tamanho fixo"""
+    from utils.idempotency import RecentKeys
+
+    keys = RecentKeys(max_size=2, window_s=3600)
+    assert keys.add("a") and keys.add("b")
+    assert not keys.add("a")
+    assert keys.add("c")  # descarta "a", o mais antigo
+    assert len(keys) == 2
+    assert keys.add("a")
+
+    expiring = RecentKeys(max_size=10, window_s=0)
+    expiring.add("x")
+    assert expiring.prune() == 1
+    assert expiring.add("x")
+
+    print("✅ Camada em memória com janela e tamanho fixo")
+
+
+def test_shared_layers():
+    """Testa as camadas compartilhadas (Redis e tabela)"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from models.models import Base
+    from utils.idempotency import DatabaseKeys, RedisKeys
+
+    class FakeRedis:
+        def __init__(self):
+            self.data = {}
+
+        def set(self, key, value, nx=False, px=None):
+            if nx and key in self.data:
+                return None
+            self.data[key] = value
+            return True
+
+    redis_keys = RedisKeys(client=FakeRedis())
+    assert redis_keys.add("cb-1") is True
+    assert redis_keys.add("cb-1") is False
+
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db_keys = DatabaseKeys()
+    assert db_keys.add("cb-1", db) is True
+    assert db_keys.add("cb-1", db) is False
+
+    print("✅ Camadas compartilhadas funcionando")
+
+
 if __name__ == "__main__":
     print("🧪 Testando idempotência de callbacks...")
 
     test_processed_callback_model()
     test_idempotency_functions()
+    test_recent_keys_window_and_capacity()
+    test_shared_layers()
 
     print("🎉 Todos os testes de idempotência passaram!")
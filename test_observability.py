@@ -142,6 +142,61 @@ def test_health_metrics():
 
     print("✅ Métricas de health check funcionando")
 
+def test_histogram_constant_memory():
+    """Testa histograma com buckets fixos e quantis estimados"""
+    from utils.observability import MetricsRegistry
+
+    registry = MetricsRegistry()
+    registry.histogram("latency_ms", "Latência", buckets=(10, 100, 1000))
+    for value in range(1, 1001):
+        registry.observe("latency_ms", value, handler="x")
+
+    histogram = registry.summary("latency_ms")
+    assert histogram.count == 1000
+    assert len(histogram.counts) == 4  # memória não cresce com as observações
+    assert 450 <= histogram.quantile(0.5) <= 550
+    assert 950 <= histogram.quantile(0.99) <= 1000
+
+    print("✅ Histograma com memória constante")
+
+
+def test_prometheus_exposition():
+    """Testa exposição Prometheus e o endpoint /metrics"""
+    import socket
+    import urllib.request
+
+    from utils.observability import (
+        increment_metric,
+        observe_metric,
+        registry,
+        start_metrics_server,
+        stop_metrics_server,
+    )
+
+    increment_metric("commands_executed", command='say "oi"', status="success")
+    observe_metric("command_latency_ms", 42, command="stats")
+    text = registry.render()
+    assert "# TYPE habitbot_commands_executed counter" in text
+    assert 'habitbot_commands_executed{command="say \\"oi\\"",status="success"}' in text
+    assert 'habitbot_command_latency_ms_bucket{command="stats",le="50"}' in text
+    assert 'habitbot_command_latency_ms_bucket{command="stats",le="+Inf"}' in text
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+
+    assert start_metrics_server(port, host="127.0.0.1") is not None
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            body = response.read().decode()
+        assert response.status == 200
+        assert "habitbot_command_latency_ms_count" in body
+    finally:
+        stop_metrics_server()
+
+    print("✅ Exposição Prometheus funcionando")
+
+
 def test_sentry_config():
     """Testa configuração do Sentry"""
     from config import SENTRY_DSN
@@ -178,6 +233,8 @@ if __name__ == "__main__":
     test_log_habit_completion()
     test_log_error()
     test_health_metrics()
+    test_histogram_constant_memory()
+    test_prometheus_exposition()
     test_sentry_config()
     test_observability_integration()
 
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Teste para a fila de envio com limite de taxa
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+from telegram.error import Forbidden, RetryAfter, TimedOut
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+class FakeBot:
+    """Bot que registra envios e falha conforme o roteiro por chat"""
+
+    def __init__(self, failures=None):
+        self.sent = []
+        self.failures = {chat: list(errors) for chat, errors in (failures or {}).items()}
+
+    async def send_message(self, chat_id, text, **options):
+        errors = self.failures.get(chat_id)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((chat_id, time.monotonic()))
+
+
+def test_token_bucket():
+    """Testa reservas, recarga e pausa do token bucket"""
+    from utils.outbox import TokenBucket
+
+    now = [0.0]
+    bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0])
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+
+    now[0] = 10.0
+    assert bucket.reserve() == 0.0
+    bucket.pause(3)
+    assert bucket.reserve() == 3.0
+
+    print("✅ Token bucket")
+
+
+def test_broadcast_with_retries():
+    """Testa broadcast com RetryAfter, falha de rede e chat bloqueado"""
+    from utils.outbox import MessageOutbox
+
+    bot = FakeBot({
+        2: [RetryAfter(0.05)],
+        3: [TimedOut()],
+        4: [Forbidden("bot was blocked by the user")],
+    })
+    outbox = MessageOutbox(
+        bot, global_rate=1000, chat_interval=0, concurrency=3, max_retries=1, retry_backoff=0.01
+    )
+
+    async def scenario():
+        result = await outbox.broadcast([1, 2, 3, 4, 5], "Oi", parse_mode="Markdown")
+        await outbox.drain()
+        await outbox.stop()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result == {"sent": 4, "failed": 1}
+    assert sorted(chat for chat, _ in bot.sent) == [1, 2, 3, 5]
+    assert outbox.stats()["pending"] == 0
+
+    print("✅ Broadcast com reenvios")
+
+
+def test_per_chat_interval():
+    """Testa o intervalo mínimo entre mensagens ao mesmo chat"""
+    from utils.outbox import MessageOutbox
+
+    bot = FakeBot()
+    outbox = MessageOutbox(bot, global_rate=1000, chat_interval=0.1, concurrency=4)
+
+    async def scenario():
+        await asyncio.gather(*(outbox.send(7, f"Lembrete {i}") for i in range(3)))
+        await outbox.stop()
+
+    asyncio.run(scenario())
+    times = [sent_at for _, sent_at in bot.sent]
+    assert len(times) == 3
+    assert all(later - earlier >= 0.09 for earlier, later in zip(times, times[1:], strict=False))
+
+    print("✅ Intervalo por chat")
+
+
+def test_stop_resolves_pending_messages():
+    """Testa que stop resolve com False as mensagens na fila, em envio e em reenvio"""
+    from utils.outbox import MessageOutbox
+
+    class SlowBot(FakeBot):
+        async def send_message(self, chat_id, text, **options):
+            if chat_id == 3:
+                await asyncio.sleep(60)  # envio travado
+            await super().send_message(chat_id, text, **options)
+
+    bot = SlowBot({2: [RetryAfter(60)]})
+    outbox = MessageOutbox(bot, global_rate=1000, chat_interval=0, concurrency=1)
+
+    async def scenario():
+        retrying = outbox.enqueue(2, "Oi")
+        sending = outbox.enqueue(3, "Oi")
+        queued = outbox.enqueue(4, "Oi")
+        await asyncio.sleep(0.05)
+
+        await outbox.stop()
+        results = await asyncio.wait_for(asyncio.gather(retrying, sending, queued), 1)
+        await outbox.drain()
+        return results
+
+    assert asyncio.run(scenario()) == [False, False, False]
+    assert bot.sent == []
+    assert outbox.stats() == {"queued": 0, "pending": 0, "workers": 0}
+
+    print("✅ stop resolve mensagens pendentes")
+
+
+if __name__ == "__main__":
+    print("🧪 Testando fila de envio...")
+
+    test_token_bucket()
+    test_broadcast_with_retries()
+    test_per_chat_interval()
+    test_stop_resolves_pending_messages()
+
+    print("🎉 Todos os testes da fila de envio passaram!")
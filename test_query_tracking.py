@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Teste para a instrumentação automática das consultas SQL
+"""
+
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import text
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def tracked_factory(engine, session_factory):
+    """Fábrica de sessões sobre o banco em memória instrumentado"""
+    from utils.query_tracking import instrument_engine
+
+    instrument_engine(engine)
+    instrument_engine(engine)  # idempotente
+    return session_factory
+
+
+def test_queries_attributed_to_handler(tracked_factory):
+    """Testa contagem por handler, inclusive em thread (run_db)"""
+    from utils.observability import registry
+    from utils.query_tracking import current_query_stats, track_queries
+
+    def run_queries(count):
+        with tracked_factory() as db:
+            for i in range(count):
+                db.execute(text("SELECT :i"), {"i": i})
+
+    async def handler():
+        with track_queries("test_handler", budget=5) as stats:
+            run_queries(2)
+            await asyncio.to_thread(run_queries, 3)
+        return stats
+
+    before = registry.value("db_queries")
+    exceeded_before = registry.value("db_query_budget_exceeded")
+    stats = asyncio.run(handler())
+
+    assert stats.count == 5
+    assert len(stats.slowest_first()) == 3
+    assert registry.value("db_queries") - before == 5
+    assert registry.value("db_query_budget_exceeded") == exceeded_before
+    assert current_query_stats() is None
+
+    print("✅ Consultas atribuídas ao handler")
+
+
+def test_query_budget_and_slow_queries(tracked_factory):
+    """Testa alerta de orçamento (N+1) e de consultas lentas"""
+    import utils.query_tracking as query_tracking
+    from utils.observability import registry
+
+    exceeded_before = registry.value("db_query_budget_exceeded")
+    slow_before = registry.value("db_slow_queries")
+
+    original = query_tracking.DB_SLOW_QUERY_MS
+    query_tracking.DB_SLOW_QUERY_MS = 0
+    try:
+        with query_tracking.track_queries("n_plus_one", budget=2):
+            with tracked_factory() as db:
+                for i in range(4):
+                    db.execute(text("SELECT :i"), {"i": i})
+    finally:
+        query_tracking.DB_SLOW_QUERY_MS = original
+
+    assert registry.value("db_query_budget_exceeded") - exceeded_before == 1
+    assert registry.value("db_slow_queries") - slow_before == 4
+
+    print("✅ Orçamento de consultas e consultas lentas")
+
+
+def test_menu_callback_tracked():
+    """Testa que o callback do menu abre o contexto de consultas do handler"""
+    from bot.handlers.menu import menu_callback
+    from utils.query_tracking import current_query_stats
+
+    seen = []
+
+    async def fake_help_menu(query, context):
+        seen.append(current_query_stats())
+
+    update = MagicMock()
+    update.callback_query.data = "menu_help"
+    update.callback_query.answer = AsyncMock()
+
+    with patch("bot.handlers.menu._show_help_menu", fake_help_menu):
+        asyncio.run(menu_callback(update, MagicMock()))
+
+    assert seen and seen[0] is not None
+    assert seen[0].handler == "_menu_callback"
+
+    print("✅ Callback do menu com consultas rastreadas")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
@@ -73,6 +73,70 @@ def test_rate_limit_different_keys():
     print("✅ Chaves diferentes são independentes")
 
 
+def test_token_bucket_burst_and_eviction():
+    """Testa burst configurável e descarte de chaves ociosas"""
+    from utils.rate_limit import TokenBucketLimiter
+
+    now = [1000.0]
+    limiter = TokenBucketLimiter(max_keys=3, clock=lambda: now[0])
+
+    # Burst de 2: toque duplo permitido, o terceiro não
+    assert limiter.hit("habit:1", 1, burst=2)
+    assert limiter.hit("habit:1", 1, burst=2)
+    assert not limiter.hit("habit:1", 1, burst=2)
+    now[0] += 0.5
+    assert not limiter.hit("habit:1", 1, burst=2)
+    now[0] += 0.5
+    assert limiter.hit("habit:1", 1, burst=2)
+
+    # Chaves ociosas (balde cheio) saem do LRU; o tamanho nunca passa do limite
+    for user_id in range(10):
+        limiter.hit(f"start:{user_id}", 1)
+    assert len(limiter) <= 3
+    now[0] += 5
+    limiter.hit("stats:1", 1)
+    assert len(limiter) == 1
+
+    print("✅ Burst e descarte de chaves ociosas")
+
+
+def test_redis_rate_limit_off_event_loop():
+    """Testa que track_command consulta o rate limit Redis fora do event loop"""
+    import asyncio
+    import threading
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    import utils.rate_limit as rate_limit
+    from bot.handlers.base import track_command
+
+    script_threads = []
+
+    class FakeRedis:
+        def register_script(self, script):
+            def run(keys, args):
+                script_threads.append(threading.get_ident())
+                return 1
+            return run
+
+    @track_command("redis_test")
+    async def handler(update, context):
+        return threading.get_ident()
+
+    update = MagicMock()
+    update.effective_user.id = 42
+    update.callback_query = None
+    update.message.reply_text = AsyncMock()
+
+    limiter = rate_limit.RedisTokenBucketLimiter(client=FakeRedis())
+    with patch.object(rate_limit, "_limiter", limiter):
+        loop_thread = asyncio.run(handler(update, MagicMock()))
+
+    assert script_threads and loop_thread not in script_threads
+    update.message.reply_text.assert_not_awaited()
+
+    print("✅ Rate limit Redis consultado fora do event loop")
+
+
 def test_rate_limit_import():
     """Testa se o rate limiting pode ser importado nos handlers"""
     from bot.handlers import rate_limited
@@ -87,6 +151,8 @@ if __name__ == "__main__":
 
     test_rate_limit_functions()
     test_rate_limit_different_keys()
+    test_token_bucket_burst_and_eviction()
+    test_redis_rate_limit_off_event_loop()
     test_rate_limit_import()
 
     print("🎉 Todos os testes de rate limiting passaram!")
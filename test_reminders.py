@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Teste para o despachante de lembretes em memória
+"""
+
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import count_statements, seed_user
+from models.models import Reminder
+
+# Segunda-feira, 12:00 UTC (09:00 em São Paulo, 21:00 em Tóquio)
+MONDAY_NOON = datetime(2026, 10, 12, 12, 0, tzinfo=timezone.utc)
+
+
+def test_due_by_local_minute():
+    """Testa o lote do minuto em fusos diferentes"""
+    from utils.reminders import ReminderDispatcher
+    from utils.weekdays import days_to_mask
+
+    dispatcher = ReminderDispatcher()
+    dispatcher.add(1, 100, 10, "Ler", "09:00", days_to_mask("1,2,3,4,5"), "America/Sao_Paulo")
+    dispatcher.add(2, 200, 20, "Meditar", "21:00", days_to_mask("1"), "Asia/Tokyo")
+    dispatcher.add(3, 300, 30, "Correr", "09:00", days_to_mask("6,7"), "America/Sao_Paulo")
+    dispatcher.add(4, 400, 40, "Beber água", "09:01", None, "Fuso/Invalido")
+
+    due = dispatcher.due(MONDAY_NOON)
+    assert sorted(entry.reminder_id for entry in due) == [1, 2]
+    assert dispatcher.due(MONDAY_NOON.replace(minute=1))[0].habit_name == "Beber água"
+
+    # Reagendar substitui as chaves antigas; remover esvazia o minuto
+    dispatcher.add(2, 200, 20, "Meditar", "22:00", days_to_mask("1"), "Asia/Tokyo")
+    dispatcher.remove(1)
+    assert dispatcher.due(MONDAY_NOON) == []
+    assert len(dispatcher) == 3
+
+    print("✅ Lote por minuto local")
+
+
+def test_collect_catches_up_once():
+    """Testa recuperação de minutos perdidos sem despacho duplicado"""
+    from utils.reminders import ReminderDispatcher
+
+    dispatcher = ReminderDispatcher()
+    dispatcher.add(1, 100, 10, "Ler", "09:00", None, "America/Sao_Paulo")
+    dispatcher.add(2, 100, 11, "Alongar", "09:02", None, "America/Sao_Paulo")
+
+    assert dispatcher.collect(MONDAY_NOON.replace(hour=11, minute=59)) == []
+    # Tick das 12:00 atrasou: o das 12:02 despacha 12:00, 12:01 e 12:02
+    batch = dispatcher.collect(MONDAY_NOON.replace(minute=2, second=3))
+    assert [entry.reminder_id for entry in batch] == [1, 2]
+    assert dispatcher.collect(MONDAY_NOON.replace(minute=2, second=40)) == []
+
+    print("✅ Minutos perdidos despachados uma vez")
+
+
+def test_dst_transitions_fire_once():
+    """Testa lembretes na hora repetida e na hora pulada do horário de verão"""
+    from datetime import timedelta
+
+    from utils.reminders import ReminderDispatcher
+
+    def fired(start, hours):
+        """Minutos UTC em que cada lembrete saiu, com um tick por minuto"""
+        dispatcher = ReminderDispatcher()
+        for i, time in enumerate(("01:30", "02:30", "03:00"), start=1):
+            dispatcher.add(i, 100, i, "Ler", time, None, "America/New_York")
+        counts = {}
+        for i in range(hours * 60):
+            moment = start + timedelta(minutes=i)
+            for entry in dispatcher.collect(moment):
+                counts.setdefault(entry.reminder_id, []).append(moment.strftime("%H:%M"))
+        return counts
+
+    # 01/11/2026: 02:00 EDT volta para 01:00 EST (01:30 acontece duas vezes)
+    assert fired(datetime(2026, 11, 1, 4, 0, tzinfo=timezone.utc), 5) == {
+        1: ["05:30"], 2: ["07:30"], 3: ["08:00"],
+    }
+
+    # 08/03/2026: 02:00 EST pula para 03:00 EDT (02:30 não existe)
+    assert fired(datetime(2026, 3, 8, 5, 0, tzinfo=timezone.utc), 4) == {
+        1: ["06:30"], 2: ["07:00"], 3: ["07:00"],
+    }
+
+    print("✅ Horário de verão sem lembrete duplicado ou perdido")
+
+
+def test_repository_hooks(db):
+    """Testa carga do startup e atualização incremental pelo repositório"""
+    from utils.reminders import reminder_dispatcher
+    from utils.repository import ReminderRepository
+
+    _, (habit_id,) = seed_user(db, 8181, timezone="Asia/Tokyo")
+
+    reminder_dispatcher.clear()
+    reminder = ReminderRepository.create_reminder(db, 8181, habit_id, "21:00", "1")
+    assert reminder.id in reminder_dispatcher
+    assert reminder_dispatcher.due(MONDAY_NOON)[0].chat_id == 8181
+
+    assert reminder_dispatcher.load(ReminderRepository.get_active_reminder_schedule(db)) == 1
+
+    ReminderRepository.delete_reminder(db, 8181, habit_id)
+    assert reminder.id not in reminder_dispatcher
+    assert len(reminder_dispatcher) == 0
+
+    print("✅ Ganchos do repositório")
+
+
+def test_habit_changes_resync_reminders(db):
+    """Testa renomear, desativar e excluir hábito com lembrete indexado"""
+    from utils.reminders import reminder_dispatcher
+    from utils.repository import HabitRepository, ReminderRepository
+
+    _, (habit_id,) = seed_user(db, 8383, timezone="Asia/Tokyo")
+
+    reminder_dispatcher.clear()
+    ReminderRepository.create_reminder(db, 8383, habit_id, "21:00", "1")
+
+    HabitRepository.update_habit(db, habit_id, 8383, name="Respirar")
+    assert [entry.habit_name for entry in reminder_dispatcher.due(MONDAY_NOON)] == ["Respirar"]
+
+    HabitRepository.toggle_habit(db, habit_id, 8383)
+    assert reminder_dispatcher.due(MONDAY_NOON) == []
+    HabitRepository.toggle_habit(db, habit_id, 8383)
+    assert len(reminder_dispatcher.due(MONDAY_NOON)) == 1
+
+    HabitRepository.delete_habit(db, habit_id, 8383)
+    assert reminder_dispatcher.due(MONDAY_NOON) == []
+    assert len(reminder_dispatcher) == 0
+
+    # Restart não recarrega lembretes de hábitos excluídos
+    assert ReminderRepository.get_active_reminder_schedule(db) == []
+
+    print("✅ Alterações do hábito sincronizam lembretes")
+
+
+def test_startup_loader_streams_in_batches(session_factory, db):
+    """Testa a carga do startup em lotes numa única consulta"""
+    import db.session as session_module
+    from utils.reminders import reminder_dispatcher
+    from utils.scheduler import load_all_reminders_on_startup
+
+    user_id, habit_ids = seed_user(db, 8282, xp_rewards=(10,) * 5)
+    db.add_all([
+        Reminder(user_id=user_id, habit_id=habit_id, time=f"0{i}:30", days="1,2,3", enabled=i != 4)
+        for i, habit_id in enumerate(habit_ids)
+    ])
+    db.commit()
+
+    statements = count_statements(db)
+
+    original = session_module.SessionLocal
+    session_module.SessionLocal = session_factory
+    try:
+        report = load_all_reminders_on_startup(batch_size=2)
+    finally:
+        session_module.SessionLocal = original
+
+    assert (report["loaded"], report["batches"]) == (4, 2)
+    assert report["duration_ms"] >= 0
+    assert len(statements) == 1
+    assert len(reminder_dispatcher) == 4
+    reminder_dispatcher.clear()
+
+    print("✅ Carga do startup em lotes")
+
+
+def test_timezone_change_reindexes_reminders(db):
+    """Testa que /timezone move e reindexa os lembretes que seguiam o fuso do usuário"""
+    from utils.day_boundary import set_user_timezone
+    from utils.reminders import reminder_dispatcher
+    from utils.repository import ReminderRepository
+
+    user_id, (first, second) = seed_user(db, 8484, xp_rewards=(10, 10), timezone="America/Sao_Paulo")
+
+    reminder_dispatcher.clear()
+    ReminderRepository.create_reminder(db, 8484, first, "09:00", "1")
+    # Lembrete com fuso próprio não acompanha a troca
+    ReminderRepository.create_reminder(db, 8484, second, "21:00", "1", timezone="Asia/Tokyo")
+    assert {e.habit_id for e in reminder_dispatcher.due(MONDAY_NOON)} == {first, second}
+
+    assert set_user_timezone(db, user_id, "Asia/Tokyo")
+
+    # 09:00 em Tóquio = segunda 00:00 UTC; 21:00 em Tóquio = segunda 12:00 UTC
+    assert [e.habit_id for e in reminder_dispatcher.due(MONDAY_NOON)] == [second]
+    assert [e.habit_id for e in reminder_dispatcher.due(MONDAY_NOON.replace(hour=0))] == [first]
+    assert {r.timezone for r in db.query(Reminder)} == {"Asia/Tokyo"}
+    assert len(reminder_dispatcher) == 2
+
+    print("✅ Troca de fuso reindexa os lembretes")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
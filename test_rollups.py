@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Teste para os rollups diários e resumos semanais/mensais
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import seed_user
+from models.models import DailyRollup, Habit
+
+
+def test_rollup_written_at_completion(db):
+    """Testa rollup do dia somado pela conclusão e pela avaliação"""
+    from utils.day_boundary import local_day
+    from utils.gamification import complete_habit, complete_habits, create_daily_rating
+
+    user_id, habit_ids = seed_user(db, 6262, xp_rewards=(10, 10, 10))
+
+    complete_habit(db, user_id, habit_ids[0])
+    complete_habits(db, user_id, habit_ids[1:])
+    create_daily_rating(db, user_id, mood_rating=8, energy_rating=6)
+    create_daily_rating(db, user_id, mood_rating=9, energy_rating=7)
+
+    rollup = db.query(DailyRollup).one()
+    assert rollup.day == local_day().day
+    assert (rollup.completions, rollup.xp_earned) == (3, 30)
+    assert (rollup.mood_rating, rollup.energy_rating) == (9, 7)
+
+    print("✅ Rollup diário escrito na conclusão")
+
+
+def test_weekly_and_monthly_summaries(db):
+    """Testa resumos agregados no SQL sobre os rollups"""
+    from utils.day_boundary import local_day
+    from utils.gamification import get_monthly_summary, get_weekly_summary
+
+    user_id, _ = seed_user(db, 6262, xp_rewards=(10, 10, 10))
+    today = local_day().day
+    db.add_all([
+        DailyRollup(user_id=user_id, day=today, completions=2, xp_earned=20, mood_rating=8),
+        DailyRollup(user_id=user_id, day=today - timedelta(days=6), completions=1, xp_earned=10,
+                    mood_rating=6, energy_rating=5),
+        DailyRollup(user_id=user_id, day=today - timedelta(days=3), completions=0, xp_earned=0,
+                    mood_rating=4),
+        DailyRollup(user_id=user_id, day=today - timedelta(days=12), completions=5, xp_earned=60),
+        DailyRollup(user_id=user_id, day=today - timedelta(days=40), completions=9, xp_earned=90),
+    ])
+    db.commit()
+
+    weekly = get_weekly_summary(db, user_id)
+    assert (weekly["total_completed"], weekly["total_xp_earned"], weekly["active_days"]) == (3, 30, 2)
+    assert (weekly["avg_mood"], weekly["avg_energy"]) == (6.0, 5.0)
+
+    monthly = get_monthly_summary(db, user_id)
+    assert (monthly["total_completed"], monthly["total_xp_earned"], monthly["active_days"]) == (8, 90, 3)
+    assert monthly["best_day"] == today - timedelta(days=12)
+    assert monthly["days"] == 30
+
+    print("✅ Resumos semanal e mensal a partir dos rollups")
+
+
+def test_weekly_success_rate_over_scheduled_days(db):
+    """Testa a taxa de sucesso sobre os hábito-dias agendados (days_mask)"""
+    from utils.day_boundary import local_day
+    from utils.gamification import get_weekly_summary
+    from utils.weekdays import weekday_bit
+
+    user_id, habit_ids = seed_user(db, 6262, xp_rewards=(10, 10, 10))
+    today = local_day().day
+    long_ago = datetime.utcnow() - timedelta(days=30)
+
+    habits = {h.id: h for h in db.query(Habit)}
+    habits[habit_ids[0]].created_at = long_ago  # todos os dias: 7
+    habits[habit_ids[1]].created_at = long_ago  # só no dia da semana de hoje: 1
+    habits[habit_ids[1]].days_mask = weekday_bit(today)
+    # habit_ids[2] criado hoje: 1
+    db.add(Habit(user_id=user_id, name="Inativo", xp_reward=10, is_active=False, created_at=long_ago))
+    db.add(DailyRollup(user_id=user_id, day=today, completions=3, xp_earned=30))
+    db.commit()
+
+    weekly = get_weekly_summary(db, user_id)
+    assert weekly["scheduled_habit_days"] == 9
+    assert round(weekly["success_rate"], 1) == 33.3
+
+    print("✅ Taxa de sucesso sobre hábito-dias agendados")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
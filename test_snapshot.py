@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Teste para o snapshot diário ("hoje") por usuário
+"""
+
+import os
+import sys
+
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import count_statements, seed_user
+from models.models import Habit
+
+
+def _seed(db, telegram_user_id):
+    """Usuário com meta 3: "Leitura" e "Treino" ativos e "Antigo" inativo"""
+    user_id, habit_ids = seed_user(db, telegram_user_id, xp_rewards=(10, 20, 5), daily_goal=3)
+    for habit_id, name in zip(habit_ids, ("Leitura", "Treino", "Antigo"), strict=True):
+        db.get(Habit, habit_id).name = name
+    db.get(Habit, habit_ids[2]).is_active = False
+    db.commit()
+    return user_id, habit_ids
+
+
+def test_snapshot_cached_reads(db):
+    """Testa que leituras repetidas do snapshot não consultam o banco"""
+    from utils.snapshot import load_today_snapshot
+
+    _seed(db, 7001)
+    statements = count_statements(db)
+
+    snapshot = load_today_snapshot(db, 7001)
+    assert [h.name for h in snapshot.habits] == ["Leitura", "Treino"]
+    assert snapshot.total_habits == 3
+    assert snapshot.completed_count == 0
+    built_with = len(statements)
+
+    for _ in range(5):
+        assert load_today_snapshot(db, 7001) is snapshot
+    assert len(statements) == built_with == 2
+
+    print("✅ Snapshot servido do cache sem consultas")
+
+
+def test_snapshot_write_through_on_completion(db):
+    """Testa atualização do snapshot pela conclusão de hábitos"""
+    from utils.gamification import complete_habit, complete_habits
+    from utils.snapshot import build_today_snapshot, load_today_snapshot
+
+    user_id, (reading_id, training_id, _) = _seed(db, 7002)
+    load_today_snapshot(db, 7002)
+
+    complete_habit(db, user_id, reading_id)
+
+    statements = count_statements(db)
+    snapshot = load_today_snapshot(db, 7002)
+    assert statements == []
+    assert snapshot.completed == {reading_id}
+    assert snapshot.xp_today == 10
+    assert snapshot.total_xp == 10
+    assert snapshot.habits[0].current_streak == 1
+
+    complete_habits(db, user_id, [reading_id, training_id])
+    snapshot = load_today_snapshot(db, 7002)
+    assert snapshot.completed == {reading_id, training_id}
+    assert snapshot.to_progress()["progress"] == 100
+
+    # Write-through igual ao que seria lido do banco
+    rebuilt = build_today_snapshot(db, 7002)
+    assert (rebuilt.completed, rebuilt.xp_today, rebuilt.total_xp) == (
+        snapshot.completed,
+        snapshot.xp_today,
+        snapshot.total_xp,
+    )
+    assert rebuilt.habits == snapshot.habits
+
+    print("✅ Snapshot atualizado pelas conclusões")
+
+
+def test_snapshot_invalidated_by_crud(db):
+    """Testa que alterações de hábitos descartam o snapshot"""
+    from utils.repository import HabitRepository
+    from utils.snapshot import load_today_snapshot, peek_today_snapshot
+
+    _, (reading_id, _, _) = _seed(db, 7003)
+    load_today_snapshot(db, 7003)
+
+    HabitRepository.update_habit(db, reading_id, 7003, name="Leitura noturna")
+    assert peek_today_snapshot(7003) is None
+
+    snapshot = load_today_snapshot(db, 7003)
+    assert snapshot.habits[0].name == "Leitura noturna"
+
+    print("✅ Snapshot invalidado pelo CRUD")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Teste para a visão "hábitos de hoje"
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import count_statements, seed_user
+from models.models import Habit, User
+
+
+def test_days_mask_conversion():
+    """Testa conversão entre string de dias e bitmask"""
+    from utils.weekdays import ALL_DAYS_MASK, days_to_mask, mask_to_cron, mask_to_days
+
+    assert days_to_mask("1,3") == 0b101
+    assert days_to_mask(" 7 , 1 ") == 0b1000001
+    assert days_to_mask(None) == ALL_DAYS_MASK
+    assert mask_to_days(0b101) == "1,3"
+    assert mask_to_cron(0b1000001) == "mon,sun"
+
+    habit = Habit(user_id=1, name="Sync", days_of_week="2,4")
+    assert habit.days_mask == 0b1010
+
+    print("✅ Conversão de bitmask correta")
+
+
+def test_today_habits_weekday_filter(db):
+    """Testa filtro de dias da semana e status de conclusão"""
+    from utils.gamification import complete_habit, get_today_habits
+
+    today = datetime.now().weekday() + 1
+    other_day = today % 7 + 1
+
+    user = User(telegram_user_id=5151)
+    db.add(user)
+    db.commit()
+
+    due = Habit(user_id=user.id, name="Hoje", days_of_week=str(today))
+    spaced = Habit(user_id=user.id, name="Espaçado", days_of_week=f"{other_day}, {today}")
+    every_day = Habit(user_id=user.id, name="Todo dia")
+    not_due = Habit(user_id=user.id, name="Outro dia", days_of_week=str(other_day))
+    db.add_all([due, spaced, every_day, not_due])
+    db.commit()
+
+    complete_habit(db, user.id, due.id)
+
+    habits = get_today_habits(db, user.id)
+    by_name = {h["name"]: h for h in habits}
+
+    assert set(by_name) == {"Hoje", "Espaçado", "Todo dia"}
+    assert by_name["Hoje"]["completed_today"] is True
+    assert by_name["Todo dia"]["completed_today"] is False
+
+    print("✅ Filtro de dias e status de hoje corretos")
+
+
+def test_today_habits_constant_queries(db):
+    """Testa que o número de consultas não cresce com a quantidade de hábitos"""
+    from utils.day_boundary import get_user_timezone
+    from utils.gamification import get_today_habits
+
+    user_id, _ = seed_user(db, 5252, xp_rewards=(10,) * 15)
+
+    # Fuso do usuário fica em cache após a primeira leitura
+    get_user_timezone(db, user_id)
+
+    statements = count_statements(db)
+    habits = get_today_habits(db, user_id)
+
+    assert len(habits) == 15
+    assert len(statements) == 1
+
+    print("✅ Hábitos de hoje em uma única consulta")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Teste para o tracing por update (spans OTLP/JSON)
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy import text
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+class CollectingExporter:
+    """Exportador que guarda os spans em memória"""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+class FakeBot:
+    async def send_message(self, chat_id, text, **options):
+        return True
+
+
+def _use_tracer(sample_rate, rng=None):
+    """Substitui o tracer global; retorna (exportador, tracer original)"""
+    import utils.tracing as tracing
+
+    exporter = CollectingExporter()
+    original = tracing.tracer
+    tracing.tracer = tracing.Tracer(sample_rate, exporter, rng=rng or (lambda: 0.0))
+    return exporter, original
+
+
+def test_spans_across_db_and_outbox(engine):
+    """Testa spans filhos de consultas (em thread) e do envio pela fila"""
+    import utils.tracing as tracing
+    from utils.outbox import MessageOutbox
+    from utils.query_tracking import instrument_engine
+
+    instrument_engine(engine)
+    outbox = MessageOutbox(FakeBot(), global_rate=1000, chat_interval=0, concurrency=1)
+
+    def query():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    async def handler():
+        with tracing.start_span("handler dashboard", tracing.SPAN_KIND_SERVER):
+            await asyncio.to_thread(query)
+            await outbox.send(42, "Oi")
+        await outbox.stop()
+
+    exporter, original = _use_tracer(1.0)
+    try:
+        asyncio.run(handler())
+    finally:
+        tracing.tracer = original
+
+    spans = {span.name: span for span in exporter.spans}
+    root = spans["handler dashboard"]
+    assert root.parent_id == ""
+    assert spans["db select"].parent_id == root.span_id
+    assert spans["db select"].attributes["db.system"] == "sqlite"
+    assert spans["outbox send"].parent_id == root.span_id
+    assert {span.trace_id for span in exporter.spans} == {root.trace_id}
+    assert tracing.current_span() is None
+
+    print("✅ Spans de banco e da fila de envio")
+
+
+def test_sampling_and_errors():
+    """Testa traces não amostrados, spans só-filhos e registro de exceções"""
+    import utils.tracing as tracing
+
+    @tracing.traced("job falha")
+    async def failing_job():
+        raise ValueError("boom")
+
+    exporter, original = _use_tracer(0.1, rng=lambda: 0.5)
+    try:
+        with tracing.start_span("handler ignorado") as span:
+            assert not span.recording
+            with tracing.start_span("filho"):
+                pass
+        with tracing.start_span("telegram sendMessage", root=False) as span:
+            assert not span.recording
+        assert exporter.spans == []
+
+        tracing.tracer.sample_rate = 1.0
+        try:
+            asyncio.run(failing_job())
+        except ValueError:
+            pass
+    finally:
+        tracing.tracer = original
+
+    [span] = exporter.spans
+    otlp = span.to_otlp()
+    assert otlp["status"]["code"] == tracing.STATUS_ERROR
+    assert otlp["events"][0]["name"] == "exception"
+
+    print("✅ Amostragem e exceções")
+
+
+def test_menu_callback_root_span():
+    """Testa que updates do menu abrem o span raiz (e os filhos são gravados)"""
+    import utils.tracing as tracing
+    from bot.handlers.menu import menu_callback
+
+    async def fake_help_menu(query, context):
+        with tracing.start_span("telegram editMessageText", tracing.SPAN_KIND_CLIENT, root=False):
+            pass
+
+    update = MagicMock()
+    update.effective_user.id = 7
+    update.callback_query.data = "menu_help"
+    update.callback_query.answer = AsyncMock()
+
+    exporter, original = _use_tracer(1.0)
+    try:
+        with patch("bot.handlers.menu._show_help_menu", fake_help_menu):
+            asyncio.run(menu_callback(update, MagicMock()))
+    finally:
+        tracing.tracer = original
+
+    spans = {span.name: span for span in exporter.spans}
+    root = spans["handler _menu_callback"]
+    assert root.parent_id == ""
+    assert spans["telegram editMessageText"].parent_id == root.span_id
+
+    print("✅ Span raiz do callback do menu")
+
+
+def test_file_export_otlp_json():
+    """Testa o arquivo JSONL no formato OTLP/JSON"""
+    from utils.tracing import SpanExporter, Tracer
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "traces.jsonl")
+        exporter = SpanExporter(path=path, endpoint=None)
+        tracer = Tracer(1.0, exporter)
+
+        with tracer.span("handler stats", attributes={"user.id": 7}):
+            with tracer.span("db select"):
+                pass
+        exporter.shutdown()
+
+        with open(path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+
+    spans = [
+        span
+        for line in lines
+        for resource in line["resourceSpans"]
+        for scope in resource["scopeSpans"]
+        for span in scope["spans"]
+    ]
+    assert {span["name"] for span in spans} == {"handler stats", "db select"}
+    parent = next(span for span in spans if span["name"] == "handler stats")
+    child = next(span for span in spans if span["name"] == "db select")
+    assert child["parentSpanId"] == parent["spanId"]
+    assert len(parent["traceId"]) == 32 and len(parent["spanId"]) == 16
+    assert parent["attributes"] == [{"key": "user.id", "value": {"intValue": "7"}}]
+
+    print("✅ Exportação OTLP/JSON")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
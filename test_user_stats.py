@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Teste para os agregados materializados de estatísticas (user_stats)
+"""
+
+import os
+import sys
+
+import pytest
+
+# Adiciona o diretório atual ao path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from conftest import count_statements, seed_user
+from models.models import Habit, User, UserStatsAggregate
+
+
+def test_stats_maintained_incrementally(db):
+    """Testa agregados atualizados pela conclusão e pelo CRUD"""
+    from utils.gamification import complete_habit, complete_habits, get_user_stats
+    from utils.repository import HabitRepository
+
+    user_id, habit_ids = seed_user(db, 5151, xp_rewards=(10, 10, 10))
+
+    # Primeira leitura monta a linha
+    stats = get_user_stats(db, user_id)
+    assert (stats["total_habits"], stats["active_habits"], stats["total_logs"]) == (3, 3, 0)
+
+    complete_habit(db, user_id, habit_ids[0])
+    complete_habits(db, user_id, habit_ids[1:])
+    HabitRepository.toggle_habit(db, habit_ids[2], 5151)
+
+    # Leitura por chave primária, sem varrer hábitos/logs/badges
+    db.expire_all()
+    statements = count_statements(db)
+    stats = get_user_stats(db, user_id)
+    assert len(statements) == 1
+    assert stats["habits_completed_today"] == 3
+    assert (stats["total_logs"], stats["completed_logs"], stats["completion_rate"]) == (3, 3, 100)
+    assert (stats["total_habits"], stats["active_habits"]) == (3, 2)
+    assert stats["total_badges"] == 2  # Primeiro Passo + Dia Perfeito
+
+    print("✅ Agregados mantidos pelos caminhos de escrita")
+
+
+def test_dashboard_reads_user_stats(session_factory, db):
+    """Testa o /dashboard com o progresso de hoje vindo do user_stats"""
+    import asyncio
+    from unittest.mock import AsyncMock, MagicMock, patch
+
+    import db.session as session_module
+    from bot.handlers.commands import dashboard_command
+    from utils.gamification import complete_habit, get_user_stats
+
+    user_id, habit_ids = seed_user(db, 5454, xp_rewards=(10, 10, 10))
+    complete_habit(db, user_id, habit_ids[0])
+    get_user_stats(db, user_id)
+
+    update = MagicMock()
+    update.effective_user.id = 5454
+    update.effective_user.first_name = "Ana"
+    update.message.reply_text = AsyncMock()
+
+    statements = count_statements(db)
+    with patch.object(session_module, "SessionLocal", session_factory), patch.object(
+        session_module, "DB_ASYNC", False
+    ):
+        asyncio.run(dashboard_command(update, MagicMock()))
+
+    message = update.message.reply_text.await_args.args[0]
+    assert "Progresso: 1/3 (33.3%)" in message
+    assert not any("daily_logs" in statement for statement in statements)
+
+    print("✅ Dashboard lê o progresso do user_stats")
+
+
+def test_refresh_all_user_stats(db):
+    """Testa a reconciliação em lote com as tabelas de origem"""
+    from utils.gamification import get_user_stats
+    from utils.user_stats import refresh_all_user_stats
+
+    user_id, _ = seed_user(db, 5252, xp_rewards=(10, 10, 10))
+    other = User(telegram_user_id=5353)
+    db.add(other)
+    db.commit()
+
+    get_user_stats(db, user_id)
+
+    # Escrita fora dos caminhos instrumentados gera divergência
+    db.add(Habit(user_id=user_id, name="Extra", xp_reward=10))
+    db.commit()
+
+    assert refresh_all_user_stats(db) == 2
+    db.expire_all()
+    assert db.get(UserStatsAggregate, user_id).total_habits == 4
+    assert db.get(UserStatsAggregate, other.id).total_habits == 0
+
+    print("✅ Reconciliação em lote funcionando")
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q", "-s"]))
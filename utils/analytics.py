@@ -0,0 +1,289 @@
+"""
+Análises vetorizadas do histórico de hábitos (NumPy)
+
+O histórico de um usuário (ou de toda a base) é lido em colunas — uma
+consulta para os logs, uma para os hábitos e uma para as avaliações
+diárias (espelhadas em ``daily_rollups``) — e as métricas são calculadas
+sobre matrizes dia × hábito, sem laços por registro: taxa de conclusão,
+sequências de dias ativos, média móvel, mapa por dia da semana e correlação
+de humor/energia com as conclusões.
+"""
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.models import DailyLog, DailyRollup, Habit, User
+from utils.day_boundary import local_day, user_day_by_id
+from utils.weekdays import ALL_DAYS_MASK
+
+WEEKDAY_NAMES = ("Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom")
+
+# Mínimo de dias avaliados para calcular correlação
+MIN_CORRELATION_DAYS = 5
+
+
+@dataclass(frozen=True)
+class HabitHistory:
+    """Histórico em colunas; dias são índices a partir de ``start``"""
+    start: date
+    days: int
+    # Logs completados
+    log_user: np.ndarray
+    log_habit: np.ndarray
+    log_day: np.ndarray
+    log_xp: np.ndarray
+    # Hábitos ativos (ordenados por id)
+    habit_id: np.ndarray
+    habit_user: np.ndarray
+    habit_mask: np.ndarray
+    habit_start: np.ndarray  # primeiro dia (índice) em que o hábito existe
+    habit_name: tuple
+    # Avaliações diárias
+    rating_user: np.ndarray
+    rating_day: np.ndarray
+    mood: np.ndarray
+    energy: np.ndarray
+
+    @property
+    def weekdays(self) -> np.ndarray:
+        """Dia da semana (0=segunda) de cada índice de dia"""
+        return (np.arange(self.days) + self.start.weekday()) % 7
+
+
+def _day_index(days, start: date) -> np.ndarray:
+    ordinals = np.fromiter((d.toordinal() for d in days), dtype=np.int64, count=len(days))
+    return (ordinals - start.toordinal()).astype(np.int32)
+
+
+def load_history(
+    db: Session, user_id: Optional[int] = None, days: int = 90, today: Optional[date] = None
+) -> HabitHistory:
+    """
+    Carrega o histórico dos últimos ``days`` dias (incluindo ``today``) de um
+    usuário (id interno) ou, com ``user_id=None``, de todos os usuários.
+    """
+    if today is None:
+        today = user_day_by_id(db, user_id).day if user_id is not None else local_day().day
+    start = today - timedelta(days=days - 1)
+
+    def scoped(query, column):
+        return query if user_id is None else query.where(column == user_id)
+
+    logs = db.execute(
+        scoped(
+            select(DailyLog.user_id, DailyLog.habit_id, DailyLog.log_date, DailyLog.xp_earned)
+            .where(DailyLog.completed == True, DailyLog.log_date >= start, DailyLog.log_date <= today),
+            DailyLog.user_id,
+        )
+    ).all()
+
+    habits = db.execute(
+        scoped(
+            select(Habit.id, Habit.user_id, Habit.days_mask, Habit.created_at, Habit.name)
+            .where(Habit.is_active == True)
+            .order_by(Habit.id),
+            Habit.user_id,
+        )
+    ).all()
+
+    ratings = db.execute(
+        scoped(
+            select(
+                DailyRollup.user_id, DailyRollup.day, DailyRollup.mood_rating, DailyRollup.energy_rating
+            ).where(
+                DailyRollup.day >= start,
+                DailyRollup.day <= today,
+                DailyRollup.mood_rating != None,
+            ),
+            DailyRollup.user_id,
+        )
+    ).all()
+
+    log_columns = list(zip(*logs, strict=True)) or [(), (), (), ()]
+    habit_columns = list(zip(*habits, strict=True)) or [(), (), (), (), ()]
+    rating_columns = list(zip(*ratings, strict=True)) or [(), (), (), ()]
+
+    habit_created = [created.date() if created else start for created in habit_columns[3]]
+    return HabitHistory(
+        start=start,
+        days=days,
+        log_user=np.asarray(log_columns[0], dtype=np.int64),
+        log_habit=np.asarray(log_columns[1], dtype=np.int64),
+        log_day=_day_index(log_columns[2], start),
+        log_xp=np.asarray([xp or 0 for xp in log_columns[3]], dtype=np.int64),
+        habit_id=np.asarray(habit_columns[0], dtype=np.int64),
+        habit_user=np.asarray(habit_columns[1], dtype=np.int64),
+        habit_mask=np.asarray(
+            [ALL_DAYS_MASK if mask is None else mask for mask in habit_columns[2]], dtype=np.int64
+        ),
+        habit_start=np.clip(_day_index(habit_created, start), 0, None),
+        habit_name=tuple(habit_columns[4]),
+        rating_user=np.asarray(rating_columns[0], dtype=np.int64),
+        rating_day=_day_index(rating_columns[1], start),
+        mood=np.asarray(rating_columns[2], dtype=np.float64),
+        energy=np.asarray([e if e is not None else np.nan for e in rating_columns[3]], dtype=np.float64),
+    )
+
+
+def scheduled_matrix(history: HabitHistory) -> np.ndarray:
+    """Matriz dia × hábito: o hábito estava agendado (e já existia) no dia"""
+    day_bits = (1 << history.weekdays)[:, None]
+    scheduled = (history.habit_mask[None, :] & day_bits) != 0
+    scheduled &= np.arange(history.days)[:, None] >= history.habit_start[None, :]
+    return scheduled
+
+
+def done_matrix(history: HabitHistory) -> np.ndarray:
+    """Matriz dia × hábito: o hábito foi completado no dia"""
+    done = np.zeros((history.days, len(history.habit_id)), dtype=bool)
+    if len(history.habit_id) == 0 or len(history.log_habit) == 0:
+        return done
+
+    columns = np.searchsorted(history.habit_id, history.log_habit)
+    columns = np.clip(columns, 0, len(history.habit_id) - 1)
+    known = history.habit_id[columns] == history.log_habit  # ignora hábitos inativos
+    done[history.log_day[known], columns[known]] = True
+    return done
+
+
+def runs(active: np.ndarray) -> tuple:
+    """(sequência atual, maior sequência) de ``True`` consecutivos"""
+    if active.size == 0:
+        return 0, 0
+    padded = np.concatenate(([False], active.astype(bool), [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    lengths = edges[1::2] - edges[::2]
+    if lengths.size == 0:
+        return 0, 0
+    current = int(lengths[-1]) if active[-1] else 0
+    return current, int(lengths.max())
+
+
+def rolling_rate(done: np.ndarray, scheduled: np.ndarray, window: int = 7) -> np.ndarray:
+    """Taxa de conclusão em janela móvel de ``window`` dias (NaN sem agendamento)"""
+    kernel = np.ones(window)
+    done_per_day = done.sum(axis=1) if done.ndim == 2 else done
+    scheduled_per_day = scheduled.sum(axis=1) if scheduled.ndim == 2 else scheduled
+    done_sum = np.convolve(done_per_day, kernel)[: len(done_per_day)]
+    scheduled_sum = np.convolve(scheduled_per_day, kernel)[: len(scheduled_per_day)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(scheduled_sum > 0, done_sum / scheduled_sum, np.nan)
+
+
+def weekday_rates(done: np.ndarray, scheduled: np.ndarray, weekdays: np.ndarray) -> np.ndarray:
+    """Taxa de conclusão por dia da semana (7 posições, NaN sem agendamento)"""
+    done_by_weekday = np.bincount(weekdays, weights=done.sum(axis=1), minlength=7)
+    scheduled_by_weekday = np.bincount(weekdays, weights=scheduled.sum(axis=1), minlength=7)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(scheduled_by_weekday > 0, done_by_weekday / scheduled_by_weekday, np.nan)
+
+
+def correlation(x: np.ndarray, y: np.ndarray) -> Optional[float]:
+    """Correlação de Pearson (None com poucos pontos ou variância nula)"""
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    if x.size < MIN_CORRELATION_DAYS or x.std() == 0 or y.std() == 0:
+        return None
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def _rating_correlations(history: HabitHistory, completions_per_day: np.ndarray) -> Dict[str, Any]:
+    completions = completions_per_day[history.rating_day].astype(np.float64)
+    return {
+        "rated_days": int(len(completions)),
+        "mood_correlation": correlation(history.mood, completions),
+        "energy_correlation": correlation(history.energy, completions),
+    }
+
+
+def _nan_to_none(values: np.ndarray) -> list:
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def user_insights(db: Session, user_id: int, days: int = 90) -> Dict[str, Any]:
+    """Insights de um usuário (id interno) sobre os últimos ``days`` dias"""
+    history = load_history(db, user_id, days)
+    scheduled = scheduled_matrix(history)
+    done = done_matrix(history) & scheduled
+
+    total_scheduled = int(scheduled.sum())
+    habit_rates = np.divide(
+        done.sum(axis=0), scheduled.sum(axis=0),
+        out=np.full(len(history.habit_id), np.nan), where=scheduled.sum(axis=0) > 0,
+    )
+
+    # Dias ativos (qualquer conclusão, inclusive de hábitos desativados)
+    active_days = np.bincount(history.log_day, minlength=history.days) > 0
+    current_run, longest_run = runs(active_days)
+
+    rolling = rolling_rate(done, scheduled)
+    by_weekday = weekday_rates(done, scheduled, history.weekdays)
+    completions_per_day = np.bincount(history.log_day, minlength=history.days)
+
+    return {
+        "days": days,
+        "completion_rate": (done.sum() / total_scheduled * 100) if total_scheduled else 0.0,
+        "habit_rates": sorted(
+            (
+                (name, float(rate * 100))
+                for name, rate in zip(history.habit_name, habit_rates, strict=True)
+                if not np.isnan(rate)
+            ),
+            key=lambda item: item[1],
+            reverse=True,
+        ),
+        "active_days": int(active_days.sum()),
+        "current_run": current_run,
+        "longest_run": longest_run,
+        "rolling_7d": None if np.isnan(rolling[-1]) else float(rolling[-1] * 100),
+        "previous_7d": (
+            None if days < 8 or np.isnan(rolling[-8]) else float(rolling[-8] * 100)
+        ),
+        "weekday_rates": _nan_to_none(by_weekday * 100),
+        "total_xp": int(history.log_xp.sum()),
+        **_rating_correlations(history, completions_per_day),
+    }
+
+
+def global_report(db: Session, days: int = 30) -> Dict[str, Any]:
+    """Relatório agregado de toda a base sobre os últimos ``days`` dias"""
+    history = load_history(db, None, days)
+    scheduled = scheduled_matrix(history)
+    done = done_matrix(history) & scheduled
+    total_scheduled = int(scheduled.sum())
+
+    # Usuários ativos por dia: pares (usuário, dia) distintos
+    user_days = np.unique(np.stack([history.log_user, history.log_day]), axis=1)
+    daily_active = np.bincount(user_days[1], minlength=history.days)
+    active_users = np.unique(history.log_user)
+
+    # Correlação por (usuário, dia) avaliado: conclusões do usuário naquele dia
+    users, user_index = np.unique(
+        np.concatenate([history.log_user, history.rating_user]), return_inverse=True
+    )
+    completions = np.zeros((len(users), history.days), dtype=np.int64)
+    np.add.at(completions, (user_index[: len(history.log_user)], history.log_day), 1)
+    rated = completions[user_index[len(history.log_user):], history.rating_day].astype(np.float64)
+
+    return {
+        "days": days,
+        "total_users": db.query(User).count(),
+        "active_users": int(active_users.size),
+        "total_completions": int(history.log_user.size),
+        "total_xp": int(history.log_xp.sum()),
+        "completion_rate": (done.sum() / total_scheduled * 100) if total_scheduled else 0.0,
+        "avg_completions_per_active_user": (
+            float(history.log_user.size / active_users.size) if active_users.size else 0.0
+        ),
+        "daily_active_users": daily_active.tolist(),
+        "avg_daily_active_users": float(daily_active.mean()) if days else 0.0,
+        "weekday_rates": _nan_to_none(weekday_rates(done, scheduled, history.weekdays) * 100),
+        "rated_days": int(rated.size),
+        "mood_correlation": correlation(history.mood, rated),
+        "energy_correlation": correlation(history.energy, rated),
+    }
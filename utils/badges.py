@@ -0,0 +1,248 @@
+"""
+Motor de regras de badges e conquistas
+
+Cada item de ``config.BADGES`` / ``config.ACHIEVEMENTS`` declara a métrica
+de que depende (``metric``) e o limite (``threshold`` ou ``target``). A
+avaliação reavalia só as regras cujas métricas mudaram no evento, descarta
+as que já falham com valores conhecidos, busca numa única linha agregada as
+métricas restantes e se cada regra já foi conquistada, e insere as novas.
+A unicidade (usuário, nome) no banco e o ``ON CONFLICT DO NOTHING`` evitam
+concessão dupla quando duas conclusões concorrentes avaliam a mesma regra.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from sqlalchemy import and_, case, exists, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from config import ACHIEVEMENTS, BADGES
+from models.models import Achievement, Badge, DailyLog, Habit, User, UserStatsAggregate
+from utils.day_boundary import user_day_by_id
+from utils.logging_config import get_logger
+from utils.user_stats import record_badge_stats
+from utils.weekdays import weekday_bit
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class BadgeRule:
+    """Regra de concessão: ``metric >= threshold``"""
+    key: str
+    kind: str  # "badge" ou "achievement"
+    metric: str
+    threshold: int
+    data: Mapping[str, Any]
+
+    @property
+    def name(self) -> str:
+        return self.data["name"]
+
+
+def _completed_today(user_id: int, today: date):
+    return (
+        select(func.count(DailyLog.id))
+        .where(
+            DailyLog.user_id == user_id,
+            DailyLog.log_date == today,
+            DailyLog.completed == True,
+        )
+        .scalar_subquery()
+    )
+
+
+def _scheduled_today(user_id: int, today: date):
+    return (
+        select(func.count(Habit.id))
+        .where(
+            Habit.user_id == user_id,
+            Habit.is_active == True,
+            Habit.days_mask.op("&")(weekday_bit(today)) != 0,
+        )
+        .scalar_subquery()
+    )
+
+
+def _perfect_day(user_id: int, today: date):
+    scheduled = _scheduled_today(user_id, today)
+    return case(
+        (and_(scheduled > 0, _completed_today(user_id, today) >= scheduled), 1),
+        else_=0,
+    )
+
+
+def _total_completions(user_id: int, today: date):
+    # Contador do user_stats; a contagem nos logs só roda se a linha não existe
+    return func.coalesce(
+        select(UserStatsAggregate.completed_logs)
+        .where(UserStatsAggregate.user_id == user_id)
+        .scalar_subquery(),
+        select(func.count(DailyLog.id))
+        .where(DailyLog.user_id == user_id, DailyLog.completed == True)
+        .scalar_subquery(),
+    )
+
+
+# Métrica -> expressão SQL (sobre a linha do usuário) que a calcula
+METRICS = {
+    "total_xp": lambda user_id, today: func.coalesce(User.total_xp_earned, 0),
+    "current_level": lambda user_id, today: func.coalesce(User.current_level, 1),
+    "current_streak": lambda user_id, today: func.coalesce(User.current_streak, 0),
+    "longest_streak": lambda user_id, today: func.coalesce(User.longest_streak, 0),
+    "total_completions": _total_completions,
+    "completed_today": _completed_today,
+    "perfect_day": _perfect_day,
+}
+
+# Métricas que podem mudar ao completar hábitos
+COMPLETION_METRICS = frozenset(
+    {"total_xp", "current_level", "current_streak", "longest_streak",
+     "total_completions", "completed_today", "perfect_day"}
+)
+
+
+def _load_rules() -> tuple:
+    rules = []
+    for kind, items, limit_key in (
+        ("badge", BADGES, "threshold"),
+        ("achievement", ACHIEVEMENTS, "target"),
+    ):
+        for key, data in items.items():
+            metric = data.get("metric")
+            if metric is None:
+                continue
+            if metric not in METRICS:
+                raise ValueError(f"Métrica desconhecida '{metric}' na regra {key}")
+            rules.append(BadgeRule(key, kind, metric, int(data.get(limit_key, 1)), data))
+    return tuple(rules)
+
+
+RULES = _load_rules()
+
+
+def _earned_flag(rule: BadgeRule, user_id: int):
+    model = Badge if rule.kind == "badge" else Achievement
+    return exists().where(model.user_id == user_id, model.name == rule.name)
+
+
+# Dialetos com INSERT ... ON CONFLICT DO NOTHING
+_INSERT_IGNORE = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _award(db: Session, model, rows: List[Dict[str, Any]]) -> set:
+    """
+    Insere as badges/conquistas em um único INSERT e retorna os nomes
+    inseridos (as já concedidas por outra transação ficam de fora).
+    """
+    dialect_insert = _INSERT_IGNORE.get(db.get_bind().dialect.name)
+    if dialect_insert is None:
+        db.execute(insert(model), rows)
+        return {row["name"] for row in rows}
+    return set(
+        db.execute(
+            dialect_insert(model)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["user_id", "name"])
+            .returning(model.name)
+        ).scalars()
+    )
+
+
+def _award_values(rule: BadgeRule, user_id: int) -> Dict[str, Any]:
+    if rule.kind == "badge":
+        return {
+            "user_id": user_id,
+            "name": rule.name,
+            "description": rule.data["description"],
+            "icon": rule.data["icon"],
+            "category": rule.data["category"],
+            "is_rare": rule.data["is_rare"],
+            "xp_bonus": rule.data["xp_bonus"],
+        }
+    return {
+        "user_id": user_id,
+        "name": rule.name,
+        "description": rule.data["description"],
+        "category": rule.data["category"],
+        "xp_reward": rule.data["xp_reward"],
+        "is_hidden": rule.data["is_hidden"],
+        "progress": float(rule.threshold),
+        "target": float(rule.threshold),
+    }
+
+
+def evaluate_badges(
+    db: Session,
+    user_id: int,
+    changed: Optional[Iterable[str]] = None,
+    known: Optional[Mapping[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Avalia as regras e concede as badges/conquistas novas (com commit).
+
+    ``changed`` limita a avaliação às regras que dependem dessas métricas
+    (None = todas); ``known`` traz valores já conhecidos pelo evento, que
+    dispensam o cálculo no banco. Retorna os itens concedidos.
+    """
+    known = dict(known or {})
+    changed = None if changed is None else set(changed)
+
+    candidates = [
+        rule
+        for rule in RULES
+        if (changed is None or rule.metric in changed)
+        and known.get(rule.metric, rule.threshold) >= rule.threshold
+    ]
+    if not candidates:
+        return []
+
+    today = user_day_by_id(db, user_id).day
+    metrics = sorted({rule.metric for rule in candidates} - known.keys())
+    columns = [METRICS[metric](user_id, today).label(metric) for metric in metrics]
+    columns += [
+        _earned_flag(rule, user_id).label(f"earned_{i}") for i, rule in enumerate(candidates)
+    ]
+
+    # Uma única linha: métricas pendentes + se cada regra já foi conquistada
+    row = db.execute(select(*columns).select_from(User).where(User.id == user_id)).first()
+    if row is None:
+        return []
+
+    values = {**known, **{metric: getattr(row, metric) or 0 for metric in metrics}}
+    earned = [
+        rule
+        for i, rule in enumerate(candidates)
+        if not getattr(row, f"earned_{i}") and values[rule.metric] >= rule.threshold
+    ]
+    if not earned:
+        return []
+
+    inserted = set()
+    for kind, model in (("badge", Badge), ("achievement", Achievement)):
+        rows = [_award_values(rule, user_id) for rule in earned if rule.kind == kind]
+        if rows:
+            inserted |= {(kind, name) for name in _award(db, model, rows)}
+    earned = [rule for rule in earned if (rule.kind, rule.name) in inserted]
+    badges = [rule for rule in earned if rule.kind == "badge"]
+    if badges:
+        record_badge_stats(
+            db, user_id, len(badges), sum(1 for rule in badges if rule.data["is_rare"])
+        )
+    db.commit()
+    if not earned:
+        return []
+
+    logger.info(f"Usuário {user_id} conquistou: {', '.join(rule.name for rule in earned)}")
+    return [
+        {
+            "key": rule.key,
+            "kind": rule.kind,
+            "name": rule.name,
+            "description": rule.data["description"],
+            "icon": rule.data.get("icon", "🏆"),
+        }
+        for rule in earned
+    ]
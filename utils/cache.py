@@ -2,96 +2,588 @@
 Sistema de cache para melhorar performance
 """
 
+import dataclasses
+import heapq
+import json
+import threading
 import time
-from typing import Any, Optional, Dict, List
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Optional, Dict, List, Set, Tuple
 from functools import wraps
-from datetime import datetime, timedelta
+from datetime import date, datetime
+
+from app_types import HabitRecord
+from config import (
+    CACHE_BACKEND,
+    CACHE_DEFAULT_TTL,
+    CACHE_LOCAL_TTL,
+    CACHE_MAX_SIZE,
+    REDIS_URL,
+)
+from utils.day_boundary import local_day
 from utils.logging_config import get_logger
 
 logger = get_logger(__name__)
 
 
-class Cache:
-    """Cache simples em memória com TTL"""
-    
-    def __init__(self):
-        self._cache: Dict[str, Dict[str, Any]] = {}
+# Valores no Redis são JSON; tipos sem equivalente (tupla, conjunto, data e
+# as dataclasses registradas) vão marcados com _TYPE_TAG
+_TYPE_TAG = "__cache_type__"
+_JSON_TYPES: Dict[str, type] = {}
+_JSON_DECODERS = {
+    "tuple": tuple,
+    "frozenset": frozenset,
+    "set": set,
+    "dict": dict,
+    "date": date.fromisoformat,
+    "datetime": datetime.fromisoformat,
+}
+
+
+def register_cache_type(cls: type) -> type:
+    """Permite gravar instâncias da dataclass ``cls`` no backend Redis"""
+    _JSON_TYPES[cls.__name__] = cls
+    return cls
+
+
+register_cache_type(HabitRecord)
+
+
+def _to_json(value: Any) -> Any:
+    """Converte o valor em estrutura serializável em JSON"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, list):
+        return [_to_json(item) for item in value]
+    if isinstance(value, dict):
+        if _TYPE_TAG not in value and all(isinstance(k, str) for k in value):
+            return {k: _to_json(v) for k, v in value.items()}
+        tagged = [[_to_json(k), _to_json(v)] for k, v in value.items()]
+        return {_TYPE_TAG: "dict", "value": tagged}
+    if isinstance(value, (tuple, frozenset, set)):
+        kind = "tuple" if isinstance(value, tuple) else type(value).__name__
+        return {_TYPE_TAG: kind, "value": [_to_json(item) for item in value]}
+    if isinstance(value, datetime):
+        return {_TYPE_TAG: "datetime", "value": value.isoformat()}
+    if isinstance(value, date):
+        return {_TYPE_TAG: "date", "value": value.isoformat()}
+
+    name = type(value).__name__
+    if _JSON_TYPES.get(name) is type(value):
+        fields = {f.name: _to_json(getattr(value, f.name)) for f in dataclasses.fields(value)}
+        return {_TYPE_TAG: name, "value": fields}
+    raise TypeError(f"Tipo não suportado pelo cache Redis: {name}")
+
+
+def _from_json(obj: Dict[str, Any]) -> Any:
+    """``object_hook`` do json.loads: reconstrói os valores marcados"""
+    kind = obj.get(_TYPE_TAG)
+    if kind is None:
+        return obj
+    if kind in _JSON_TYPES:
+        return _JSON_TYPES[kind](**obj["value"])
+    return _JSON_DECODERS[kind](obj["value"])
+
+
+def _dumps(user_id: Optional[int], value: Any) -> str:
+    return json.dumps({"user_id": user_id, "value": _to_json(value)}, separators=(",", ":"))
+
+
+def _loads(payload) -> Tuple[Optional[int], Any]:
+    data = json.loads(payload, object_hook=_from_json)
+    return data["user_id"], data["value"]
+
+
+class _CacheEntry:
+    """Item do cache (valor, expiração e dono)"""
+
+    __slots__ = ("value", "expires_at", "user_id")
+
+    def __init__(self, value: Any, expires_at: float, user_id: Optional[int]):
+        self.value = value
+        self.expires_at = expires_at
+        self.user_id = user_id
+
+
+class CacheBackend(ABC):
+    """Interface comum dos backends de cache (memória e Redis)"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl_seconds: Optional[int] = None,
+        user_id: Optional[int] = None,
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def invalidate_user(self, user_id: int) -> int:
+        ...
+
+    @abstractmethod
+    def delete_matching(self, pattern: str) -> int:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def cleanup_expired(self) -> int:
+        ...
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Any]:
+        ...
+
+
+class Cache(CacheBackend):
+    """
+    Cache em memória (backend padrão) com tamanho máximo (LRU) e TTL por item.
+
+    - LRU: OrderedDict, com ``move_to_end`` no acesso e remoção do mais
+      antigo ao exceder ``max_size`` (O(1)).
+    - TTL: heap de expirações; itens vencidos saem em O(log n) cada, sem
+      varrer o cache inteiro.
+    - Índice por usuário: ``set(..., user_id=...)`` registra a chave para
+      que ``invalidate_user`` remova só as chaves daquele usuário.
+    """
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE, default_ttl: int = CACHE_DEFAULT_TTL):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self._cache: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._expirations: List[Tuple[float, str]] = []
+        self._user_keys: Dict[int, Set[str]] = {}
+        self._lock = threading.RLock()
         self._stats = {
             "hits": 0,
             "misses": 0,
             "sets": 0,
-            "deletes": 0
+            "deletes": 0,
+            "evictions": 0,
+            "expirations": 0,
         }
-    
+
     def get(self, key: str) -> Optional[Any]:
         """Busca valor no cache"""
-        if key not in self._cache:
-            self._stats["misses"] += 1
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return None
+
+            # Verifica se expirou
+            if time.monotonic() >= item.expires_at:
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return item.value
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl_seconds: Optional[int] = None,
+        user_id: Optional[int] = None,
+    ) -> None:
+        """Define valor no cache com TTL (opcionalmente associado a um usuário)"""
+        now = time.monotonic()
+        expires_at = now + (self.default_ttl if ttl_seconds is None else ttl_seconds)
+
+        with self._lock:
+            if key in self._cache:
+                self._remove(key)
+
+            self._cache[key] = _CacheEntry(value, expires_at, user_id)
+            heapq.heappush(self._expirations, (expires_at, key))
+            if user_id is not None:
+                self._user_keys.setdefault(user_id, set()).add(key)
+            self._stats["sets"] += 1
+
+            self._purge_expired(now)
+
+            # Remove os itens menos usados recentemente
+            while len(self._cache) > self.max_size:
+                old_key, old_item = self._cache.popitem(last=False)
+                self._unindex(old_key, old_item)
+                self._stats["evictions"] += 1
+
+            self._compact_expirations()
+
+    def delete(self, key: str) -> None:
+        """Remove valor do cache"""
+        with self._lock:
+            if key in self._cache:
+                self._remove(key)
+                self._stats["deletes"] += 1
+
+    def invalidate_user(self, user_id: int) -> int:
+        """Remove todas as chaves associadas ao usuário"""
+        with self._lock:
+            keys = self._user_keys.pop(user_id, ())
+            for key in keys:
+                self._cache.pop(key, None)
+            self._stats["deletes"] += len(keys)
+            return len(keys)
+
+    def delete_matching(self, pattern: str) -> int:
+        """Remove chaves que contêm o padrão (varredura completa)"""
+        with self._lock:
+            keys_to_delete = [key for key in self._cache if pattern in key]
+            for key in keys_to_delete:
+                self._remove(key)
+            self._stats["deletes"] += len(keys_to_delete)
+            return len(keys_to_delete)
+
+    def clear(self) -> None:
+        """Limpa todo o cache"""
+        with self._lock:
+            self._cache.clear()
+            self._expirations.clear()
+            self._user_keys.clear()
+        logger.info("Cache limpo")
+
+    def cleanup_expired(self) -> int:
+        """Remove itens expirados e retorna quantidade removida"""
+        with self._lock:
+            removed = self._purge_expired(time.monotonic())
+
+        if removed:
+            logger.info(f"Removidos {removed} itens expirados do cache")
+
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Retorna estatísticas do cache"""
+        with self._lock:
+            total_requests = self._stats["hits"] + self._stats["misses"]
+            hit_rate = (self._stats["hits"] / total_requests * 100) if total_requests > 0 else 0
+
+            return {
+                **self._stats,
+                "total_requests": total_requests,
+                "hit_rate": hit_rate,
+                "current_size": len(self._cache),
+                "max_size": self.max_size,
+                "tracked_users": len(self._user_keys),
+            }
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _purge_expired(self, now: float) -> int:
+        """Retira do heap as expirações vencidas (chamado com o lock)"""
+        removed = 0
+        while self._expirations and self._expirations[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expirations)
+            item = self._cache.get(key)
+            # Entradas do heap podem estar obsoletas (chave regravada/removida)
+            if item is not None and item.expires_at == expires_at:
+                self._remove(key)
+                removed += 1
+
+        self._stats["expirations"] += removed
+        return removed
+
+    def _compact_expirations(self) -> None:
+        """Reconstrói o heap quando acumula muitas entradas obsoletas"""
+        if len(self._expirations) > 2 * len(self._cache) + 64:
+            self._expirations = [
+                (item.expires_at, key) for key, item in self._cache.items()
+            ]
+            heapq.heapify(self._expirations)
+
+    def _remove(self, key: str) -> None:
+        item = self._cache.pop(key)
+        self._unindex(key, item)
+
+    def _unindex(self, key: str, item: _CacheEntry) -> None:
+        if item.user_id is None:
+            return
+        keys = self._user_keys.get(item.user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[item.user_id]
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache compartilhado entre processos em um servidor Redis.
+
+    Valores são serializados em JSON (dataclasses via
+    ``register_cache_type``) e gravados com TTL no Redis; as chaves de cada
+    usuário ficam em um SET para ``invalidate_user``. Cada
+    processo mantém um cache local curto (``local_ttl``) na frente do Redis,
+    e as invalidações são publicadas via pub/sub para que os demais
+    processos descartem suas cópias locais.
+    """
+
+    def __init__(
+        self,
+        url: str = REDIS_URL,
+        client=None,
+        prefix: str = "habitbot:cache",
+        default_ttl: int = CACHE_DEFAULT_TTL,
+        local_ttl: int = CACHE_LOCAL_TTL,
+        local_max_size: int = CACHE_MAX_SIZE,
+    ):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+
+        self.default_ttl = default_ttl
+        self._redis = client
+        self._prefix = prefix
+        self._channel = f"{prefix}:invalidate"
+        self._origin = uuid.uuid4().hex
+        self._local = Cache(max_size=local_max_size, default_ttl=local_ttl) if local_ttl > 0 else None
+        self._listener = None
+        self._stats = {
+            "hits": 0,
+            "local_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "deletes": 0,
+            "errors": 0,
+            "invalidations_received": 0,
+        }
+
+    def get(self, key: str) -> Optional[Any]:
+        """Busca valor no cache local e, se ausente, no Redis"""
+        if self._local is not None:
+            value = self._local.get(key)
+            if value is not None:
+                self._stats["local_hits"] += 1
+                return value
+
+        try:
+            payload = self._redis.get(self._key(key))
+        except Exception as e:
+            self._on_error("get", e)
             return None
-        
-        item = self._cache[key]
-        
-        # Verifica se expirou
-        if time.time() > item["expires_at"]:
-            del self._cache[key]
+
+        if payload is None:
             self._stats["misses"] += 1
             return None
-        
+
+        try:
+            user_id, value = _loads(payload)
+        except (KeyError, TypeError, ValueError) as e:
+            self._on_error("decode", e)
+            return None
+
+        if self._local is not None:
+            self._local.set(key, value, user_id=user_id)
         self._stats["hits"] += 1
-        return item["value"]
-    
-    def set(self, key: str, value: Any, ttl_seconds: int = 300) -> None:
-        """Define valor no cache com TTL"""
-        self._cache[key] = {
-            "value": value,
-            "expires_at": time.time() + ttl_seconds,
-            "created_at": time.time()
-        }
+        return value
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl_seconds: Optional[int] = None,
+        user_id: Optional[int] = None,
+    ) -> None:
+        """Grava valor no Redis com TTL e avisa os outros processos"""
+        ttl = self.default_ttl if ttl_seconds is None else ttl_seconds
+        redis_key = self._key(key)
+
+        try:
+            pipe = self._redis.pipeline()
+            pipe.set(redis_key, _dumps(user_id, value), px=max(1, int(ttl * 1000)))
+            if user_id is not None:
+                # Índice do usuário vive pelo menos o TTL padrão
+                user_key = self._user_key(user_id)
+                pipe.sadd(user_key, redis_key)
+                pipe.expire(user_key, max(int(ttl), self.default_ttl))
+            pipe.execute()
+        except Exception as e:
+            self._on_error("set", e)
+            return
+
         self._stats["sets"] += 1
-    
+        if self._local is not None:
+            self._local.set(key, value, ttl_seconds=min(ttl, self._local.default_ttl), user_id=user_id)
+        self._publish(key=key)
+
     def delete(self, key: str) -> None:
-        """Remove valor do cache"""
-        if key in self._cache:
-            del self._cache[key]
-            self._stats["deletes"] += 1
-    
+        """Remove valor do Redis e das cópias locais"""
+        try:
+            self._redis.delete(self._key(key))
+        except Exception as e:
+            self._on_error("delete", e)
+
+        self._stats["deletes"] += 1
+        if self._local is not None:
+            self._local.delete(key)
+        self._publish(key=key)
+
+    def invalidate_user(self, user_id: int) -> int:
+        """Remove as chaves do usuário em todos os processos"""
+        user_key = self._user_key(user_id)
+        removed = 0
+
+        try:
+            keys = self._redis.smembers(user_key)
+            if keys:
+                removed = self._redis.delete(*keys)
+            self._redis.delete(user_key)
+        except Exception as e:
+            self._on_error("invalidate_user", e)
+
+        self._stats["deletes"] += removed
+        if self._local is not None:
+            self._local.invalidate_user(user_id)
+        self._publish(user_id=user_id)
+        return removed
+
+    def delete_matching(self, pattern: str) -> int:
+        """Remove chaves que contêm o padrão (SCAN no prefixo do cache)"""
+        removed = 0
+
+        try:
+            keys = list(self._redis.scan_iter(match=f"{self._prefix}:*{pattern}*"))
+            if keys:
+                removed = self._redis.delete(*keys)
+        except Exception as e:
+            self._on_error("delete_matching", e)
+
+        self._stats["deletes"] += removed
+        if self._local is not None:
+            self._local.delete_matching(pattern)
+        self._publish(pattern=pattern)
+        return removed
+
     def clear(self) -> None:
-        """Limpa todo o cache"""
-        self._cache.clear()
+        """Limpa todas as chaves do cache (somente o prefixo do bot)"""
+        try:
+            keys = list(self._redis.scan_iter(match=f"{self._prefix}:*"))
+            if keys:
+                self._redis.delete(*keys)
+        except Exception as e:
+            self._on_error("clear", e)
+
+        if self._local is not None:
+            self._local.clear()
+        self._publish(clear=True)
         logger.info("Cache limpo")
-    
+
     def cleanup_expired(self) -> int:
-        """Remove itens expirados e retorna quantidade removida"""
-        now = time.time()
-        expired_keys = [
-            key for key, item in self._cache.items()
-            if now > item["expires_at"]
-        ]
-        
-        for key in expired_keys:
-            del self._cache[key]
-        
-        if expired_keys:
-            logger.info(f"Removidos {len(expired_keys)} itens expirados do cache")
-        
-        return len(expired_keys)
-    
+        """Redis expira as chaves sozinho; limpa apenas o cache local"""
+        return self._local.cleanup_expired() if self._local is not None else 0
+
     def get_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas do cache"""
-        total_requests = self._stats["hits"] + self._stats["misses"]
-        hit_rate = (self._stats["hits"] / total_requests * 100) if total_requests > 0 else 0
-        
+        total_requests = self._stats["hits"] + self._stats["local_hits"] + self._stats["misses"]
+        hits = self._stats["hits"] + self._stats["local_hits"]
+
         return {
             **self._stats,
+            "backend": "redis",
             "total_requests": total_requests,
-            "hit_rate": hit_rate,
-            "current_size": len(self._cache),
-            "keys": list(self._cache.keys())
+            "hit_rate": (hits / total_requests * 100) if total_requests > 0 else 0,
+            "local_size": len(self._local) if self._local is not None else 0,
+            "listening": self._listener is not None,
         }
 
+    def start_listener(self) -> None:
+        """Assina o canal de invalidação (thread em segundo plano)"""
+        if self._listener is not None:
+            return
+
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self._channel: self._handle_invalidation})
+        self._listener = pubsub.run_in_thread(sleep_time=0.1, daemon=True)
+        logger.info(f"Invalidação de cache via pub/sub ativa ({self._channel})")
+
+    def stop_listener(self) -> None:
+        """Encerra a assinatura do canal de invalidação"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+    def disable_local_cache(self) -> None:
+        """Desliga o cache local (sem pub/sub as cópias locais ficariam velhas)"""
+        self._local = None
+
+    def _handle_invalidation(self, message: Dict[str, Any]) -> None:
+        """Aplica ao cache local uma invalidação publicada por outro processo"""
+        try:
+            event = json.loads(message["data"])
+        except (TypeError, ValueError):
+            return
+
+        if event.get("origin") == self._origin or self._local is None:
+            return
+
+        self._stats["invalidations_received"] += 1
+        if "key" in event:
+            self._local.delete(event["key"])
+        elif "user_id" in event:
+            self._local.invalidate_user(event["user_id"])
+        elif "pattern" in event:
+            self._local.delete_matching(event["pattern"])
+        elif event.get("clear"):
+            self._local.clear()
+
+    def _publish(self, **event: Any) -> None:
+        """Publica a invalidação em JSON: {"origin", "key" | "user_id" | "pattern" | "clear"}"""
+        if self._local is None:
+            return
+        try:
+            self._redis.publish(self._channel, json.dumps({"origin": self._origin, **event}))
+        except Exception as e:
+            self._on_error("publish", e)
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}:{key}"
+
+    def _user_key(self, user_id: int) -> str:
+        return f"{self._prefix}:user:{user_id}"
+
+    def _on_error(self, operation: str, error: Exception) -> None:
+        # Falha no Redis não pode derrubar o bot: trata como cache miss
+        self._stats["errors"] += 1
+        logger.warning(f"Erro no cache Redis ({operation}): {error}")
+
+
+def create_cache(backend: str = CACHE_BACKEND) -> CacheBackend:
+    """Cria o backend de cache configurado (CACHE_BACKEND=memory|redis)"""
+    if backend != "redis":
+        return Cache()
+
+    redis_cache = RedisCache()
+    try:
+        redis_cache.start_listener()
+    except Exception as e:
+        logger.error(f"Pub/sub do cache indisponível, cache local desativado: {e}")
+        redis_cache.disable_local_cache()
+
+    logger.info("Cache usando backend Redis")
+    return redis_cache
+
 
 # Cache global
-cache = Cache()
+cache = create_cache()
 
 
 def cached(ttl_seconds: int = 300, key_prefix: str = ""):
@@ -101,33 +593,30 @@ def cached(ttl_seconds: int = 300, key_prefix: str = ""):
         def wrapper(*args, **kwargs):
             # Gera chave única baseada na função e argumentos
             cache_key = f"{key_prefix}:{func.__name__}:{hash(str(args) + str(sorted(kwargs.items())))}"
-            
+
             # Tenta buscar do cache
             cached_result = cache.get(cache_key)
             if cached_result is not None:
                 return cached_result
-            
+
             # Executa função e cacheia resultado
             result = func(*args, **kwargs)
             cache.set(cache_key, result, ttl_seconds)
-            
+
             return result
-        
+
         return wrapper
     return decorator
 
 
 def invalidate_cache(pattern: str) -> int:
-    """Invalida cache baseado em padrão de chave"""
-    keys_to_delete = [key for key in cache._cache.keys() if pattern in key]
-    
-    for key in keys_to_delete:
-        cache.delete(key)
-    
-    if keys_to_delete:
-        logger.info(f"Invalidados {len(keys_to_delete)} itens do cache com padrão '{pattern}'")
-    
-    return len(keys_to_delete)
+    """Invalida cache baseado em padrão de chave (varre todas as chaves)"""
+    removed = cache.delete_matching(pattern)
+
+    if removed:
+        logger.info(f"Invalidados {removed} itens do cache com padrão '{pattern}'")
+
+    return removed
 
 
 # Funções específicas para cache de hábitos
@@ -141,30 +630,31 @@ def get_user_stats_cache_key(user_id: int) -> str:
     return f"user_stats:{user_id}"
 
 
-def get_daily_progress_cache_key(user_id: int) -> str:
-    """Gera chave de cache para progresso diário"""
-    today = datetime.now().strftime("%Y-%m-%d")
-    return f"daily_progress:{user_id}:{today}"
+def get_daily_progress_cache_key(user_id: int, day: Optional[date] = None) -> str:
+    """Gera chave de cache para progresso diário (dia local do usuário)"""
+    day = day or local_day().day
+    return f"daily_progress:{user_id}:{day.isoformat()}"
+
+
+def get_today_snapshot_cache_key(user_id: int) -> str:
+    """Gera chave de cache para o snapshot diário do usuário"""
+    return f"today_snapshot:{user_id}"
 
 
-def invalidate_user_cache(user_id: int) -> None:
-    """Invalida todo cache relacionado ao usuário"""
-    patterns = [
-        f"user_habits:{user_id}",
-        f"user_stats:{user_id}",
-        f"daily_progress:{user_id}"
-    ]
-    
-    for pattern in patterns:
-        invalidate_cache(pattern)
+def invalidate_user_cache(user_id: int) -> int:
+    """
+    Invalida todo cache relacionado ao usuário.
+
+    Usa o índice por usuário: chaves gravadas com ``user_id`` são removidas
+    em O(chaves do usuário).
+    """
+    return cache.invalidate_user(user_id)
 
 
 # Limpeza automática a cada 5 minutos
 def start_cache_cleanup():
     """Inicia limpeza automática do cache"""
-    import threading
-    import time
-    
+
     def cleanup_loop():
         while True:
             try:
@@ -173,8 +663,7 @@ def start_cache_cleanup():
             except Exception as e:
                 logger.error(f"Erro na limpeza do cache: {e}")
                 time.sleep(60)  # 1 minuto em caso de erro
-    
+
     cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
     cleanup_thread.start()
     logger.info("Limpeza automática do cache iniciada")
-
@@ -0,0 +1,177 @@
+"""
+Fronteira do dia por usuário (fuso horário)
+
+Timestamps são gravados em UTC sem tzinfo (como os defaults dos modelos);
+o "dia" de um usuário é a data local no fuso dele. A janela [início, fim)
+em UTC do dia corrente é calculada uma vez por fuso e reutilizada até a
+virada, alimentando filtros por ``log_date``, faixas de timestamps e chaves
+de cache.
+"""
+
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from typing import Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from config import DEFAULT_TIMEZONE
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_UTC = dt_timezone.utc
+
+# Janela do dia corrente por fuso (uma entrada por fuso em uso)
+_windows: Dict[str, "DayWindow"] = {}
+_windows_lock = threading.Lock()
+
+
+@dataclass(frozen=True, slots=True)
+class DayWindow:
+    """Dia local de um fuso e seus limites em UTC"""
+    timezone: str
+    day: date
+    start: datetime  # UTC, inclusivo
+    end: datetime  # UTC, exclusivo
+
+    def contains(self, moment: datetime) -> bool:
+        """Verifica se um timestamp UTC pertence a este dia"""
+        return self.start <= moment < self.end
+
+    def seconds_remaining(self, now: Optional[datetime] = None) -> int:
+        """Segundos até a virada do dia (usado como TTL de cache)"""
+        now = now or datetime.utcnow()
+        return max(1, int((self.end - now).total_seconds()))
+
+    def days_ago(self, days: int) -> date:
+        """Data local ``days`` dias antes de hoje"""
+        return self.day - timedelta(days=days)
+
+
+def is_valid_timezone(name: Optional[str]) -> bool:
+    """Verifica se o nome é um fuso IANA conhecido (ex: America/Sao_Paulo)"""
+    if not name:
+        return False
+    try:
+        _zone(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+@lru_cache(maxsize=None)
+def _zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def get_zone(name: Optional[str]) -> ZoneInfo:
+    """Retorna o ZoneInfo do fuso (fuso padrão se vazio ou inválido)"""
+    if is_valid_timezone(name):
+        return _zone(name)
+    if name:
+        logger.warning(f"Fuso horário inválido '{name}', usando {DEFAULT_TIMEZONE}")
+    return _zone(DEFAULT_TIMEZONE)
+
+
+def _compute_window(timezone: str, now: datetime) -> DayWindow:
+    zone = get_zone(timezone)
+    day = now.replace(tzinfo=_UTC).astimezone(zone).date()
+
+    start = datetime.combine(day, time.min, tzinfo=zone).astimezone(_UTC)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=zone).astimezone(_UTC)
+
+    return DayWindow(
+        timezone=timezone,
+        day=day,
+        start=start.replace(tzinfo=None),
+        end=end.replace(tzinfo=None),
+    )
+
+
+def local_date(moment: datetime, timezone: Optional[str] = None) -> date:
+    """Data local de um timestamp UTC (sem tzinfo) no fuso informado"""
+    return moment.replace(tzinfo=_UTC).astimezone(get_zone(timezone)).date()
+
+
+def local_day(timezone: Optional[str] = None, now: Optional[datetime] = None) -> DayWindow:
+    """
+    Retorna a janela do dia local no fuso informado.
+
+    ``now`` é um timestamp UTC (padrão: agora). A janela fica em memória até
+    a virada do dia daquele fuso.
+    """
+    timezone = timezone if is_valid_timezone(timezone) else DEFAULT_TIMEZONE
+    now = now or datetime.utcnow()
+
+    window = _windows.get(timezone)
+    if window is not None and window.contains(now):
+        return window
+
+    window = _compute_window(timezone, now)
+    with _windows_lock:
+        _windows[timezone] = window
+    return window
+
+
+def user_day(user, now: Optional[datetime] = None) -> DayWindow:
+    """Janela do dia local de um usuário já carregado (models.User)"""
+    return local_day(getattr(user, "timezone", None), now)
+
+
+def _timezone_cache_key(user_id: int) -> str:
+    return f"user_tz:{user_id}"
+
+
+def get_user_timezone(db: Session, user_id: int) -> str:
+    """Fuso do usuário (id interno), lido do cache ou do banco"""
+    from models.models import User
+    from utils.cache import cache
+
+    cache_key = _timezone_cache_key(user_id)
+    timezone = cache.get(cache_key)
+    if timezone is None:
+        timezone = db.query(User.timezone).filter(User.id == user_id).scalar() or DEFAULT_TIMEZONE
+        cache.set(cache_key, timezone, 24 * 3600)
+    return timezone
+
+
+def user_day_by_id(db: Session, user_id: int, now: Optional[datetime] = None) -> DayWindow:
+    """Janela do dia local de um usuário a partir do id interno"""
+    return local_day(get_user_timezone(db, user_id), now)
+
+
+def set_user_timezone(db: Session, user_id: int, timezone: str) -> bool:
+    """
+    Atualiza o fuso do usuário, move para ele os lembretes que seguiam o
+    fuso anterior (reindexando-os no despachante) e descarta caches
+    dependentes do dia
+    """
+    from models.models import Reminder, User
+    from utils.cache import cache, invalidate_user_cache
+    from utils.repository import ReminderRepository
+
+    if not is_valid_timezone(timezone):
+        return False
+
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        return False
+
+    # Lembretes que seguiam o fuso do usuário passam ao novo fuso (os com
+    # fuso próprio ficam como estão)
+    db.query(Reminder).filter(
+        Reminder.user_id == user.id,
+        or_(Reminder.timezone == user.timezone, Reminder.timezone.is_(None)),
+    ).update({Reminder.timezone: timezone}, synchronize_session=False)
+    user.timezone = timezone
+    db.commit()
+
+    cache.delete(_timezone_cache_key(user_id))
+    invalidate_user_cache(user.telegram_user_id)
+    ReminderRepository.sync_user_reminders(db, user.id)
+    logger.info(f"Fuso do usuário {user_id} alterado para {timezone}")
+    return True
@@ -122,6 +122,11 @@ def create_stats_table(stats: Dict[str, Any]) -> str:
             "💎 XP Total": f"{stats.get('total_xp_earned', 0):,} XP",
             "📊 XP Hoje": f"{stats.get('xp_earned_today', 0)} XP"
         },
+        {
+            "⬆️ Próximo Nível": f"{stats.get('xp_to_next_level', 0):,} XP",
+            "📈 Progresso Nível": f"{stats.get('level_progress', 0):.1f}%",
+            "⭐ XP no Nível": f"{stats.get('current_level_xp', 0):,} XP"
+        },
         {
             "🔥 Streak Atual": f"{stats.get('current_streak', 0)} dias",
             "🏅 Melhor Streak": f"{stats.get('longest_streak', 0)} dias",
@@ -283,3 +288,20 @@ def create_summary_card(summary_data: Dict[str, Any]) -> str:
 """
     
     return card.strip()
+
+
+def format_new_badges(badges: List[Dict[str, Any]] = None) -> str:
+    """
+    Formata as badges/conquistas recém-concedidas
+    
+    Args:
+        badges: Itens retornados pelo motor de badges
+    
+    Returns:
+        Linhas formatadas (vazio se não houver)
+    """
+    if not badges:
+        return ""
+    
+    lines = [f"{badge['icon']} **{badge['name']}** - {badge['description']}" for badge in badges]
+    return "\n🏅 *Nova conquista!*\n" + "\n".join(lines) + "\n"
@@ -1,19 +1,38 @@
 import random
+from array import array
+from bisect import bisect_right
 from datetime import datetime, timedelta
 
+from sqlalchemy import and_, case, exists, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app_types import LevelInfo
 from config import (
-    BADGES,
     DEFAULT_HABITS,
     MOTIVATIONAL_MESSAGES,
     XP_PER_LEVEL,
 )
-from models.models import Badge, DailyLog, DailyRating, Habit, User
+from models.models import DailyLog, DailyRating, Habit, User
+from utils.badges import COMPLETION_METRICS, evaluate_badges
+from utils.day_boundary import local_date, local_day, user_day, user_day_by_id
 from utils.logging_config import get_logger
+from utils.rollups import get_rollup_summary, record_completion_rollup, record_rating_rollup
+from utils.user_stats import (
+    load_user_stats,
+    record_completion_stats,
+    refresh_habit_counts,
+    today_completions,
+)
+from utils.weekdays import is_scheduled, weekday_bit
 
 logger = get_logger(__name__)
 
+# Dialetos com INSERT ... ON CONFLICT DO NOTHING ... RETURNING
+_INSERT_IGNORE = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
 
 def get_or_create_user(
     db: Session,
@@ -89,17 +108,58 @@ def calculate_xp_earned(base_xp, streak_days, difficulty_multiplier=1.0):
     return total_xp
 
 
+def _build_level_thresholds(limit: int = 2**62) -> array:
+    """
+    XP acumulado necessário para cada nível: ``thresholds[n - 1]`` é o XP
+    total em que o nível ``n`` começa. O XP de cada nível cresce 20% (com
+    truncamento inteiro) a partir de ``XP_PER_LEVEL``.
+    """
+    thresholds = array("q", [0])
+    xp_needed = XP_PER_LEVEL
+    while thresholds[-1] + xp_needed < limit:
+        thresholds.append(thresholds[-1] + xp_needed)
+        xp_needed = int(xp_needed * 1.2)  # Aumenta 20% a cada nível
+    return thresholds
+
+
+# Tabela montada uma vez no import (~200 níveis até 2**62 XP)
+_LEVEL_THRESHOLDS = _build_level_thresholds()
+
+
+def get_level_info(total_xp) -> LevelInfo:
+    """Nível, XP dentro do nível e XP até o próximo em O(log n)"""
+    total_xp = max(0, int(total_xp or 0))
+    level = bisect_right(_LEVEL_THRESHOLDS, total_xp)
+    start = _LEVEL_THRESHOLDS[level - 1]
+
+    if level < len(_LEVEL_THRESHOLDS):
+        xp_for_level = _LEVEL_THRESHOLDS[level] - start
+    else:
+        xp_for_level = 0  # Último nível da tabela
+
+    return LevelInfo(level=level, xp_into_level=total_xp - start, xp_for_level=xp_for_level)
+
+
 def calculate_level(total_xp):
     """Calcula o nível atual baseado no XP total"""
-    level = 1
-    xp_needed = XP_PER_LEVEL
+    return get_level_info(total_xp).level
+
+
+def streak_after_activity(last_active_date, current_streak: int, today):
+    """
+    Streak após uma conclusão em ``today`` (O(1), sem consultar histórico):
+    mesmo dia mantém, dia seguinte incrementa, depois de um intervalo recomeça.
+    """
+    if last_active_date == today:
+        return max(current_streak or 0, 1)
+    if last_active_date == today - timedelta(days=1):
+        return (current_streak or 0) + 1
+    return 1
 
-    while total_xp >= xp_needed:
-        total_xp -= xp_needed
-        level += 1
-        xp_needed = int(xp_needed * 1.2)  # Aumenta 20% a cada nível
 
-    return level
+def is_streak_broken(last_active_date, today) -> bool:
+    """Streak está quebrado se não houve conclusão hoje nem ontem"""
+    return last_active_date is None or last_active_date < today - timedelta(days=1)
 
 
 def update_user_progress(db: Session, user_id: int, habit_id: int, xp_earned: int):
@@ -121,13 +181,17 @@ def update_user_progress(db: Session, user_id: int, habit_id: int, xp_earned: in
         level_up = True
         logger.info(f"Usuário {user_id} subiu para nível {new_level}")
 
-    # Atualiza streak
-    user.current_streak += 1
-    if user.current_streak > user.longest_streak:
+    # Atualiza streak (incremental, pelo último dia ativo)
+    today = user_day(user).day
+    user.current_streak = streak_after_activity(
+        user.last_active_date, user.current_streak, today
+    )
+    user.last_active_date = today
+    if user.current_streak > (user.longest_streak or 0):
         user.longest_streak = user.current_streak
 
     # Atualiza dias desde início
-    days_since_start = (datetime.now() - user.created_at).days
+    days_since_start = (datetime.utcnow() - user.created_at).days
     user.days_since_start = days_since_start
 
     db.commit()
@@ -155,7 +219,15 @@ def update_habit_streak(db: Session, user_id: int, habit_id: int):
     if not habit:
         return None
 
-    habit.current_streak += 1
+    today = user_day_by_id(db, user_id).day
+    previous_log = db.execute(
+        select(func.max(DailyLog.log_date)).where(
+            DailyLog.user_id == user_id,
+            DailyLog.habit_id == habit_id,
+            DailyLog.log_date < today,
+        )
+    ).scalar()
+    habit.current_streak = streak_after_activity(previous_log, habit.current_streak, today)
     habit.total_completions += 1
 
     if habit.current_streak > habit.longest_streak:
@@ -165,128 +237,42 @@ def update_habit_streak(db: Session, user_id: int, habit_id: int):
     return habit
 
 
-def check_and_award_badges(db: Session, user_id: int):
-    """Verifica e concede badges baseado no progresso do usuário"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        return []
+def check_and_award_badges(db: Session, user_id: int, changed=None):
+    """
+    Verifica e concede badges baseado no progresso do usuário.
 
-    awarded_badges = []
-
-    # Verifica badges existentes
-    existing_badges = {badge.name: badge for badge in user.badges}
-
-    # Badge: Primeiro hábito
-    if "Primeiro Passo" not in existing_badges and user.total_xp_earned > 0:
-        badge_data = BADGES["first_habit"]
-        badge = Badge(
-            user_id=user.id,
-            name=badge_data["name"],
-            description=badge_data["description"],
-            icon=badge_data["icon"],
-            category=badge_data["category"],
-            is_rare=badge_data["is_rare"],
-            xp_bonus=badge_data["xp_bonus"],
-        )
-        db.add(badge)
-        awarded_badges.append(badge)
-
-    # Badge: Streak de 7 dias
-    if "Semana Perfeita" not in existing_badges and user.current_streak >= 7:
-        badge_data = BADGES["week_streak"]
-        badge = Badge(
-            user_id=user.id,
-            name=badge_data["name"],
-            description=badge_data["description"],
-            icon=badge_data["icon"],
-            category=badge_data["category"],
-            is_rare=badge_data["is_rare"],
-            xp_bonus=badge_data["xp_bonus"],
-        )
-        db.add(badge)
-        awarded_badges.append(badge)
-
-    # Badge: Streak de 30 dias
-    if "Mestre da Consistência" not in existing_badges and user.current_streak >= 30:
-        badge_data = BADGES["month_streak"]
-        badge = Badge(
-            user_id=user.id,
-            name=badge_data["name"],
-            description=badge_data["description"],
-            icon=badge_data["icon"],
-            category=badge_data["category"],
-            is_rare=badge_data["is_rare"],
-            xp_bonus=badge_data["xp_bonus"],
-        )
-        db.add(badge)
-        awarded_badges.append(badge)
+    ``changed`` limita a checagem às regras que dependem dessas métricas
+    (padrão: todas). Retorna os itens concedidos (ver utils.badges).
+    """
+    return evaluate_badges(db, user_id, changed)
 
-    # Badges de nível
-    level_badges = {5: "Aprendiz", 10: "Veterano", 20: "Mestre"}
 
-    for level, badge_name in level_badges.items():
-        if badge_name not in existing_badges and user.current_level >= level:
-            badge_key = f"level_{level}"
-            badge_data = BADGES[badge_key]
-            badge = Badge(
-                user_id=user.id,
-                name=badge_data["name"],
-                description=badge_data["description"],
-                icon=badge_data["icon"],
-                category=badge_data["category"],
-                is_rare=badge_data["is_rare"],
-                xp_bonus=badge_data["xp_bonus"],
-            )
-            db.add(badge)
-            awarded_badges.append(badge)
-
-    # Badge: Dia perfeito
-    if "Dia Perfeito" not in existing_badges:
-        today_logs = (
-            db.query(DailyLog)
-            .filter(
-                DailyLog.user_id == user.id,
-                DailyLog.date
-                >= datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
-            )
-            .all()
+def _award_completion_badges(db: Session, user_id: int, progress):
+    """Concede badges após uma conclusão (falhas não afetam a conclusão)"""
+    try:
+        return evaluate_badges(
+            db,
+            user_id,
+            COMPLETION_METRICS,
+            known={
+                "total_xp": progress["total_xp"],
+                "current_level": progress["new_level"],
+                "current_streak": progress["current_streak"],
+            },
         )
-
-        if today_logs and all(log.completed for log in today_logs):
-            badge_data = BADGES["perfect_day"]
-            badge = Badge(
-                user_id=user.id,
-                name=badge_data["name"],
-                description=badge_data["description"],
-                icon=badge_data["icon"],
-                category=badge_data["category"],
-                is_rare=badge_data["is_rare"],
-                xp_bonus=badge_data["xp_bonus"],
-            )
-            db.add(badge)
-            awarded_badges.append(badge)
-
-    db.commit()
-    return awarded_badges
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao conceder badges ao usuário {user_id}: {e}")
+        return []
 
 
 def reset_streak_if_needed(db: Session, user_id: int):
-    """Reseta o streak se o usuário não completou hábitos hoje"""
+    """Reseta o streak se o usuário não completou hábitos ontem nem hoje"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         return False
 
-    today = datetime.now().date()
-    today_logs = (
-        db.query(DailyLog)
-        .filter(
-            DailyLog.user_id == user.id,
-            DailyLog.date >= datetime.combine(today, datetime.min.time()),
-        )
-        .all()
-    )
-
-    if not today_logs:
+    if user.current_streak and is_streak_broken(user.last_active_date, user_day(user).day):
         user.current_streak = 0
         db.commit()
         return True
@@ -294,51 +280,107 @@ def reset_streak_if_needed(db: Session, user_id: int):
     return False
 
 
-def get_user_stats(db: Session, user_id: int):
-    """Obtém estatísticas completas do usuário"""
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        return None
+def reset_broken_streaks(db: Session, processed=None, now=None) -> int:
+    """
+    Virada diária de streaks em lote: zera, com um UPDATE por dia local, o
+    streak de todos os usuários sem conclusão ontem nem hoje, e o streak
+    dos hábitos sem conclusão ontem nem hoje.
+
+    ``processed`` (fuso -> dia local já processado) é mantido pelo chamador
+    para que cada fuso seja processado uma vez por dia. Retorna o número de
+    streaks zerados.
+    """
+    habit_streak = exists().where(Habit.user_id == User.id, Habit.current_streak > 0)
+    timezones = db.execute(
+        select(User.timezone).where((User.current_streak > 0) | habit_streak).distinct()
+    ).scalars().all()
+
+    # Fusos agrupados pelo dia local corrente (poucos grupos distintos)
+    buckets = {}
+    for timezone in timezones:
+        today = local_day(timezone, now).day
+        if processed is not None and processed.get(timezone) == today:
+            continue
+        buckets.setdefault(today, []).append(timezone)
+
+    reset_ids = []
+    habit_user_ids = set()
+    for today, bucket in buckets.items():
+        recent_log = exists().where(
+            DailyLog.user_id == Habit.user_id,
+            DailyLog.habit_id == Habit.id,
+            DailyLog.log_date >= today - timedelta(days=1),
+        )
+        habit_user_ids.update(
+            db.execute(
+                update(Habit)
+                .where(
+                    Habit.user_id.in_(select(User.id).where(User.timezone.in_(bucket))),
+                    Habit.current_streak > 0,
+                    ~recent_log,
+                )
+                .values(current_streak=0)
+                .returning(Habit.user_id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+        reset_ids.extend(
+            db.execute(
+                update(User)
+                .where(
+                    User.timezone.in_(bucket),
+                    User.current_streak > 0,
+                    (User.last_active_date == None)
+                    | (User.last_active_date < today - timedelta(days=1)),
+                )
+                .values(current_streak=0)
+                .returning(User.telegram_user_id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
 
-    # Estatísticas de hábitos
-    total_habits = db.query(Habit).filter(Habit.user_id == user.id).count()
-    active_habits = (
-        db.query(Habit)
-        .filter(Habit.user_id == user.id, Habit.is_active == True)
-        .count()
-    )
+    db.commit()
 
-    # Estatísticas de logs
-    total_logs = db.query(DailyLog).filter(DailyLog.user_id == user.id).count()
-    completed_logs = (
-        db.query(DailyLog)
-        .filter(DailyLog.user_id == user.id, DailyLog.completed == True)
-        .count()
-    )
+    if processed is not None:
+        for today, bucket in buckets.items():
+            processed.update(dict.fromkeys(bucket, today))
 
-    # Hábitos completados hoje
-    today = datetime.now().date()
-    today_logs = (
-        db.query(DailyLog)
-        .filter(
-            DailyLog.user_id == user.id,
-            DailyLog.date >= datetime.combine(today, datetime.min.time()),
+    stale_ids = set(reset_ids)
+    if habit_user_ids:
+        stale_ids.update(
+            db.execute(
+                select(User.telegram_user_id).where(User.id.in_(habit_user_ids))
+            ).scalars()
         )
-        .all()
-    )
-    completed_today = len([log for log in today_logs if log.completed])
 
-    # Estatísticas de badges
-    total_badges = len(user.badges)
-    rare_badges = len([b for b in user.badges if b.is_rare])
+    from utils.cache import invalidate_user_cache
+    for telegram_user_id in stale_ids:
+        invalidate_user_cache(telegram_user_id)
 
-    # Progresso para próximo nível
-    current_level_xp = user.total_xp_earned
-    for level in range(1, user.current_level):
-        current_level_xp -= XP_PER_LEVEL * (1.2 ** (level - 1))
+    if reset_ids or habit_user_ids:
+        logger.info(
+            f"Streaks zerados na virada do dia: {len(reset_ids)} usuários, "
+            f"hábitos de {len(habit_user_ids)} usuários"
+        )
+    return len(reset_ids)
 
-    next_level_xp = XP_PER_LEVEL * (1.2 ** (user.current_level - 1))
-    level_progress = (current_level_xp / next_level_xp) * 100
+
+def get_user_stats(db: Session, user_id: int):
+    """
+    Obtém estatísticas completas do usuário.
+
+    Usuário e contagens vêm de uma leitura por chave primária (tabela
+    ``user_stats``), sem varrer hábitos, logs ou badges.
+    """
+    user, aggregate = load_user_stats(db, user_id)
+    if not user:
+        return None
+
+    total_logs = aggregate.total_logs
+    completed_logs = aggregate.completed_logs
+
+    # Progresso para próximo nível
+    level_info = get_level_info(user.total_xp_earned)
 
     return {
         "user": user,
@@ -347,17 +389,18 @@ def get_user_stats(db: Session, user_id: int):
         "current_streak": user.current_streak,
         "longest_streak": user.longest_streak,
         "days_since_start": user.days_since_start,
-        "habits_completed_today": completed_today,
-        "total_habits": total_habits,
-        "active_habits": active_habits,
+        "habits_completed_today": today_completions(aggregate, user_day(user).day),
+        "total_habits": aggregate.total_habits,
+        "active_habits": aggregate.active_habits,
         "total_logs": total_logs,
         "completed_logs": completed_logs,
         "completion_rate": (completed_logs / total_logs * 100) if total_logs > 0 else 0,
-        "total_badges": total_badges,
-        "rare_badges": rare_badges,
-        "level_progress": level_progress,
-        "next_level_xp": next_level_xp,
-        "current_level_xp": current_level_xp,
+        "total_badges": aggregate.total_badges,
+        "rare_badges": aggregate.rare_badges,
+        "level_progress": level_info.progress,
+        "next_level_xp": level_info.xp_for_level,
+        "current_level_xp": level_info.xp_into_level,
+        "xp_to_next_level": level_info.xp_to_next_level,
     }
 
 
@@ -367,20 +410,10 @@ def check_perfect_week(db: Session, user_id: int):
     if not user:
         return False
 
-    week_ago = datetime.now() - timedelta(days=7)
-    week_logs = (
-        db.query(DailyLog)
-        .filter(
-            DailyLog.user_id == user.id,
-            DailyLog.date >= week_ago,
-            DailyLog.completed == True,
-        )
-        .all()
-    )
-
-    # Verifica se completou pelo menos um hábito por dia na semana
-    days_with_habits = set(log.date.date() for log in week_logs)
-    return len(days_with_habits) >= 7
+    # Pelo menos um hábito por dia nos últimos 7 dias = streak ativo >= 7
+    if is_streak_broken(user.last_active_date, user_day(user).day):
+        return False
+    return (user.current_streak or 0) >= 7
 
 
 def check_client_conquest(db: Session, user_id: int):
@@ -389,12 +422,12 @@ def check_client_conquest(db: Session, user_id: int):
     if not user:
         return False
 
-    today = datetime.now().date()
+    today = user_day(user).day
     today_logs = (
         db.query(DailyLog)
         .filter(
             DailyLog.user_id == user.id,
-            DailyLog.date >= datetime.combine(today, datetime.min.time()),
+            DailyLog.log_date == today,
         )
         .all()
     )
@@ -415,12 +448,12 @@ def get_daily_goal_progress(db: Session, user_id: int):
     if not user:
         return None
 
-    today = datetime.now().date()
+    today = user_day(user).day
     today_logs = (
         db.query(DailyLog)
         .filter(
             DailyLog.user_id == user.id,
-            DailyLog.date >= datetime.combine(today, datetime.min.time()),
+            DailyLog.log_date == today,
         )
         .all()
     )
@@ -456,13 +489,14 @@ def create_daily_rating(
     if not user:
         return None
 
-    # Verifica se já existe avaliação para hoje
-    today = datetime.now().date()
+    # Verifica se já existe avaliação para hoje (dia local do usuário)
+    window = user_day(user)
     existing_rating = (
         db.query(DailyRating)
         .filter(
             DailyRating.user_id == user.id,
-            DailyRating.date >= datetime.combine(today, datetime.min.time()),
+            DailyRating.date >= window.start,
+            DailyRating.date < window.end,
         )
         .first()
     )
@@ -473,6 +507,7 @@ def create_daily_rating(
         existing_rating.energy_rating = energy_rating
         # Removido craving_level - não é mais necessário
         existing_rating.notes = notes
+        record_rating_rollup(db, user.id, window.day, mood_rating, energy_rating)
         db.commit()
         return existing_rating
 
@@ -489,63 +524,61 @@ def create_daily_rating(
     )
 
     db.add(daily_rating)
+    record_rating_rollup(db, user.id, window.day, mood_rating, energy_rating)
     db.commit()
     return daily_rating
 
 
-def get_weekly_summary(db: Session, user_id: int):
-    """Gera um resumo semanal do progresso do usuário"""
+def _scheduled_habit_days(db: Session, user: User, start, end) -> int:
+    """Hábito-dias agendados em [start, end]: dias do days_mask de cada hábito ativo"""
+    habits = db.execute(
+        select(Habit.days_mask, Habit.created_at).where(
+            Habit.user_id == user.id, Habit.is_active == True
+        )
+    ).all()
+    created = [
+        (mask, local_date(created_at, user.timezone) if created_at else start)
+        for mask, created_at in habits
+    ]
+
+    total = 0
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        total += sum(1 for mask, created_on in created if created_on <= day and is_scheduled(mask, day))
+    return total
+
+
+def _period_summary(db: Session, user_id: int, days: int):
+    """Resumo dos últimos ``days`` dias (incluindo hoje) a partir dos rollups"""
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         return None
 
-    week_ago = datetime.now() - timedelta(days=7)
+    window = user_day(user)
+    start = window.days_ago(days - 1)
+    summary = get_rollup_summary(db, user.id, start, window.day)
 
-    # Logs da semana
-    week_logs = (
-        db.query(DailyLog)
-        .filter(DailyLog.user_id == user.id, DailyLog.date >= week_ago)
-        .all()
-    )
+    # Taxa de sucesso: conclusões sobre os hábito-dias agendados no período
+    scheduled = _scheduled_habit_days(db, user, start, window.day)
+    success_rate = min(100.0, summary["total_completed"] / scheduled * 100) if scheduled else 0.0
 
-    # Avaliações da semana
-    week_ratings = (
-        db.query(DailyRating)
-        .filter(DailyRating.user_id == user.id, DailyRating.date >= week_ago)
-        .all()
-    )
+    return {
+        "user": user,
+        "days": days,
+        **summary,
+        "scheduled_habit_days": scheduled,
+        "success_rate": success_rate,
+    }
 
-    # Estatísticas
-    total_completed = len([log for log in week_logs if log.completed])
-    total_xp_earned = sum(log.xp_earned for log in week_logs if log.completed)
 
-    # Médias das avaliações
-    avg_mood = (
-        sum(r.mood_rating for r in week_ratings) / len(week_ratings)
-        if week_ratings
-        else 0
-    )
-    avg_energy = (
-        sum(r.energy_rating for r in week_ratings) / len(week_ratings)
-        if week_ratings
-        else 0
-    )
-    # Removido avg_craving - não é mais necessário
+def get_weekly_summary(db: Session, user_id: int):
+    """Gera um resumo semanal do progresso do usuário"""
+    return _period_summary(db, user_id, 7)
 
-    # Dias ativos
-    active_days = len(set(log.date.date() for log in week_logs if log.completed))
 
-    return {
-        "user": user,
-        "total_completed": total_completed,
-        "total_xp_earned": total_xp_earned,
-        "active_days": active_days,
-        "avg_mood": round(avg_mood, 1),
-        "avg_energy": round(avg_energy, 1),
-        # Removido avg_craving - não é mais necessário
-        "week_ratings": week_ratings,
-        "week_logs": week_logs,
-    }
+def get_monthly_summary(db: Session, user_id: int):
+    """Gera um resumo mensal (últimos 30 dias) do progresso do usuário"""
+    return _period_summary(db, user_id, 30)
 
 
 def create_default_habits(db: Session, user_id: int):
@@ -577,14 +610,15 @@ def create_default_habits(db: Session, user_id: int):
             db.add(habit)
             created_habits.append(habit)
 
+    if created_habits:
+        refresh_habit_counts(db, user.id)
     db.commit()
     return created_habits
 
 
 def get_daily_progress(db, user_id: int):
     """Busca progresso diário do usuário"""
-    from datetime import date
-    today = date.today()
+    today = user_day_by_id(db, user_id).day
     
     # Busca hábitos ativos
     habits = db.query(Habit).filter(
@@ -595,7 +629,7 @@ def get_daily_progress(db, user_id: int):
     # Busca logs de hoje
     logs = db.query(DailyLog).filter(
         DailyLog.user_id == user_id,
-        DailyLog.date >= today
+        DailyLog.log_date == today
     ).all()
     
     completed_habits = [log.habit_id for log in logs if log.completed]
@@ -626,117 +660,524 @@ def get_daily_progress(db, user_id: int):
 
 
 def get_today_habits(db, user_id: int):
-    """Busca hábitos que devem ser feitos hoje baseado nos dias de repetição"""
-    from datetime import datetime
-    
-    today = datetime.now()
-    weekday = today.weekday() + 1  # 1=Segunda, 2=Terça, ..., 7=Domingo
-    
-    # Busca hábitos ativos do usuário
-    habits = db.query(Habit).filter(
-        Habit.user_id == user_id,
-        Habit.is_active == True
-    ).all()
-    
-    today_habits = []
-    
-    for habit in habits:
-        # Verifica se o hábito deve ser feito hoje
-        days_list = [int(d.strip()) for d in habit.days_of_week.split(',')]
-        
-        if weekday in days_list:
-            # Verifica se já foi completado hoje
-            from datetime import date
-            today_date = date.today()
-            
-            completed_today = db.query(DailyLog).filter(
+    """
+    Busca hábitos que devem ser feitos hoje baseado nos dias de repetição.
+
+    Uma única consulta: hábitos ativos LEFT JOIN logs de hoje, com o filtro
+    de dia da semana aplicado no SQL via bitmask (days_mask & bit_de_hoje).
+    "Hoje" e o dia da semana seguem o fuso do usuário.
+    """
+    today = user_day_by_id(db, user_id).day
+
+    rows = db.execute(
+        select(
+            Habit.id,
+            Habit.name,
+            Habit.description,
+            Habit.xp_reward,
+            Habit.category,
+            Habit.days_of_week,
+            Habit.time_minutes,
+            Habit.current_streak,
+            func.count(DailyLog.id).label("completed_count"),
+        )
+        .outerjoin(
+            DailyLog,
+            and_(
+                DailyLog.habit_id == Habit.id,
                 DailyLog.user_id == user_id,
-                DailyLog.habit_id == habit.id,
-                DailyLog.completed_at >= today_date
-            ).first() is not None
-            
-            today_habits.append({
-                'id': habit.id,
-                'name': habit.name,
-                'description': habit.description,
-                'xp_reward': habit.xp_reward,
-                'category': habit.category,
-                'days_of_week': habit.days_of_week,
-                'time_minutes': habit.time_minutes,
-                'current_streak': habit.current_streak,
-                'completed_today': completed_today
-            })
-    
-    return today_habits
+                DailyLog.log_date == today,
+            ),
+        )
+        .where(
+            Habit.user_id == user_id,
+            Habit.is_active == True,
+            Habit.days_mask.op("&")(weekday_bit(today)) != 0,
+        )
+        .group_by(Habit.id)
+        .order_by(Habit.id)
+    ).all()
+
+    return [
+        {
+            'id': row.id,
+            'name': row.name,
+            'description': row.description,
+            'xp_reward': row.xp_reward,
+            'category': row.category,
+            'days_of_week': row.days_of_week,
+            'time_minutes': row.time_minutes,
+            'current_streak': row.current_streak,
+            'completed_today': row.completed_count > 0
+        }
+        for row in rows
+    ]
+
+
+def _increment_habit_streaks(user_id: int, habit_ids: list[int], today):
+    """
+    UPDATE que aplica a conclusão de hoje aos hábitos informados: o streak
+    incrementa se a conclusão anterior foi ontem e recomeça em 1 depois de
+    um intervalo (mesma regra de streak_after_activity, por hábito).
+    """
+    previous_log = (
+        select(func.max(DailyLog.log_date))
+        .where(
+            DailyLog.user_id == user_id,
+            DailyLog.habit_id == Habit.id,
+            DailyLog.log_date < today,
+        )
+        .scalar_subquery()
+    )
+    new_streak = case(
+        (previous_log == today - timedelta(days=1), func.coalesce(Habit.current_streak, 0) + 1),
+        else_=1,
+    )
+    return (
+        update(Habit)
+        .where(Habit.user_id == user_id, Habit.id.in_(habit_ids))
+        .values(
+            current_streak=new_streak,
+            total_completions=Habit.total_completions + 1,
+            longest_streak=case(
+                (Habit.longest_streak < new_streak, new_streak),
+                else_=Habit.longest_streak,
+            ),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _insert_daily_logs(db: Session, rows: list[dict]) -> set[int]:
+    """
+    Insere os DailyLog de hoje ignorando os que já existem (conclusão
+    concorrente) e retorna os ids dos hábitos efetivamente inseridos.
+    """
+    dialect_insert = _INSERT_IGNORE.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        return set(
+            db.execute(
+                dialect_insert(DailyLog)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["user_id", "habit_id", "log_date"])
+                .returning(DailyLog.habit_id)
+            ).scalars()
+        )
+
+    # Demais bancos: check-and-insert por hábito, como em complete_habit
+    inserted = set()
+    for row in rows:
+        completed = exists().where(
+            DailyLog.user_id == row["user_id"],
+            DailyLog.habit_id == row["habit_id"],
+            DailyLog.log_date == row["log_date"],
+        )
+        columns = list(row)
+        if db.execute(
+            insert(DailyLog).from_select(
+                columns, select(*(literal(row[c]) for c in columns)).where(~completed)
+            )
+        ).rowcount:
+            inserted.add(row["habit_id"])
+    return inserted
+
+
+def _apply_user_progress(
+    db: Session, user_id: int, xp_earned: int, today, days_since_start: int
+):
+    """Aplica XP/streak ao usuário com um único UPDATE ... RETURNING (sem commit)"""
+    # Mesma regra de streak_after_activity, avaliada no próprio UPDATE
+    current_streak = func.coalesce(User.current_streak, 0)
+    new_streak = case(
+        (User.last_active_date == today, case((current_streak > 0, current_streak), else_=1)),
+        (User.last_active_date == today - timedelta(days=1), current_streak + 1),
+        else_=1,
+    )
+
+    user_row = db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            total_xp_earned=User.total_xp_earned + xp_earned,
+            current_streak=new_streak,
+            longest_streak=case(
+                (User.longest_streak < new_streak, new_streak),
+                else_=User.longest_streak,
+            ),
+            last_active_date=today,
+            days_since_start=days_since_start,
+        )
+        .returning(
+            User.telegram_user_id,
+            User.total_xp_earned,
+            User.current_level,
+            User.current_streak,
+        )
+        .execution_options(synchronize_session=False)
+    ).one()
+
+    # Nível só é regravado quando muda (raro)
+    old_level = user_row.current_level
+    new_level = calculate_level(user_row.total_xp_earned)
+    if new_level > old_level:
+        db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(current_level=new_level)
+            .execution_options(synchronize_session=False)
+        )
+        logger.info(f"Usuário {user_id} subiu para nível {new_level}")
+    else:
+        new_level = old_level
+
+    return {
+        "telegram_user_id": user_row.telegram_user_id,
+        "total_xp": user_row.total_xp_earned,
+        "old_level": old_level,
+        "new_level": new_level,
+        "level_up": new_level > old_level,
+        "current_streak": user_row.current_streak,
+    }
 
 
 def complete_habit(db: Session, user_id: int, habit_id: int):
-    """Completa um hábito e retorna o resultado"""
-    from datetime import date
-    today = date.today()
-    
+    """
+    Completa um hábito e retorna o resultado.
+
+    Serviço único de conclusão (callback, seleção múltipla e texto livre):
+    a checagem "já completado hoje", o insert do DailyLog e as atualizações
+    de XP/streak rodam em uma única transação, com UPDATE ... RETURNING em
+    vez de recarregar usuário e hábito.
+    """
+    now = datetime.utcnow()
+    today = user_day_by_id(db, user_id, now).day
+
+    completed_today = exists().where(
+        DailyLog.user_id == user_id,
+        DailyLog.habit_id == habit_id,
+        DailyLog.log_date == today,
+    )
+
     try:
-        # Busca usuário e hábito
-        db_user = db.query(User).filter(User.id == user_id).first()
-        if not db_user:
-            return {"success": False, "message": "Usuário não encontrado."}
-        
-        habit = db.query(Habit).filter(
-            Habit.id == habit_id,
-            Habit.user_id == user_id,
-            Habit.is_active == True
+        # Hábito, usuário e status de hoje em uma única consulta
+        row = db.execute(
+            select(
+                Habit.name,
+                Habit.xp_reward,
+                Habit.current_streak,
+                User.created_at,
+                completed_today.label("already_completed"),
+            )
+            .join(User, User.id == Habit.user_id)
+            .where(
+                Habit.id == habit_id,
+                Habit.user_id == user_id,
+                Habit.is_active == True,
+            )
         ).first()
-        
-        if not habit:
+
+        if row is None:
             return {"success": False, "message": "Hábito não encontrado."}
-        
-        # Verifica se já foi completado hoje
-        existing_log = db.query(DailyLog).filter(
-            DailyLog.user_id == user_id,
-            DailyLog.habit_id == habit_id,
-            DailyLog.completed_at >= today
-        ).first()
-        
-        if existing_log:
+
+        if row.already_completed:
             return {"success": False, "message": "Este hábito já foi completado hoje!"}
-        
-        # Registra conclusão
-        xp_earned = calculate_xp_earned(habit.xp_reward, habit.current_streak)
-        
-        log = DailyLog(
-            user_id=user_id,
-            habit_id=habit_id,
-            xp_earned=xp_earned
+
+        xp_earned = calculate_xp_earned(row.xp_reward, row.current_streak or 0)
+
+        # Check-and-insert atômico: só insere se ainda não houver log hoje
+        inserted = db.execute(
+            insert(DailyLog).from_select(
+                [
+                    "user_id",
+                    "habit_id",
+                    "completed",
+                    "completed_at",
+                    "xp_earned",
+                    "date",
+                    "log_date",
+                ],
+                select(
+                    literal(user_id),
+                    literal(habit_id),
+                    literal(True),
+                    literal(now),
+                    literal(xp_earned),
+                    literal(now),
+                    literal(today),
+                ).where(~completed_today),
+            )
+        ).rowcount
+
+        if not inserted:
+            db.rollback()
+            return {"success": False, "message": "Este hábito já foi completado hoje!"}
+
+        habit_row = db.execute(
+            _increment_habit_streaks(user_id, [habit_id], today).returning(
+                Habit.current_streak, Habit.total_completions
+            )
+        ).one()
+
+        progress = _apply_user_progress(
+            db,
+            user_id,
+            xp_earned,
+            today=today,
+            days_since_start=(now - row.created_at).days if row.created_at else 0,
         )
-        db.add(log)
-        
-        # Atualiza progresso do usuário
-        update_user_progress(db, user_id, habit_id, xp_earned)
-        
-        # Atualiza streak do hábito
-        habit.current_streak += 1
-        habit.total_completions += 1
-        if habit.current_streak > habit.longest_streak:
-            habit.longest_streak = habit.current_streak
-        
+        record_completion_stats(db, user_id, 1, today)
+        record_completion_rollup(db, user_id, today, 1, xp_earned)
+
         db.commit()
-        
-        # Busca dados atualizados do usuário
-        db.refresh(db_user)
-        
+
+        # ✅ INVALIDAR CACHE (e atualizar o snapshot de hoje)
+        from utils.snapshot import record_completions
+        record_completions(
+            progress["telegram_user_id"],
+            {
+                habit_id: {
+                    "xp_earned": xp_earned,
+                    "current_streak": habit_row.current_streak,
+                    "total_completions": habit_row.total_completions,
+                }
+            },
+            progress,
+        )
+        new_badges = _award_completion_badges(db, user_id, progress)
+
         return {
             "success": True,
             "message": get_motivational_message('habit_completed'),
             "xp_earned": xp_earned,
-            "new_total_xp": db_user.total_xp_earned,
-            "new_level": db_user.current_level,
-            "habit_name": habit.name,
-            "habit_xp_reward": habit.xp_reward,
-            "current_streak": habit.current_streak,
-            "total_completions": habit.total_completions
+            "new_total_xp": progress["total_xp"],
+            "old_level": progress["old_level"],
+            "new_level": progress["new_level"],
+            "level_up": progress["level_up"],
+            "habit_name": row.name,
+            "habit_xp_reward": row.xp_reward,
+            "current_streak": habit_row.current_streak,
+            "total_completions": habit_row.total_completions,
+            "new_badges": new_badges,
         }
-        
+
+    except IntegrityError:
+        # Conclusão concorrente no mesmo dia (uq_daily_log_user_habit_day)
+        db.rollback()
+        return {"success": False, "message": "Este hábito já foi completado hoje!"}
+
     except Exception as e:
         db.rollback()
         logger.error(f"Erro ao completar hábito: {e}")
         return {"success": False, "message": f"Erro interno: {str(e)}"}
+
+
+def complete_habits(db: Session, user_id: int, habit_ids: list[int]):
+    """
+    Completa vários hábitos de uma vez (seleção múltipla).
+
+    Busca hábitos e logs de hoje com duas consultas IN, insere todos os
+    DailyLog em um único INSERT ... ON CONFLICT DO NOTHING (conclusões
+    concorrentes só pulam o próprio hábito) e aplica o XP somado ao
+    usuário uma vez.
+    """
+    now = datetime.utcnow()
+    habit_ids = list(dict.fromkeys(habit_ids))
+
+    empty_result = {
+        "success": False,
+        "completed": [],
+        "skipped": habit_ids,
+        "xp_earned": 0,
+    }
+    if not habit_ids:
+        return empty_result
+
+    try:
+        today = user_day_by_id(db, user_id, now).day
+        habits = db.execute(
+            select(
+                Habit.id, Habit.name, Habit.xp_reward, Habit.current_streak, User.created_at
+            )
+            .join(User, User.id == Habit.user_id)
+            .where(
+                Habit.id.in_(habit_ids),
+                Habit.user_id == user_id,
+                Habit.is_active == True,
+            )
+        ).all()
+
+        done_today = set(
+            db.execute(
+                select(DailyLog.habit_id).where(
+                    DailyLog.user_id == user_id,
+                    DailyLog.habit_id.in_(habit_ids),
+                    DailyLog.log_date == today,
+                )
+            ).scalars()
+        )
+
+        pending = [h for h in habits if h.id not in done_today]
+        if not pending:
+            return empty_result
+
+        xp_by_habit = {
+            h.id: calculate_xp_earned(h.xp_reward, h.current_streak or 0) for h in pending
+        }
+
+        # Hábitos completados em paralelo desde a leitura acima são pulados
+        inserted = _insert_daily_logs(
+            db,
+            [
+                {
+                    "user_id": user_id,
+                    "habit_id": habit_id,
+                    "completed": True,
+                    "completed_at": now,
+                    "xp_earned": xp,
+                    "date": now,
+                    "log_date": today,
+                }
+                for habit_id, xp in xp_by_habit.items()
+            ],
+        )
+        if not inserted:
+            db.rollback()
+            return empty_result
+        pending = [h for h in pending if h.id in inserted]
+        xp_by_habit = {habit_id: xp for habit_id, xp in xp_by_habit.items() if habit_id in inserted}
+
+        habit_rows = {
+            r.id: r
+            for r in db.execute(
+                _increment_habit_streaks(user_id, list(xp_by_habit), today).returning(
+                    Habit.id, Habit.current_streak, Habit.total_completions
+                )
+            )
+        }
+
+        created_at = pending[0].created_at
+        total_xp_earned = sum(xp_by_habit.values())
+        progress = _apply_user_progress(
+            db,
+            user_id,
+            total_xp_earned,
+            today=today,
+            days_since_start=(now - created_at).days if created_at else 0,
+        )
+        record_completion_stats(db, user_id, len(pending), today)
+        record_completion_rollup(db, user_id, today, len(pending), total_xp_earned)
+
+        db.commit()
+
+        from utils.snapshot import record_completions
+        record_completions(
+            progress["telegram_user_id"],
+            {
+                habit_id: {
+                    "xp_earned": xp,
+                    "current_streak": habit_rows[habit_id].current_streak,
+                    "total_completions": habit_rows[habit_id].total_completions,
+                }
+                for habit_id, xp in xp_by_habit.items()
+            },
+            progress,
+        )
+        new_badges = _award_completion_badges(db, user_id, progress)
+
+        completed_ids = {h.id for h in pending}
+        return {
+            "success": True,
+            "completed": [
+                {
+                    "habit_id": h.id,
+                    "habit_name": h.name,
+                    "xp_earned": xp_by_habit[h.id],
+                    "current_streak": habit_rows[h.id].current_streak,
+                    "total_completions": habit_rows[h.id].total_completions,
+                }
+                for h in pending
+            ],
+            "skipped": [habit_id for habit_id in habit_ids if habit_id not in completed_ids],
+            "xp_earned": total_xp_earned,
+            "new_total_xp": progress["total_xp"],
+            "old_level": progress["old_level"],
+            "new_level": progress["new_level"],
+            "level_up": progress["level_up"],
+            "new_badges": new_badges,
+        }
+
+    except IntegrityError:
+        # Conclusão concorrente entre o check e o insert (bancos sem ON CONFLICT)
+        db.rollback()
+        return empty_result
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Erro ao completar hábitos em lote: {e}")
+        return {**empty_result, "message": f"Erro interno: {str(e)}"}
+
+
+# Variantes assíncronas (AsyncSession): reaproveitam a lógica síncrona via
+# run_sync, com o I/O executado pelo driver assíncrono.
+
+
+async def get_or_create_user_async(db: AsyncSession, telegram_user_id: int, **kwargs):
+    """Versão assíncrona de get_or_create_user"""
+    return await db.run_sync(get_or_create_user, telegram_user_id, **kwargs)
+
+
+async def update_user_progress_async(db: AsyncSession, user_id: int, habit_id: int, xp_earned: int):
+    """Versão assíncrona de update_user_progress"""
+    return await db.run_sync(update_user_progress, user_id, habit_id, xp_earned)
+
+
+async def check_and_award_badges_async(db: AsyncSession, user_id: int):
+    """Versão assíncrona de check_and_award_badges"""
+    return await db.run_sync(check_and_award_badges, user_id)
+
+
+async def get_user_stats_async(db: AsyncSession, user_id: int):
+    """Versão assíncrona de get_user_stats"""
+    return await db.run_sync(get_user_stats, user_id)
+
+
+async def get_daily_goal_progress_async(db: AsyncSession, user_id: int):
+    """Versão assíncrona de get_daily_goal_progress"""
+    return await db.run_sync(get_daily_goal_progress, user_id)
+
+
+async def create_daily_rating_async(
+    db: AsyncSession, user_id: int, mood_rating: float, energy_rating: float, notes: str = None
+):
+    """Versão assíncrona de create_daily_rating"""
+    return await db.run_sync(create_daily_rating, user_id, mood_rating, energy_rating, notes)
+
+
+async def get_weekly_summary_async(db: AsyncSession, user_id: int):
+    """Versão assíncrona de get_weekly_summary"""
+    return await db.run_sync(get_weekly_summary, user_id)
+
+
+async def get_monthly_summary_async(db: AsyncSession, user_id: int):
+    """Versão assíncrona de get_monthly_summary"""
+    return await db.run_sync(get_monthly_summary, user_id)
+
+
+async def get_daily_progress_async(db: AsyncSession, user_id: int):
+    """Versão assíncrona de get_daily_progress"""
+    return await db.run_sync(get_daily_progress, user_id)
+
+
+async def get_today_habits_async(db: AsyncSession, user_id: int):
+    """Versão assíncrona de get_today_habits"""
+    return await db.run_sync(get_today_habits, user_id)
+
+
+async def complete_habit_async(db: AsyncSession, user_id: int, habit_id: int):
+    """Versão assíncrona de complete_habit"""
+    return await db.run_sync(complete_habit, user_id, habit_id)
+
+
+async def complete_habits_async(db: AsyncSession, user_id: int, habit_ids: list[int]):
+    """Versão assíncrona de complete_habits"""
+    return await db.run_sync(complete_habits, user_id, habit_ids)
@@ -1,46 +1,196 @@
+"""
+Idempotência de callbacks em camadas
+
+A primeira camada é um conjunto em memória de tamanho fixo com os IDs
+vistos na janela recente (``IDEMPOTENCY_WINDOW_S``): a checagem custa
+microssegundos e não abre transação. Com vários workers/réplicas, uma
+camada compartilhada opcional deduplica entre processos:
+
+- ``redis``: ``SET NX`` com expiração da janela (padrão quando o cache
+  usa Redis);
+- ``db``: INSERT na tabela ``processed_callbacks`` (comportamento antigo);
+- ``memory``: sem camada compartilhada.
+
+Falhas na camada compartilhada liberam o processamento (fail-safe).
+"""
+
+import asyncio
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from typing import Optional
 
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from db.session import get_db
+from config import (
+    IDEMPOTENCY_BACKEND,
+    IDEMPOTENCY_MAX_SIZE,
+    IDEMPOTENCY_WINDOW_S,
+    REDIS_URL,
+)
+from db.session import SessionLocal, get_db
 from models.models import ProcessedCallback
+from utils.observability import increment_metric
 
 logger = logging.getLogger(__name__)
 
 
-def is_duplicate_callback(callback_id: str, db: Session) -> bool:
+class RecentKeys:
+    """Conjunto FIFO de tamanho fixo com expiração por janela de tempo"""
+
+    def __init__(self, max_size: int = IDEMPOTENCY_MAX_SIZE, window_s: float = IDEMPOTENCY_WINDOW_S):
+        self.max_size = max_size
+        self.window_s = window_s
+        self._keys: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str) -> bool:
+        """Registra a chave; retorna False se já estava na janela"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if key in self._keys:
+                return False
+            self._keys[key] = now
+            if len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+            return True
+
+    def prune(self) -> int:
+        """Remove chaves fora da janela; retorna quantas foram removidas"""
+        with self._lock:
+            return self._expire(time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+    def _expire(self, now: float) -> int:
+        cutoff = now - self.window_s
+        removed = 0
+        while self._keys:
+            key, seen_at = next(iter(self._keys.items()))
+            if seen_at >= cutoff:
+                break
+            self._keys.popitem(last=False)
+            removed += 1
+        return removed
+
+
+class RedisKeys:
+    """Camada compartilhada em Redis (``SET NX`` com expiração)"""
+
+    def __init__(
+        self,
+        url: str = REDIS_URL,
+        client=None,
+        prefix: str = "habitbot:callback",
+        window_s: float = IDEMPOTENCY_WINDOW_S,
+    ):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self._prefix = prefix
+        self._ttl_ms = max(1, int(window_s * 1000))
+
+    def add(self, key: str, db: Optional[Session] = None) -> bool:
+        return bool(self._redis.set(f"{self._prefix}:{key}", 1, nx=True, px=self._ttl_ms))
+
+
+class DatabaseKeys:
+    """Camada compartilhada na tabela ``processed_callbacks``"""
+
+    def add(self, key: str, db: Optional[Session] = None) -> bool:
+        if db is None:
+            with SessionLocal() as session:
+                return self._insert(key, session)
+        return self._insert(key, db)
+
+    @staticmethod
+    def _insert(key: str, db: Session) -> bool:
+        try:
+            db.add(ProcessedCallback(callback_id=key))
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+        except Exception:
+            db.rollback()
+            raise
+
+
+def create_shared_keys(backend: str = IDEMPOTENCY_BACKEND):
+    """Cria a camada compartilhada configurada (None para ``memory``)"""
+    if backend == "redis":
+        return RedisKeys()
+    if backend == "db":
+        return DatabaseKeys()
+    return None
+
+
+# Camadas globais
+_recent = RecentKeys()
+_shared = create_shared_keys()
+
+
+def is_duplicate_callback(callback_id: str, db: Optional[Session] = None) -> bool:
     """
     Verifica se um callback já foi processado.
     Retorna True se for duplicado, False se for novo.
     """
-    try:
-        # Tenta inserir o callback
-        obj = ProcessedCallback(callback_id=callback_id)
-        db.add(obj)
-        db.commit()
-        logger.debug(f"Callback {callback_id} processado pela primeira vez")
-        return False
-
-    except IntegrityError:
-        # Callback já existe
-        db.rollback()
+    if not _recent.add(callback_id):
+        increment_metric("callbacks_duplicate")
         logger.warning(f"Callback {callback_id} já foi processado (duplicado)")
         return True
 
+    if _shared is None:
+        return False
+
+    try:
+        if not _shared.add(callback_id, db):
+            increment_metric("callbacks_duplicate")
+            logger.warning(f"Callback {callback_id} já foi processado por outro worker (duplicado)")
+            return True
     except Exception as e:
-        # Erro inesperado
-        db.rollback()
-        logger.error(f"Erro ao verificar callback {callback_id}: {e}")
         # Em caso de erro, permite o processamento (fail-safe)
-        return False
+        logger.error(f"Erro ao verificar callback {callback_id}: {e}")
+
+    return False
+
+
+async def is_duplicate_callback_async(callback_id: str) -> bool:
+    """
+    Versão para handlers de ``is_duplicate_callback``: a camada compartilhada
+    (Redis ou banco) é consultada fora do event loop.
+    """
+    if _shared is None:
+        return is_duplicate_callback(callback_id)
+    return await asyncio.to_thread(is_duplicate_callback, callback_id)
 
 
 def cleanup_old_callbacks(minutes: int = 15, db: Session = None):
     """
-    Remove callbacks antigos da tabela.
+    Remove callbacks antigos: expira a camada em memória e, com a camada
+    ``db``, apaga as linhas antigas da tabela (o Redis expira sozinho).
     """
+    removed = _recent.prune()
+    if removed:
+        logger.debug(f"Expirados {removed} callbacks da memória")
+
+    if not isinstance(_shared, DatabaseKeys):
+        if db is not None:
+            db.close()
+        return
+
     if db is None:
         db = next(get_db())
 
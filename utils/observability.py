@@ -1,51 +1,318 @@
 """
 Utilitários para observabilidade e métricas
+
+As métricas ficam num registro em memória (contadores, gauges e
+histogramas com buckets fixos, todos com labels opcionais) exposto no
+formato texto do Prometheus em ``GET /metrics`` quando ``METRICS_PORT``
+está configurado.
 """
 
 import logging
+import math
+import threading
 import time
+from bisect import bisect_left
 from datetime import datetime
 from functools import wraps
-from typing import Any, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-# Métricas básicas em memória (em produção, usar Prometheus/DataDog)
-_metrics = {
-    "commands_executed": 0,
-    "errors_total": 0,
-    "db_queries": 0,
-    "db_latency_ms": [],
-    "active_users": 0,
-    "habits_completed": 0,
-}
-
-def increment_metric(metric_name: str, value: int = 1):
-    """Incrementa uma métrica"""
-    if metric_name in _metrics:
-        if isinstance(_metrics[metric_name], list):
-            _metrics[metric_name].append(value)
-        else:
-            _metrics[metric_name] += value
+# Prefixo dos nomes na exposição Prometheus
+METRICS_NAMESPACE = "habitbot"
+
+# Limites (ms) dos buckets de latência: memória constante por série
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class _Histogram:
+    """Série de histograma com buckets fixos (mais soma, contagem, mín e máx)"""
+    __slots__ = ("bounds", "counts", "sum", "count", "min", "max")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "_Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.sum += other.sum
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Estimativa do quantil por interpolação linear dentro do bucket"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                estimate = lower + (upper - lower) * (rank - cumulative) / count
+                return min(max(estimate, self.min), self.max)
+            cumulative += count
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas em memória: contadores, gauges e histogramas com
+    labels. Histogramas usam buckets fixos, então a memória não cresce com
+    o número de observações.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types: Dict[str, str] = {}
+        self._help: Dict[str, str] = {}
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._callbacks: Dict[str, Callable[[], float]] = {}
+
+    def _declare(self, name: str, kind: str, help_text: str = ""):
+        if self._types.setdefault(name, kind) != kind:
+            raise ValueError(f"Métrica {name} já registrada como {self._types[name]}")
+        if help_text:
+            self._help[name] = help_text
+
+    def counter(self, name: str, help_text: str = ""):
+        self._declare(name, "counter", help_text)
+        self._values.setdefault(name, {})
+
+    def gauge(self, name: str, help_text: str = "", callback: Optional[Callable[[], float]] = None):
+        """Declara um gauge; com ``callback`` o valor é lido na coleta"""
+        self._declare(name, "gauge", help_text)
+        self._values.setdefault(name, {})
+        if callback is not None:
+            self._callbacks[name] = callback
+
+    def histogram(self, name: str, help_text: str = "", buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self._declare(name, "histogram", help_text)
+        self._histograms.setdefault(name, {})
+        self._buckets[name] = tuple(sorted(buckets))
+
+    def kind(self, name: str) -> Optional[str]:
+        return self._types.get(name)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            if name not in self._types:
+                self.counter(name)
+            series = self._values[name]
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            if name not in self._types:
+                self.gauge(name)
+            self._values[name][_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            if name not in self._types:
+                self.histogram(name)
+            series = self._histograms[name]
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = _Histogram(self._buckets[name])
+            series[key].observe(value)
+
+    def value(self, name: str) -> float:
+        """Valor total do contador/gauge (soma de todas as séries)"""
+        if name in self._callbacks:
+            return self._read_callback(name)
+        return sum(self._values.get(name, {}).values())
+
+    def summary(self, name: str) -> _Histogram:
+        """Histograma agregado de todas as séries"""
+        total = _Histogram(self._buckets.get(name, LATENCY_BUCKETS_MS))
+        for histogram in list(self._histograms.get(name, {}).values()):
+            total.merge(histogram)
+        return total
+
+    def names(self, kind: Optional[str] = None) -> list:
+        return [name for name, k in self._types.items() if kind is None or k == kind]
+
+    def reset(self):
+        """Zera todos os valores (mantém as declarações)"""
+        with self._lock:
+            for series in self._values.values():
+                series.clear()
+            for series in self._histograms.values():
+                series.clear()
+
+    def _read_callback(self, name: str) -> float:
+        try:
+            return float(self._callbacks[name]())
+        except Exception as e:
+            logger.warning(f"Erro ao coletar gauge {name}: {e}")
+            return 0.0
+
+    def render(self) -> str:
+        """Exposição no formato texto do Prometheus (versão 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name, kind in self._types.items():
+                full_name = f"{METRICS_NAMESPACE}_{name}"
+                lines.append(f"# HELP {full_name} {self._help.get(name, name)}")
+                lines.append(f"# TYPE {full_name} {kind}")
+
+                if kind == "histogram":
+                    for key, histogram in self._histograms[name].items():
+                        cumulative = 0
+                        for bound, count in zip(histogram.bounds + (math.inf,), histogram.counts, strict=True):
+                            cumulative += count
+                            le = "+Inf" if bound == math.inf else _format_number(bound)
+                            lines.append(f"{full_name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                        lines.append(f"{full_name}_sum{_format_labels(key)} {_format_number(histogram.sum)}")
+                        lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+                elif name in self._callbacks:
+                    lines.append(f"{full_name} {_format_number(self._read_callback(name))}")
+                else:
+                    for key, value in self._values[name].items():
+                        lines.append(f"{full_name}{_format_labels(key)} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_number(value: float) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in key) + "}"
+
+
+# Registro global
+registry = MetricsRegistry()
+registry.counter("commands_executed", "Comandos executados")
+registry.counter("errors_total", "Erros registrados")
+registry.counter("db_queries", "Consultas SQL executadas")
+registry.counter("active_users", "Usuários ativos registrados")
+registry.counter("habits_completed", "Hábitos completados")
+registry.histogram("db_latency_ms", "Latência das consultas ao banco (ms)")
+registry.histogram("db_function_latency_ms", "Latência das funções com @track_db_query (ms)")
+registry.histogram("command_latency_ms", "Latência dos comandos (ms)")
+registry.histogram("handler_latency_ms", "Latência dos handlers de callback (ms)")
+
+_START_TIME = time.time()
+
+
+def increment_metric(metric_name: str, value: float = 1, **labels):
+    """Incrementa um contador (ou registra uma observação, se for histograma)"""
+    if registry.kind(metric_name) == "histogram":
+        registry.observe(metric_name, value, **labels)
     else:
-        _metrics[metric_name] = value
+        registry.inc(metric_name, value, **labels)
+
+
+def observe_metric(metric_name: str, value: float, **labels):
+    """Registra uma observação num histograma (ex: latência em ms)"""
+    registry.observe(metric_name, value, **labels)
+
+
+def set_gauge(metric_name: str, value: float, **labels):
+    """Define o valor atual de um gauge"""
+    registry.set(metric_name, value, **labels)
+
 
 def get_metrics() -> dict[str, Any]:
-    """Retorna todas as métricas"""
-    metrics = _metrics.copy()
-
-    # Calcular médias para latências
-    if metrics["db_latency_ms"]:
-        metrics["db_latency_avg_ms"] = sum(metrics["db_latency_ms"]) / len(metrics["db_latency_ms"])
-        metrics["db_latency_max_ms"] = max(metrics["db_latency_ms"])
-        metrics["db_latency_min_ms"] = min(metrics["db_latency_ms"])
-    else:
-        metrics["db_latency_avg_ms"] = 0
-        metrics["db_latency_max_ms"] = 0
-        metrics["db_latency_min_ms"] = 0
+    """Retorna todas as métricas (totais por nome; histogramas resumidos)"""
+    metrics: dict[str, Any] = {name: registry.value(name) for name in registry.names("counter")}
+    metrics.update({name: registry.value(name) for name in registry.names("gauge")})
+
+    for name in registry.names("histogram"):
+        histogram = registry.summary(name)
+        base, unit = (name[:-3], "_ms") if name.endswith("_ms") else (name, "")
+        metrics[f"{base}_count"] = histogram.count
+        metrics[f"{base}_avg{unit}"] = histogram.sum / histogram.count if histogram.count else 0
+        metrics[f"{base}_max{unit}"] = histogram.max if histogram.count else 0
+        metrics[f"{base}_min{unit}"] = histogram.min if histogram.count else 0
+        metrics[f"{base}_p50{unit}"] = histogram.quantile(0.5)
+        metrics[f"{base}_p99{unit}"] = histogram.quantile(0.99)
 
+    metrics["start_time"] = _START_TIME
     return metrics
 
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_metrics_server(port: Optional[int] = None, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serve ``GET /metrics`` numa thread do processo do bot (METRICS_PORT)"""
+    global _metrics_server
+    if port is None:
+        from config import METRICS_PORT
+
+        port = METRICS_PORT
+    if not port or _metrics_server is not None:
+        return _metrics_server
+
+    try:
+        _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"Não foi possível servir /metrics na porta {port}: {e}")
+        return None
+
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"📈 Métricas Prometheus em http://{host}:{port}/metrics")
+    return _metrics_server
+
+
+def stop_metrics_server():
+    """Para o servidor de métricas"""
+    global _metrics_server
+    if _metrics_server is not None:
+        _metrics_server.shutdown()
+        _metrics_server.server_close()
+        _metrics_server = None
+
 def log_metric(metric_name: str, value: Any = 1, tags: Optional[dict[str, str]] = None):
     """Loga uma métrica estruturada"""
     log_data = {
@@ -67,8 +334,7 @@ def track_db_query(func):
         try:
             result = func(*args, **kwargs)
             latency_ms = (time.time() - start_time) * 1000
-            increment_metric("db_queries")
-            increment_metric("db_latency_ms", latency_ms)
+            observe_metric("db_function_latency_ms", latency_ms, function=func.__name__)
             log_metric("db_query_success", latency_ms, {"function": func.__name__})
             return result
         except Exception as e:
@@ -89,14 +355,16 @@ def track_command(command_name: str):
             try:
                 result = await func(*args, **kwargs)
                 execution_time = (time.time() - start_time) * 1000
-                increment_metric("commands_executed")
+                increment_metric("commands_executed", command=command_name, status="success")
+                observe_metric("command_latency_ms", execution_time, command=command_name)
                 log_metric("command_executed", execution_time, {
                     "command": command_name,
                     "status": "success"
                 })
                 return result
             except Exception as e:
-                increment_metric("errors_total")
+                increment_metric("errors_total", source=command_name)
+                increment_metric("commands_executed", command=command_name, status="error")
                 log_metric("command_error", 0, {
                     "command": command_name,
                     "error": str(e),
@@ -110,14 +378,16 @@ def track_command(command_name: str):
             try:
                 result = func(*args, **kwargs)
                 execution_time = (time.time() - start_time) * 1000
-                increment_metric("commands_executed")
+                increment_metric("commands_executed", command=command_name, status="success")
+                observe_metric("command_latency_ms", execution_time, command=command_name)
                 log_metric("command_executed", execution_time, {
                     "command": command_name,
                     "status": "success"
                 })
                 return result
             except Exception as e:
-                increment_metric("errors_total")
+                increment_metric("errors_total", source=command_name)
+                increment_metric("commands_executed", command=command_name, status="error")
                 log_metric("command_error", 0, {
                     "command": command_name,
                     "error": str(e),
@@ -189,14 +459,14 @@ def log_error(error: Exception, context: Optional[dict[str, Any]] = None):
 
 def get_health_metrics() -> dict[str, Any]:
     """Retorna métricas para health check"""
+    db_latency = registry.summary("db_latency_ms")
     return {
-        "uptime_seconds": int(time.time() - _metrics.get("start_time", time.time())),
-        "commands_executed": _metrics.get("commands_executed", 0),
-        "errors_total": _metrics.get("errors_total", 0),
-        "active_users": _metrics.get("active_users", 0),
-        "habits_completed": _metrics.get("habits_completed", 0),
-        "db_queries": _metrics.get("db_queries", 0),
+        "uptime_seconds": int(time.time() - _START_TIME),
+        "commands_executed": int(registry.value("commands_executed")),
+        "errors_total": int(registry.value("errors_total")),
+        "active_users": int(registry.value("active_users")),
+        "habits_completed": int(registry.value("habits_completed")),
+        "db_queries": int(registry.value("db_queries")),
+        "db_latency_p50_ms": round(db_latency.quantile(0.5), 2),
+        "db_latency_p99_ms": round(db_latency.quantile(0.99), 2),
     }
-
-# Inicializar tempo de início
-_metrics["start_time"] = time.time()
@@ -0,0 +1,243 @@
+"""
+Fila de envio de mensagens com limite de taxa (lembretes e broadcasts)
+
+As mensagens entram numa fila ``asyncio`` consumida por um número fixo de
+workers. Antes de cada envio o worker respeita o intervalo mínimo por chat
+e reserva um token do limitador global (token bucket), mantendo o bot
+abaixo do limite do Telegram (~30 msg/s). ``RetryAfter`` (429) pausa o
+limitador global pelo tempo pedido e reenfileira a mensagem; falhas de rede
+são reenviadas com backoff; bloqueios/erros de requisição são descartados.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, Iterable, Optional, Set
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from config import (
+    OUTBOX_CHAT_INTERVAL,
+    OUTBOX_CONCURRENCY,
+    OUTBOX_GLOBAL_RATE,
+    OUTBOX_MAX_RETRIES,
+)
+from utils.logging_config import get_logger
+from utils.observability import increment_metric, registry
+from utils.tracing import SPAN_KIND_CLIENT, current_span, start_span
+
+logger = get_logger(__name__)
+
+# Acima deste tamanho, intervalos por chat já vencidos são descartados
+_CHAT_PRUNE_SIZE = 10_000
+
+
+class TokenBucket:
+    """Token bucket por reserva: cada envio debita um token e espera o saldo"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def reserve(self) -> float:
+        """Reserva um token e retorna os segundos de espera até poder usá-lo"""
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+
+        wait = max(0.0, self._paused_until - now)
+        if self._tokens < 0:
+            wait = max(wait, -self._tokens / self.rate)
+        return wait
+
+    def pause(self, seconds: float):
+        """Bloqueia novas reservas por ``seconds`` (ex: RetryAfter do Telegram)"""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+@dataclass(eq=False)
+class OutboundMessage:
+    chat_id: int
+    text: str
+    options: Dict[str, Any]
+    future: asyncio.Future
+    attempts: int = 0
+    trace_parent: Any = None  # span de quem enfileirou (o worker roda em outra task)
+    retry_handle: Optional[asyncio.TimerHandle] = None  # reenvio agendado (call_later)
+
+
+def _seconds(value) -> float:
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class MessageOutbox:
+    """Fila de saída com limitador global, intervalo por chat e concorrência fixa"""
+
+    def __init__(
+        self,
+        bot=None,
+        global_rate: float = OUTBOX_GLOBAL_RATE,
+        chat_interval: float = OUTBOX_CHAT_INTERVAL,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        max_retries: int = OUTBOX_MAX_RETRIES,
+        retry_backoff: float = 1.0,
+    ):
+        self.bot = bot
+        self.limiter = TokenBucket(global_rate)
+        self.chat_interval = chat_interval
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._chat_next: Dict[int, float] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list = []
+        # Mensagens ainda sem resultado: na fila, em envio ou aguardando reenvio
+        self._unfinished: Set[OutboundMessage] = set()
+        self._idle: Optional[asyncio.Event] = None
+
+    def bind(self, bot):
+        """Define o bot usado nos envios"""
+        self.bot = bot
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._workers and self._workers[0].get_loop() is loop:
+            return
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"outbox-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    def enqueue(self, chat_id: int, text: str, **options) -> asyncio.Future:
+        """Enfileira uma mensagem; o future resolve com True (enviada) ou False"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        message = OutboundMessage(chat_id, text, options, future, trace_parent=current_span())
+        self._unfinished.add(message)
+        self._idle.clear()
+        self._queue.put_nowait(message)
+        increment_metric("outbox_enqueued")
+        return future
+
+    async def send(self, chat_id: int, text: str, **options) -> bool:
+        """Enfileira e aguarda o envio de uma mensagem"""
+        return await self.enqueue(chat_id, text, **options)
+
+    async def broadcast(self, chat_ids: Iterable[int], text: str, **options) -> Dict[str, int]:
+        """Envia a mesma mensagem a vários chats respeitando os limites"""
+        results = await asyncio.gather(*(self.enqueue(chat_id, text, **options) for chat_id in chat_ids))
+        sent = sum(1 for delivered in results if delivered)
+        return {"sent": sent, "failed": len(results) - sent}
+
+    async def drain(self):
+        """Aguarda até não haver mensagens pendentes (inclusive reenvios)"""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def stop(self):
+        """
+        Cancela os workers e os reenvios agendados; mensagens ainda não
+        enviadas (na fila, em envio ou aguardando reenvio) resolvem com False.
+        """
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        for message in list(self._unfinished):
+            if message.retry_handle is not None:
+                message.retry_handle.cancel()
+            increment_metric("outbox_failed")
+            self._finish(message, False)
+        self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado atual da fila"""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending": len(self._unfinished),
+            "workers": len(self._workers),
+        }
+
+    def _chat_wait(self, chat_id: int) -> float:
+        now = time.monotonic()
+        if len(self._chat_next) > _CHAT_PRUNE_SIZE:
+            self._chat_next = {chat: due for chat, due in self._chat_next.items() if due > now}
+        slot = max(now, self._chat_next.get(chat_id, 0.0))
+        self._chat_next[chat_id] = slot + self.chat_interval
+        return slot - now
+
+    def _finish(self, message: OutboundMessage, delivered: bool):
+        if not message.future.done():
+            message.future.set_result(delivered)
+        self._unfinished.discard(message)
+        if not self._unfinished:
+            self._idle.set()
+
+    def _retry(self, message: OutboundMessage, delay: float) -> bool:
+        if message.attempts > self.max_retries:
+            return False
+        increment_metric("outbox_retried")
+        message.retry_handle = asyncio.get_running_loop().call_later(delay, self._requeue, message)
+        return True
+
+    def _requeue(self, message: OutboundMessage):
+        message.retry_handle = None
+        self._queue.put_nowait(message)
+
+    async def _worker(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._deliver(message)
+            except Exception as e:
+                logger.error(f"Erro inesperado no envio para {message.chat_id}: {e}")
+                increment_metric("outbox_failed")
+                self._finish(message, False)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, message: OutboundMessage):
+        await asyncio.sleep(self._chat_wait(message.chat_id))
+        await asyncio.sleep(self.limiter.reserve())
+
+        message.attempts += 1
+        try:
+            attributes = {"chat.id": message.chat_id, "attempt": message.attempts}
+            with start_span("outbox send", SPAN_KIND_CLIENT, attributes, root=False, parent=message.trace_parent):
+                await self.bot.send_message(chat_id=message.chat_id, text=message.text, **message.options)
+        except RetryAfter as e:
+            retry_after = _seconds(e.retry_after)
+            logger.warning(f"Telegram pediu pausa de {retry_after}s (chat {message.chat_id})")
+            increment_metric("outbox_throttled")
+            self.limiter.pause(retry_after)
+            if self._retry(message, retry_after):
+                return
+        except (Forbidden, BadRequest) as e:
+            logger.warning(f"Mensagem para {message.chat_id} descartada: {e}")
+        except NetworkError as e:
+            if self._retry(message, self.retry_backoff * 2 ** (message.attempts - 1)):
+                return
+            logger.error(f"Falha de rede ao enviar para {message.chat_id}: {e}")
+        else:
+            increment_metric("outbox_sent")
+            self._finish(message, True)
+            return
+
+        increment_metric("outbox_failed")
+        self._finish(message, False)
+
+
+# Fila global (o bot é vinculado na inicialização da aplicação)
+outbox = MessageOutbox()
+
+registry.gauge("outbox_queued", "Mensagens aguardando envio", callback=lambda: outbox.stats()["queued"])
@@ -0,0 +1,153 @@
+"""
+Instrumentação automática das consultas SQL (eventos do engine)
+
+``instrument_engine`` registra ``before_cursor_execute``/``after_cursor_execute``
+no engine: toda consulta alimenta ``db_queries`` e o histograma
+``db_latency_ms``. Quando a execução acontece dentro de ``track_queries``
+(aberto por ``safe_handler``/``track_command``), a consulta também é somada
+ao handler corrente via ``ContextVar`` — que ``asyncio.to_thread`` copia
+para a thread de ``run_db``. Ao final do handler, handlers acima do
+orçamento de consultas (``DB_QUERY_BUDGET``, típico de N+1) são registrados
+com as consultas mais lentas; consultas acima de ``DB_SLOW_QUERY_MS`` são
+logadas individualmente.
+"""
+
+import heapq
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from config import DB_QUERY_BUDGET, DB_SLOW_QUERY_MS
+from utils.logging_config import get_logger
+from utils.observability import increment_metric, observe_metric, registry
+from utils.tracing import SPAN_KIND_CLIENT, is_recording, record_span
+
+logger = get_logger(__name__)
+
+# Consultas mais lentas guardadas por handler
+SLOWEST_KEPT = 3
+
+registry.histogram(
+    "handler_db_queries", "Consultas SQL por execução de handler",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 250),
+)
+
+
+@dataclass
+class QueryStats:
+    """Consultas executadas durante um handler"""
+    handler: str
+    count: int = 0
+    total_ms: float = 0.0
+    slowest: List[Tuple[float, str]] = field(default_factory=list)  # min-heap
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, elapsed_ms: float, statement: str):
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            if len(self.slowest) < SLOWEST_KEPT:
+                heapq.heappush(self.slowest, (elapsed_ms, statement))
+            elif elapsed_ms > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (elapsed_ms, statement))
+
+    def slowest_first(self) -> List[Tuple[float, str]]:
+        return sorted(self.slowest, reverse=True)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Estatísticas do handler em execução (None fora de ``track_queries``)"""
+    return _current.get()
+
+
+def _short(statement: str, limit: int = 300) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+
+def _operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    return words[0].lower() if words else "unknown"
+
+
+@contextmanager
+def track_queries(handler: str, budget: int = DB_QUERY_BUDGET) -> Iterator[QueryStats]:
+    """Conta as consultas do bloco e reporta ao final (orçamento e mais lentas)"""
+    stats = QueryStats(handler)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        _report(stats, budget)
+
+
+def _report(stats: QueryStats, budget: int):
+    if not stats.count:
+        return
+
+    observe_metric("handler_db_queries", stats.count, handler=stats.handler)
+    if stats.count > budget:
+        increment_metric("db_query_budget_exceeded", handler=stats.handler)
+        slowest = "; ".join(f"{ms:.1f}ms {_short(sql, 120)}" for ms, sql in stats.slowest_first())
+        logger.warning(
+            f"Handler {stats.handler} executou {stats.count} consultas "
+            f"(orçamento {budget}, {stats.total_ms:.1f}ms no banco). Mais lentas: {slowest}"
+        )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+    operation = _operation(statement)
+
+    increment_metric("db_queries")
+    observe_metric("db_latency_ms", elapsed_ms, operation=operation)
+
+    # Span filho do update corrente (só em traces amostrados)
+    if is_recording():
+        end_ns = time.time_ns()
+        record_span(
+            f"db {operation}", end_ns - int(elapsed_ms * 1_000_000), end_ns, SPAN_KIND_CLIENT,
+            {"db.system": conn.dialect.name, "db.statement": _short(statement)},
+        )
+
+    stats = _current.get()
+    if stats is not None:
+        stats.record(elapsed_ms, statement)
+
+    if elapsed_ms >= DB_SLOW_QUERY_MS:
+        increment_metric("db_slow_queries")
+        handler = stats.handler if stats is not None else "-"
+        logger.warning(f"Consulta lenta ({elapsed_ms:.1f}ms, handler {handler}): {_short(statement)}")
+
+
+def _handle_error(exception_context):
+    # Consulta com erro não passa por after_cursor_execute: descarta o início
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    """Registra os eventos de instrumentação num engine síncrono (idempotente)"""
+    if event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    return engine
@@ -1,33 +1,222 @@
+"""
+Rate limiting por token bucket com memória limitada
+
+Cada chave ("comando:user_id") tem um balde de ``burst`` tokens que recarrega
+um token a cada ``window_s`` segundos: com ``burst=1`` o comportamento é o
+antigo "uma chamada por janela"; comandos interativos podem aceitar toques
+duplos rápidos configurando ``RATE_LIMIT_BURSTS``.
+
+Os baldes ficam num LRU limitado a ``RATE_LIMIT_MAX_KEYS``; baldes cheios
+(chave ociosa) equivalem a chave ausente e são descartados do início do LRU
+a cada chamada. Com ``RATE_LIMIT_BACKEND=redis`` o balde é mantido no Redis
+(script Lua atômico) e compartilhado entre workers.
+"""
+
+import asyncio
 import logging
+import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict
+from typing import Optional
+
+from config import (
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_BURSTS,
+    RATE_LIMIT_MAX_KEYS,
+    REDIS_URL,
+)
+from utils.observability import increment_metric, registry
 
 logger = logging.getLogger(__name__)
 
-# Memória em cache; em produção você pode migrar para Redis
-_LAST = defaultdict(float)
+
+class _Bucket:
+    """Estado de um balde (tokens, última recarga e último pedido)"""
+    __slots__ = ("tokens", "updated", "last_request", "rate", "capacity")
+
+    def __init__(self, capacity: float, rate: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+        self.last_request = 0.0
+        self.rate = rate
+        self.capacity = capacity
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_idle(self, now: float) -> bool:
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class TokenBucketLimiter:
+    """Token buckets em memória num LRU de tamanho limitado"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, clock=time.time):
+        self.max_keys = max_keys
+        self._clock = clock
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def hit(self, key: str, window_s: float, burst: int = 1) -> bool:
+        """Consome um token da chave; retorna False se não houver token"""
+        if window_s <= 0:
+            return True
+
+        now = self._clock()
+        with self._lock:
+            # Abre espaço para a chave nova antes de inseri-la
+            self._evict(now, self.max_keys - (key not in self._buckets))
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = _Bucket(burst, 1 / window_s, now)
+                self._buckets[key] = bucket
+            else:
+                self._buckets.move_to_end(key)
+                bucket.refill(now)
+
+            if bucket.tokens < 1:
+                return False
+            bucket.tokens -= 1
+            bucket.last_request = now
+            return True
+
+    def last_request(self, key: str) -> float:
+        bucket = self._buckets.get(key)
+        return bucket.last_request if bucket is not None else 0.0
+
+    def clear(self, key: Optional[str] = None):
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+    def _evict(self, now: float, max_keys: int):
+        # Remove baldes ociosos do início do LRU e o excesso acima do limite
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) <= max_keys and not bucket.is_idle(now):
+                break
+            if bucket.is_idle(now):
+                increment_metric("rate_limit_evicted")
+            del self._buckets[key]
+
+
+# Token bucket atômico no Redis: HASH {tokens, updated} com expiração
+_REDIS_TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return allowed
+"""
 
 
-def rate_limited(key: str, window_s: int) -> bool:
+class RedisTokenBucketLimiter:
+    """Token buckets compartilhados no Redis (fallback local em caso de erro)"""
+
+    def __init__(self, url: str = REDIS_URL, client=None, prefix: str = "habitbot:ratelimit"):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self._prefix = prefix
+        self._script = client.register_script(_REDIS_TOKEN_BUCKET)
+        self._fallback = TokenBucketLimiter()
+
+    def __len__(self) -> int:
+        return len(self._fallback)
+
+    def hit(self, key: str, window_s: float, burst: int = 1) -> bool:
+        if window_s <= 0:
+            return True
+        try:
+            allowed = self._script(
+                keys=[f"{self._prefix}:{key}"], args=[burst, 1 / window_s, time.time()]
+            )
+            return bool(allowed)
+        except Exception as e:
+            logger.warning(f"Erro no rate limit Redis, usando limite local: {e}")
+            return self._fallback.hit(key, window_s, burst)
+
+    def last_request(self, key: str) -> float:
+        return self._fallback.last_request(key)
+
+    def clear(self, key: Optional[str] = None):
+        self._fallback.clear(key)
+        try:
+            if key is None:
+                keys = list(self._redis.scan_iter(match=f"{self._prefix}:*"))
+                if keys:
+                    self._redis.delete(*keys)
+            else:
+                self._redis.delete(f"{self._prefix}:{key}")
+        except Exception as e:
+            logger.warning(f"Erro ao limpar rate limit Redis: {e}")
+
+
+def create_limiter(backend: str = RATE_LIMIT_BACKEND):
+    """Cria o limitador configurado (RATE_LIMIT_BACKEND=memory|redis)"""
+    if backend == "redis":
+        return RedisTokenBucketLimiter()
+    return TokenBucketLimiter()
+
+
+# Limitador global
+_limiter = create_limiter()
+
+registry.gauge("rate_limit_keys", "Chaves com balde de rate limit em memória", callback=lambda: len(_limiter))
+
+
+def _burst_for(key: str) -> int:
+    return RATE_LIMIT_BURSTS.get(key.split(":", 1)[0], 1)
+
+
+def rate_limited(key: str, window_s: int, burst: Optional[int] = None) -> bool:
     """
     Verifica se uma ação está dentro do limite de taxa.
 
     Args:
         key: Chave única para identificar a ação (ex: "start:123456")
-        window_s: Janela de tempo em segundos
+        window_s: Segundos para recarregar um token
+        burst: Chamadas seguidas permitidas (padrão: RATE_LIMIT_BURSTS do
+            comando da chave, ou 1)
 
     Returns:
         True se estiver limitado (muito recente), False se permitido
     """
-    now = time.time()
-    last_time = _LAST.get(key, 0)
+    increment_metric("rate_limit_checks")
+    if _limiter.hit(key, window_s, burst or _burst_for(key)):
+        return False
+
+    increment_metric("rate_limit_rejected")
+    logger.warning(f"Rate limit atingido para {key} (janela: {window_s}s)")
+    return True
 
-    if now - last_time < window_s:
-        logger.warning(f"Rate limit atingido para {key} (janela: {window_s}s)")
-        return True
 
-    _LAST[key] = now
-    return False
+async def rate_limited_async(key: str, window_s: int, burst: Optional[int] = None) -> bool:
+    """
+    Versão para handlers de ``rate_limited``: com o backend Redis a consulta
+    roda fora do event loop; o balde em memória é checado direto.
+    """
+    if isinstance(_limiter, RedisTokenBucketLimiter):
+        return await asyncio.to_thread(rate_limited, key, window_s, burst)
+    return rate_limited(key, window_s, burst)
 
 
 def get_rate_limit_info(key: str) -> dict:
@@ -35,7 +224,7 @@ def get_rate_limit_info(key: str) -> dict:
     Retorna informações sobre o rate limit de uma chave.
     """
     now = time.time()
-    last_time = _LAST.get(key, 0)
+    last_time = _limiter.last_request(key)
     time_since_last = now - last_time
 
     return {
@@ -43,6 +232,7 @@ def get_rate_limit_info(key: str) -> dict:
         "last_request": last_time,
         "time_since_last": time_since_last,
         "is_limited": time_since_last < 1,  # Assumindo janela de 1s para info
+        "tracked_keys": len(_limiter),
     }
 
 
@@ -53,9 +243,8 @@ def clear_rate_limit(key: str = None):
     Args:
         key: Chave específica para limpar, ou None para limpar tudo
     """
+    _limiter.clear(key)
     if key:
-        _LAST.pop(key, None)
         logger.info(f"Rate limit limpo para {key}")
     else:
-        _LAST.clear()
         logger.info("Rate limit cache limpo completamente")
@@ -0,0 +1,221 @@
+"""
+Despachante de lembretes em memória (granularidade de minuto)
+
+Em vez de um job do APScheduler por lembrete, os lembretes ativos ficam num
+índice ``(fuso, dia da semana, minuto do dia) -> lembretes``. Um único job
+acorda a cada minuto e, para cada fuso em uso, calcula o minuto local e
+busca o lote correspondente: o custo por tick é proporcional à quantidade
+de fusos, não de lembretes. O ``ReminderRepository`` mantém o índice
+atualizado ao criar/remover lembretes.
+
+Horário de verão: na volta do relógio a hora repetida (``fold=1``) não é
+despachada de novo, e no adiantamento os minutos locais que não existem
+saem junto com o primeiro minuto depois do salto.
+"""
+
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import DEFAULT_TIMEZONE
+from utils.day_boundary import get_zone, is_valid_timezone
+from utils.logging_config import get_logger
+from utils.observability import registry
+from utils.weekdays import ALL_DAYS_MASK
+
+logger = get_logger(__name__)
+
+# Minutos perdidos (tick atrasado) que ainda são despachados no tick seguinte
+MAX_CATCH_UP_MINUTES = 5
+
+SlotKey = Tuple[str, int, int]  # (fuso, dia da semana 0=segunda, minuto do dia)
+
+
+@dataclass(frozen=True, slots=True)
+class ReminderEntry:
+    """Dados de envio de um lembrete"""
+    reminder_id: int
+    chat_id: int  # telegram_user_id
+    habit_id: int
+    habit_name: str
+
+
+def _prepare(
+    reminder_id: int,
+    chat_id: int,
+    habit_id: int,
+    habit_name: str,
+    time: str,
+    days_mask: Optional[int],
+    timezone: Optional[str] = None,
+) -> Tuple[ReminderEntry, str, Tuple[SlotKey, ...]]:
+    """Calcula a entrada e as chaves de índice de um lembrete"""
+    hour, minute = map(int, time.split(":"))
+    minute_of_day = hour * 60 + minute
+    timezone = timezone if is_valid_timezone(timezone) else DEFAULT_TIMEZONE
+    mask = ALL_DAYS_MASK if days_mask is None else days_mask
+
+    keys = tuple(
+        (timezone, weekday, minute_of_day) for weekday in range(7) if mask & (1 << weekday)
+    )
+    return ReminderEntry(reminder_id, chat_id, habit_id, habit_name), timezone, keys
+
+
+def _local_minutes(moment: datetime, zone) -> List[datetime]:
+    """
+    Minutos locais (horário de parede, sem fuso) a despachar no minuto UTC
+    ``moment``: nenhum na segunda passagem da hora repetida, o próprio minuto
+    e, logo após um adiantamento do relógio, também os minutos pulados.
+    """
+    local = moment.astimezone(zone)
+    if local.fold:
+        return []
+
+    wall = local.replace(tzinfo=None)
+    skipped = local.utcoffset() - (moment - timedelta(minutes=1)).astimezone(zone).utcoffset()
+    minutes = []
+    current = wall - skipped
+    while current < wall:
+        minutes.append(current)
+        current += timedelta(minutes=1)
+    minutes.append(wall)
+    return minutes
+
+
+class ReminderDispatcher:
+    """Índice de lembretes por minuto local, com inclusão/remoção incremental"""
+
+    def __init__(self):
+        self._slots: Dict[SlotKey, Dict[int, ReminderEntry]] = {}
+        self._keys: Dict[int, Tuple[str, Tuple[SlotKey, ...]]] = {}  # id -> (fuso, chaves)
+        self._zones: Dict[str, int] = {}  # fuso -> lembretes indexados
+        self._last_minute: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, reminder_id: int) -> bool:
+        return reminder_id in self._keys
+
+    def add(
+        self,
+        reminder_id: int,
+        chat_id: int,
+        habit_id: int,
+        habit_name: str,
+        time: str,
+        days_mask: Optional[int],
+        timezone: Optional[str] = None,
+    ):
+        """Indexa (ou reindexa) um lembrete; ``time`` no formato HH:MM"""
+        prepared = _prepare(reminder_id, chat_id, habit_id, habit_name, time, days_mask, timezone)
+        with self._lock:
+            self._index(*prepared)
+
+    def _index(self, entry: ReminderEntry, timezone: str, keys: Tuple[SlotKey, ...]):
+        self._discard(entry.reminder_id)
+        for key in keys:
+            self._slots.setdefault(key, {})[entry.reminder_id] = entry
+        self._keys[entry.reminder_id] = (timezone, keys)
+        self._zones[timezone] = self._zones.get(timezone, 0) + 1
+
+    def remove(self, reminder_id: int) -> bool:
+        """Remove um lembrete do índice"""
+        with self._lock:
+            return self._discard(reminder_id)
+
+    def _discard(self, reminder_id: int) -> bool:
+        indexed = self._keys.pop(reminder_id, None)
+        if indexed is None:
+            return False
+
+        timezone, keys = indexed
+        for key in keys:
+            slot = self._slots.get(key)
+            if slot is not None:
+                slot.pop(reminder_id, None)
+                if not slot:
+                    del self._slots[key]
+
+        self._zones[timezone] -= 1
+        if not self._zones[timezone]:
+            del self._zones[timezone]
+        return True
+
+    def add_many(self, rows: Iterable[tuple]) -> int:
+        """
+        Indexa um lote de lembretes. Cada linha segue a ordem de ``add``:
+        (id, chat_id, habit_id, nome, HH:MM, days_mask, fuso). Linhas
+        inválidas são ignoradas; retorna quantas foram indexadas.
+        """
+        prepared = []
+        for row in rows:
+            try:
+                prepared.append(_prepare(*row))
+            except (TypeError, ValueError) as e:
+                logger.error(f"Lembrete inválido ignorado ({row[0]}): {e}")
+
+        with self._lock:
+            for entry, timezone, keys in prepared:
+                self._index(entry, timezone, keys)
+        return len(prepared)
+
+    def load(self, rows: Iterable[tuple]) -> int:
+        """Substitui o índice pelos lembretes informados"""
+        self.clear()
+        return self.add_many(rows)
+
+    def clear(self):
+        """Esvazia o índice"""
+        with self._lock:
+            self._slots.clear()
+            self._keys.clear()
+            self._zones.clear()
+            self._last_minute = None
+
+    def due(self, moment: datetime) -> List[ReminderEntry]:
+        """Lembretes do minuto de ``moment`` (UTC) em todos os fusos"""
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=dt_timezone.utc)
+
+        batch = []
+        with self._lock:
+            for timezone in self._zones:
+                for local in _local_minutes(moment, get_zone(timezone)):
+                    slot = self._slots.get((timezone, local.weekday(), local.hour * 60 + local.minute))
+                    if slot:
+                        batch.extend(slot.values())
+        return batch
+
+    def collect(self, now: Optional[datetime] = None) -> List[ReminderEntry]:
+        """
+        Lote a despachar no tick atual: o minuto de ``now`` e os minutos
+        perdidos desde o último tick (até ``MAX_CATCH_UP_MINUTES``). Um minuto
+        nunca é despachado duas vezes.
+        """
+        now = now or datetime.now(dt_timezone.utc)
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=dt_timezone.utc)
+        minute = now.replace(second=0, microsecond=0)
+
+        last = self._last_minute
+        if last is not None and minute <= last:
+            return []
+
+        first = minute if last is None else max(last + timedelta(minutes=1),
+                                                minute - timedelta(minutes=MAX_CATCH_UP_MINUTES))
+        self._last_minute = minute
+
+        batch = []
+        while first <= minute:
+            batch.extend(self.due(first))
+            first += timedelta(minutes=1)
+        return batch
+
+
+# Despachante global (alimentado no startup e pelo ReminderRepository)
+reminder_dispatcher = ReminderDispatcher()
+
+registry.gauge("reminders_indexed", "Lembretes ativos no despachante", callback=lambda: len(reminder_dispatcher))
@@ -4,10 +4,13 @@ Repositório para operações de CRUD de hábitos e lembretes
 
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import Iterator, Optional
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app_types import HabitRecord
 from models.models import Habit, Reminder, User
 from utils.validators import (
     ValidationError,
@@ -23,9 +26,14 @@ from utils.cache import (
     get_daily_progress_cache_key,
     invalidate_user_cache,
 )
+from utils.reminders import reminder_dispatcher
+from utils.user_stats import refresh_habit_counts
 
 logger = logging.getLogger(__name__)
 
+# Colunas lidas para montar HabitRecord (na ordem dos campos do dataclass)
+_HABIT_RECORD_FIELDS = tuple(HabitRecord.__dataclass_fields__)
+
 
 class RepositoryError(Exception):
     """Erro do repositório"""
@@ -90,6 +98,7 @@ class HabitRepository:
             )
 
             db.add(habit)
+            refresh_habit_counts(db, user.id)
             db.commit()
             db.refresh(habit)
             
@@ -108,8 +117,13 @@ class HabitRepository:
             raise RepositoryError(f"Erro interno: {e}")
 
     @staticmethod
-    def get_habits(db: Session, user_id: int, active_only: bool = True) -> list[Habit]:
-        """Busca hábitos do usuário"""
+    def get_habits(db: Session, user_id: int, active_only: bool = True) -> list[HabitRecord]:
+        """
+        Busca hábitos do usuário.
+
+        Retorna ``HabitRecord`` imutáveis (lidos só as colunas, sem instâncias
+        ORM), que podem ser cacheados e usados depois de fechada a sessão.
+        """
         try:
             user_id = validate_user_id(user_id)
             
@@ -119,18 +133,24 @@ class HabitRepository:
             if cached_habits is not None:
                 return cached_habits
             
-            user = db.query(User).filter(User.telegram_user_id == user_id).first()
-            if not user:
-                raise UserNotFoundError(f"Usuário {user_id} não encontrado")
-            
-            query = db.query(Habit).filter(Habit.user_id == user.id)
+            query = (
+                select(*(getattr(Habit, field) for field in _HABIT_RECORD_FIELDS))
+                .join(User, User.id == Habit.user_id)
+                .where(User.telegram_user_id == user_id)
+            )
             if active_only:
-                query = query.filter(Habit.is_active == True)
+                query = query.where(Habit.is_active == True)
+            
+            habits = [
+                HabitRecord(*row)
+                for row in db.execute(query.order_by(Habit.created_at.desc()))
+            ]
             
-            habits = query.order_by(Habit.created_at.desc()).all()
+            if not habits and not db.query(User.id).filter(User.telegram_user_id == user_id).first():
+                raise UserNotFoundError(f"Usuário {user_id} não encontrado")
             
             # Cacheia resultado por 5 minutos
-            cache.set(cache_key, habits, 300)
+            cache.set(cache_key, habits, 300, user_id=user_id)
             
             return habits
             
@@ -190,8 +210,13 @@ class HabitRepository:
                     setattr(habit, key, value)
 
             habit.updated_at = datetime.utcnow()
+            if 'is_active' in kwargs:
+                refresh_habit_counts(db, habit.user_id)
             db.commit()
+            invalidate_user_cache(user_id)
             db.refresh(habit)
+            if 'name' in kwargs or 'is_active' in kwargs:
+                ReminderRepository.sync_habit_reminders(db, habit.id)
 
             logger.info(f"Hábito atualizado: {habit_id}")
             return habit
@@ -212,7 +237,10 @@ class HabitRepository:
 
             habit.is_active = False
             habit.updated_at = datetime.utcnow()
+            refresh_habit_counts(db, habit.user_id)
             db.commit()
+            invalidate_user_cache(user_id)
+            ReminderRepository.sync_habit_reminders(db, habit.id)
 
             logger.info(f"Hábito deletado: {habit_id}")
             return True
@@ -233,8 +261,11 @@ class HabitRepository:
 
             habit.is_active = not habit.is_active
             habit.updated_at = datetime.utcnow()
+            refresh_habit_counts(db, habit.user_id)
             db.commit()
+            invalidate_user_cache(user_id)
             db.refresh(habit)
+            ReminderRepository.sync_habit_reminders(db, habit.id)
 
             status = "ativado" if habit.is_active else "desativado"
             logger.info(f"Hábito {status}: {habit_id}")
@@ -259,9 +290,9 @@ class ReminderRepository:
         habit_id: int,
         time: str,  # HH:MM
         days: str,  # "1,2,3,4,5"
-        timezone: str = "America/Sao_Paulo"
+        timezone: Optional[str] = None
     ) -> Reminder:
-        """Cria um novo lembrete"""
+        """Cria um novo lembrete (fuso padrão: o do usuário)"""
         try:
             from utils.validators import validate_days_format, validate_time_format
 
@@ -292,7 +323,7 @@ class ReminderRepository:
                 habit_id=habit_id,
                 time=time,
                 days=days,
-                timezone=timezone,
+                timezone=timezone or user.timezone,
                 enabled=True
             )
 
@@ -300,6 +331,11 @@ class ReminderRepository:
             db.commit()
             db.refresh(reminder)
 
+            reminder_dispatcher.add(
+                reminder.id, user_id, habit_id, habit.name,
+                reminder.time, reminder.days_mask, reminder.timezone
+            )
+
             logger.info(f"Lembrete criado: {reminder.id} para hábito {habit_id}")
             return reminder
 
@@ -367,6 +403,8 @@ class ReminderRepository:
             reminder.updated_at = datetime.utcnow()
             db.commit()
 
+            reminder_dispatcher.remove(reminder.id)
+
             logger.info(f"Lembrete deletado: {reminder.id}")
             return True
 
@@ -386,3 +424,140 @@ class ReminderRepository:
         except Exception as e:
             logger.error(f"Erro ao buscar lembretes ativos: {e}")
             raise RepositoryError(f"Erro interno: {e}")
+
+    @staticmethod
+    def _active_reminder_schedule_query():
+        # Colunas na ordem de ``ReminderDispatcher.add``: (id, chat_id,
+        # habit_id, nome, HH:MM, days_mask, fuso)
+        return (
+            select(
+                Reminder.id,
+                User.telegram_user_id,
+                Reminder.habit_id,
+                Habit.name,
+                Reminder.time,
+                Reminder.days_mask,
+                Reminder.timezone,
+            )
+            .join(User, Reminder.user_id == User.id)
+            .join(Habit, Reminder.habit_id == Habit.id)
+            .where(Reminder.enabled == True, Habit.is_active == True)
+            .order_by(Reminder.id)
+        )
+
+    @staticmethod
+    def _resync_reminders(db: Session, condition) -> int:
+        # Remove todos os lembretes do filtro e reindexa os que continuam ativos
+        reminder_ids = db.execute(select(Reminder.id).where(condition)).scalars().all()
+        for reminder_id in reminder_ids:
+            reminder_dispatcher.remove(reminder_id)
+
+        return reminder_dispatcher.add_many(
+            db.execute(ReminderRepository._active_reminder_schedule_query().where(condition)).all()
+        )
+
+    @staticmethod
+    def sync_habit_reminders(db: Session, habit_id: int) -> int:
+        """
+        Reindexa no despachante os lembretes de um hábito após renomear,
+        desativar ou excluir: remove todos e reindexa os que continuam
+        ativos (com o nome atual). Retorna quantos ficaram indexados.
+        """
+        return ReminderRepository._resync_reminders(db, Reminder.habit_id == habit_id)
+
+    @staticmethod
+    def sync_user_reminders(db: Session, user_id: int) -> int:
+        """
+        Reindexa no despachante os lembretes de um usuário (id interno), por
+        exemplo após a troca de fuso. Retorna quantos ficaram indexados.
+        """
+        return ReminderRepository._resync_reminders(db, Reminder.user_id == user_id)
+
+    @staticmethod
+    def get_active_reminder_schedule(db: Session) -> list[tuple]:
+        """Busca os lembretes ativos com os dados de envio numa única consulta"""
+        try:
+            return db.execute(ReminderRepository._active_reminder_schedule_query()).all()
+        except Exception as e:
+            logger.error(f"Erro ao buscar agenda de lembretes: {e}")
+            raise RepositoryError(f"Erro interno: {e}")
+
+    @staticmethod
+    def iter_active_reminder_schedule(db: Session, batch_size: int = 1000) -> Iterator[list[tuple]]:
+        """
+        Percorre os lembretes ativos em lotes de ``batch_size`` linhas com
+        ``yield_per`` (cursor no servidor no PostgreSQL): a memória fica
+        limitada a um lote, independente do tamanho da tabela.
+        """
+        try:
+            result = db.execute(
+                ReminderRepository._active_reminder_schedule_query().execution_options(
+                    yield_per=batch_size
+                )
+            )
+            for partition in result.partitions():
+                yield partition
+        except Exception as e:
+            logger.error(f"Erro ao percorrer agenda de lembretes: {e}")
+            raise RepositoryError(f"Erro interno: {e}")
+
+
+class AsyncHabitRepository:
+    """
+    Variante assíncrona de HabitRepository para uso com AsyncSession.
+
+    Reaproveita a lógica síncrona via ``AsyncSession.run_sync``, de modo que o
+    I/O passa pelo driver assíncrono (asyncpg/aiosqlite) sem bloquear o loop.
+    """
+
+    @staticmethod
+    async def create_habit(db: AsyncSession, user_id: int, name: str, **kwargs) -> Habit:
+        return await db.run_sync(HabitRepository.create_habit, user_id, name, **kwargs)
+
+    @staticmethod
+    async def get_habits(db: AsyncSession, user_id: int, active_only: bool = True) -> list[HabitRecord]:
+        return await db.run_sync(HabitRepository.get_habits, user_id, active_only)
+
+    @staticmethod
+    async def get_habit(db: AsyncSession, habit_id: int, user_id: int) -> Optional[Habit]:
+        return await db.run_sync(HabitRepository.get_habit, habit_id, user_id)
+
+    @staticmethod
+    async def update_habit(db: AsyncSession, habit_id: int, user_id: int, **kwargs) -> Optional[Habit]:
+        return await db.run_sync(HabitRepository.update_habit, habit_id, user_id, **kwargs)
+
+    @staticmethod
+    async def delete_habit(db: AsyncSession, habit_id: int, user_id: int) -> bool:
+        return await db.run_sync(HabitRepository.delete_habit, habit_id, user_id)
+
+    @staticmethod
+    async def toggle_habit(db: AsyncSession, habit_id: int, user_id: int) -> Optional[Habit]:
+        return await db.run_sync(HabitRepository.toggle_habit, habit_id, user_id)
+
+
+class AsyncReminderRepository:
+    """Variante assíncrona de ReminderRepository para uso com AsyncSession"""
+
+    @staticmethod
+    async def create_reminder(
+        db: AsyncSession, user_id: int, habit_id: int, time: str, days: str, **kwargs
+    ) -> Reminder:
+        return await db.run_sync(
+            ReminderRepository.create_reminder, user_id, habit_id, time, days, **kwargs
+        )
+
+    @staticmethod
+    async def get_reminders(db: AsyncSession, user_id: int) -> list[Reminder]:
+        return await db.run_sync(ReminderRepository.get_reminders, user_id)
+
+    @staticmethod
+    async def get_reminder(db: AsyncSession, user_id: int, habit_id: int) -> Optional[Reminder]:
+        return await db.run_sync(ReminderRepository.get_reminder, user_id, habit_id)
+
+    @staticmethod
+    async def delete_reminder(db: AsyncSession, user_id: int, habit_id: int) -> bool:
+        return await db.run_sync(ReminderRepository.delete_reminder, user_id, habit_id)
+
+    @staticmethod
+    async def get_all_active_reminders(db: AsyncSession) -> list[Reminder]:
+        return await db.run_sync(ReminderRepository.get_all_active_reminders)
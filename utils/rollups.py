@@ -0,0 +1,100 @@
+"""
+Rollups diários por usuário (tabela ``daily_rollups``)
+
+Cada conclusão soma uma linha (usuário, dia local) com conclusões e XP, e a
+avaliação do dia grava humor/energia na mesma linha. Resumos semanais e
+mensais agregam essas linhas no SQL: o custo é proporcional aos dias do
+período, não à quantidade de logs.
+"""
+
+from datetime import date
+from typing import Any, Dict, Optional
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models.models import DailyRollup
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Dialetos com INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def _upsert(db: Session, user_id: int, day: date, values: Dict[str, Any], changes: Dict[str, Any]):
+    """Insere a linha do dia com ``values`` ou aplica ``changes`` se já existir"""
+    dialect_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        db.execute(
+            dialect_insert(DailyRollup)
+            .values(user_id=user_id, day=day, **values)
+            .on_conflict_do_update(index_elements=["user_id", "day"], set_=changes)
+        )
+        return
+
+    updated = db.execute(
+        update(DailyRollup)
+        .where(DailyRollup.user_id == user_id, DailyRollup.day == day)
+        .values(**changes)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not updated:
+        db.execute(insert(DailyRollup).values(user_id=user_id, day=day, **values))
+
+
+def record_completion_rollup(db: Session, user_id: int, day: date, completions: int, xp_earned: int):
+    """Soma conclusões/XP ao rollup do dia (na transação da conclusão, sem commit)"""
+    _upsert(
+        db,
+        user_id,
+        day,
+        {"completions": completions, "xp_earned": xp_earned},
+        {
+            "completions": DailyRollup.completions + completions,
+            "xp_earned": DailyRollup.xp_earned + xp_earned,
+        },
+    )
+
+
+def record_rating_rollup(db: Session, user_id: int, day: date, mood_rating: float, energy_rating: float):
+    """Grava a avaliação do dia no rollup (sem commit)"""
+    ratings = {"mood_rating": mood_rating, "energy_rating": energy_rating}
+    _upsert(db, user_id, day, {"completions": 0, "xp_earned": 0, **ratings}, ratings)
+
+
+def get_rollup_summary(
+    db: Session, user_id: int, start: date, end: Optional[date] = None
+) -> Dict[str, Any]:
+    """Totais e médias do período [start, end] agregados no SQL"""
+    criteria = [DailyRollup.user_id == user_id, DailyRollup.day >= start]
+    if end is not None:
+        criteria.append(DailyRollup.day <= end)
+
+    row = db.execute(
+        select(
+            func.coalesce(func.sum(DailyRollup.completions), 0).label("total_completed"),
+            func.coalesce(func.sum(DailyRollup.xp_earned), 0).label("total_xp_earned"),
+            func.count(case((DailyRollup.completions > 0, 1))).label("active_days"),
+            func.avg(DailyRollup.mood_rating).label("avg_mood"),
+            func.avg(DailyRollup.energy_rating).label("avg_energy"),
+        ).where(*criteria)
+    ).one()
+
+    best_day = db.execute(
+        select(DailyRollup.day, DailyRollup.completions)
+        .where(*criteria, DailyRollup.completions > 0)
+        .order_by(DailyRollup.completions.desc(), DailyRollup.day.desc())
+        .limit(1)
+    ).first()
+
+    return {
+        "total_completed": row.total_completed,
+        "total_xp_earned": row.total_xp_earned,
+        "active_days": row.active_days,
+        "avg_mood": round(row.avg_mood or 0, 1),
+        "avg_energy": round(row.avg_energy or 0, 1),
+        "best_day": best_day.day if best_day else None,
+        "best_day_completions": best_day.completions if best_day else 0,
+    }
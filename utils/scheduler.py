@@ -3,35 +3,37 @@ Scheduler para tarefas automáticas
 """
 
 import asyncio
+import time
 from asyncio import create_subprocess_shell
+from datetime import datetime, timezone as dt_timezone
+from typing import Optional
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
-from app_types import CALLBACK_VERSION
 from config import APP_ENV
 from utils.logging_config import get_logger
+from utils.observability import log_metric
+from utils.outbox import outbox
+from utils.reminders import reminder_dispatcher
+from utils.tracing import traced
+from utils.weekdays import days_to_mask
 
 logger = get_logger(__name__)
 
-# Scheduler global
-scheduler = AsyncIOScheduler()
-
-
-def create_job_id(reminder_id: int) -> str:
-    """Cria job_id único para lembretes"""
-    return f"reminder_{CALLBACK_VERSION}_{reminder_id}"
+# Linhas lidas por lote na carga de lembretes do startup
+REMINDER_LOAD_BATCH_SIZE = 1000
 
+# Resultado da última carga de lembretes (para o status do scheduler)
+_reminders_startup = {}
 
-async def send_habit_reminder(user_id: int, habit_id: int, habit_name: str):
-    """Envia lembrete de hábito para o usuário"""
-    try:
-        logger.info(f"Enviando lembrete para usuário {user_id}, hábito {habit_id}")
+# Scheduler global
+scheduler = AsyncIOScheduler()
 
-        # Importa aqui para evitar circular imports
-        from bot.main import application
 
-        message = f"""
+async def send_habit_reminder(user_id: int, habit_id: int, habit_name: str) -> bool:
+    """Envia lembrete de hábito para o usuário (pela fila de envio)"""
+    message = f"""
 ⏰ *Lembrete de Hábito*
 
 🎯 *{habit_name}*
@@ -41,51 +43,25 @@ Hora de completar seu hábito!
 Use /habit para marcar como completo.
 """
 
-        await application.bot.send_message(
-            chat_id=user_id,
-            text=message,
-            parse_mode="Markdown"
-        )
-
-        logger.info(f"Lembrete enviado com sucesso para usuário {user_id}")
-
-    except Exception as e:
-        logger.error(f"Erro ao enviar lembrete para usuário {user_id}: {e}")
-
-
-def schedule_habit_reminder(reminder_id: int, user_id: int, habit_id: int, habit_name: str, time: str, days: str):
-    """Agenda um lembrete de hábito com job_id idempotente"""
+    delivered = await outbox.send(user_id, message, parse_mode="Markdown")
+    if not delivered:
+        logger.error(f"Erro ao enviar lembrete para usuário {user_id}, hábito {habit_id}")
+    return delivered
+
+
+def schedule_habit_reminder(
+    reminder_id: int,
+    user_id: int,
+    habit_id: int,
+    habit_name: str,
+    time: str,
+    days: str,
+    timezone: Optional[str] = None,
+):
+    """Agenda (ou reagenda) um lembrete no despachante"""
     try:
-        # Parse time (HH:MM)
-        hour, minute = map(int, time.split(':'))
-
-        # Parse days (1,2,3,4,5 -> [1,2,3,4,5])
-        day_list = [int(d) for d in days.split(',')]
-
-        # Cria job_id único e idempotente
-        job_id = create_job_id(reminder_id)
-
-        # Remove job existente se houver
-        try:
-            scheduler.remove_job(job_id)
-            logger.info(f"Job existente removido: {job_id}")
-        except:
-            pass
-
-        # Adiciona novo job
-        scheduler.add_job(
-            lambda: asyncio.create_task(send_habit_reminder(user_id, habit_id, habit_name)),
-            CronTrigger(
-                day_of_week=day_list,
-                hour=hour,
-                minute=minute
-            ),
-            id=job_id,
-            name=f"Lembrete {habit_name}",
-            replace_existing=True
-        )
-
-        logger.info(f"Lembrete agendado: {job_id} - {habit_name} às {time} nos dias {days}")
+        reminder_dispatcher.add(reminder_id, user_id, habit_id, habit_name, time, days_to_mask(days), timezone)
+        logger.info(f"Lembrete agendado: {reminder_id} - {habit_name} às {time} nos dias {days}")
 
     except Exception as e:
         logger.error(f"Erro ao agendar lembrete {reminder_id}: {e}")
@@ -93,42 +69,55 @@ def schedule_habit_reminder(reminder_id: int, user_id: int, habit_id: int, habit
 
 def remove_habit_reminder(reminder_id: int):
     """Remove um lembrete de hábito"""
-    try:
-        job_id = create_job_id(reminder_id)
-        scheduler.remove_job(job_id)
-        logger.info(f"Lembrete removido: {job_id}")
-    except Exception as e:
-        logger.error(f"Erro ao remover lembrete {reminder_id}: {e}")
+    if reminder_dispatcher.remove(reminder_id):
+        logger.info(f"Lembrete removido: {reminder_id}")
 
 
-def load_all_reminders_on_startup():
-    """Carrega todos os lembretes ativos no startup"""
+def load_all_reminders_on_startup(batch_size: int = REMINDER_LOAD_BATCH_SIZE) -> dict:
+    """
+    Carrega os lembretes ativos no despachante em lotes, lendo-os em
+    streaming numa única consulta, e reporta o tempo de carga
+    """
+    started = time.perf_counter()
+    loaded = batches = 0
     try:
         from db.session import SessionLocal
         from utils.repository import ReminderRepository
 
+        reminder_dispatcher.clear()
         with SessionLocal() as db:
-            reminders = ReminderRepository.get_all_active_reminders(db)
-
-            for reminder in reminders:
-                try:
-                    schedule_habit_reminder(
-                        reminder.id,
-                        reminder.user.telegram_user_id,
-                        reminder.habit_id,
-                        reminder.habit.name,
-                        reminder.time,
-                        reminder.days
-                    )
-                except Exception as e:
-                    logger.error(f"Erro ao agendar lembrete {reminder.id}: {e}")
-
-            logger.info(f"Carregados {len(reminders)} lembretes no startup")
+            for batch in ReminderRepository.iter_active_reminder_schedule(db, batch_size):
+                loaded += reminder_dispatcher.add_many(batch)
+                batches += 1
 
     except Exception as e:
         logger.error(f"Erro ao carregar lembretes no startup: {e}")
 
+    duration_ms = (time.perf_counter() - started) * 1000
+    _reminders_startup.update(loaded=loaded, batches=batches, duration_ms=round(duration_ms, 1))
+    log_metric("reminders_startup_ms", round(duration_ms, 1), {"loaded": str(loaded)})
+    logger.info(f"Carregados {loaded} lembretes no startup em {duration_ms:.0f} ms ({batches} lotes)")
+    return dict(_reminders_startup)
+
+
+@traced("job dispatch_reminders")
+async def dispatch_reminders():
+    """Envia os lembretes do minuto atual (e dos minutos perdidos)"""
+    try:
+        batch = reminder_dispatcher.collect(datetime.now(dt_timezone.utc))
+        if not batch:
+            return
+
+        results = await asyncio.gather(*(
+            send_habit_reminder(entry.chat_id, entry.habit_id, entry.habit_name) for entry in batch
+        ))
+        logger.info(f"⏰ {sum(results)}/{len(batch)} lembretes enviados")
 
+    except Exception as e:
+        logger.error(f"❌ Erro ao despachar lembretes: {e}")
+
+
+@traced("job backup_now")
 async def backup_now():
     """Executa backup manual"""
     try:
@@ -153,6 +142,7 @@ async def backup_now():
     except Exception as e:
         logger.error(f"❌ Erro ao executar backup: {e}")
 
+@traced("job cleanup_old_data")
 async def cleanup_old_data():
     """Limpa dados antigos (callbacks processados)"""
     try:
@@ -171,6 +161,7 @@ async def cleanup_old_data():
     except Exception as e:
         logger.error(f"❌ Erro na limpeza de dados: {e}")
 
+@traced("job health_check")
 async def health_check():
     """Verificação de saúde periódica"""
     try:
@@ -189,6 +180,36 @@ async def health_check():
     except Exception as e:
         logger.error(f"❌ Health check periódico falhou: {e}")
 
+# Fuso -> último dia local com virada de streaks processada
+_streak_rollover_days = {}
+
+
+@traced("job rollover_streaks")
+async def rollover_streaks():
+    """Zera em lote os streaks quebrados dos fusos que viraram o dia"""
+    try:
+        from db.session import run_db
+        from utils.gamification import reset_broken_streaks
+
+        reset = await run_db(reset_broken_streaks, _streak_rollover_days)
+        logger.info(f"🔁 Virada de streaks concluída ({reset} zerados)")
+
+    except Exception as e:
+        logger.error(f"❌ Erro na virada de streaks: {e}")
+
+@traced("job reconcile_user_stats")
+async def reconcile_user_stats():
+    """Reconcilia os agregados materializados de estatísticas"""
+    try:
+        from db.session import run_db
+        from utils.user_stats import refresh_all_user_stats
+
+        await run_db(refresh_all_user_stats)
+        logger.info("✅ Reconciliação de estatísticas concluída")
+
+    except Exception as e:
+        logger.error(f"❌ Erro na reconciliação de estatísticas: {e}")
+
 def init_scheduler(app):
     """Inicializa o scheduler com as tarefas"""
 
@@ -224,6 +245,34 @@ def init_scheduler(app):
             replace_existing=True
         )
 
+        # Virada de streaks a cada 15 min: cada fuso (inclusive os de
+        # meia hora) é processado uma vez, logo após a meia-noite local
+        scheduler.add_job(
+            lambda: app.create_task(rollover_streaks()),
+            CronTrigger(minute='*/15'),
+            id='streak_rollover',
+            name='Virada de Streaks',
+            replace_existing=True
+        )
+
+        # Despachante de lembretes: um único job por minuto para todos
+        scheduler.add_job(
+            lambda: app.create_task(dispatch_reminders()),
+            CronTrigger(minute='*'),
+            id='reminder_dispatch',
+            name='Despachante de Lembretes',
+            replace_existing=True
+        )
+
+        # Reconciliação diária dos agregados de estatísticas às 3h30
+        scheduler.add_job(
+            lambda: app.create_task(reconcile_user_stats()),
+            CronTrigger(hour=3, minute=30),
+            id='user_stats_reconcile',
+            name='Reconciliação de Estatísticas',
+            replace_existing=True
+        )
+
         # Iniciar scheduler
         scheduler.start()
         logger.info("🚀 Scheduler iniciado com sucesso")
@@ -252,6 +301,9 @@ def get_scheduler_status():
     return {
         "running": scheduler.running,
         "jobs_count": len(scheduler.get_jobs()),
+        "reminders_count": len(reminder_dispatcher),
+        "reminders_startup": dict(_reminders_startup),
+        "outbox": outbox.stats(),
         "jobs": [
             {
                 "id": job.id,
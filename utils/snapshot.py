@@ -0,0 +1,257 @@
+"""
+Snapshot diário ("hoje") por usuário para menus e telas de progresso
+
+Guarda no cache, por usuário e por dia, os hábitos ativos, o conjunto de
+hábitos completados hoje e os totais de XP/nível/streak. As telas de
+navegação leem o snapshot sem tocar no banco; os caminhos de escrita
+(conclusão e CRUD) o mantêm atualizado, e ele expira à meia-noite do fuso
+do usuário.
+"""
+
+import dataclasses
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import Session
+
+from app_types import HabitRecord
+from models.models import DailyLog, Habit, User
+from utils.cache import (
+    cache,
+    get_today_snapshot_cache_key,
+    invalidate_user_cache,
+    register_cache_type,
+)
+from utils.day_boundary import local_day
+from utils.gamification import get_level_info
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_HABIT_RECORD_FIELDS = tuple(HabitRecord.__dataclass_fields__)
+
+
+@register_cache_type
+@dataclass(frozen=True, slots=True)
+class TodaySnapshot:
+    """Estado do dia de um usuário (imutável; atualizações criam outro)"""
+    user_id: int
+    telegram_user_id: int
+    timezone: str
+    day: date
+    habits: tuple[HabitRecord, ...]
+    completed: frozenset[int]
+    total_habits: int
+    xp_today: int
+    total_xp: int
+    current_level: int
+    current_streak: int
+    longest_streak: int
+    days_since_start: int
+    daily_goal: int
+
+    @property
+    def completed_count(self) -> int:
+        return len(self.completed)
+
+    def is_completed(self, habit_id: int) -> bool:
+        """Verifica se o hábito foi completado hoje"""
+        return habit_id in self.completed
+
+    def to_progress(self, goal: Optional[int] = None) -> Dict[str, Any]:
+        """Progresso do dia no formato de ``get_daily_progress``"""
+        goal = len(self.habits) if goal is None else goal
+        completed = self.completed_count
+
+        return {
+            "completed": completed,
+            "goal": goal,
+            "progress": (completed / goal * 100) if goal > 0 else 0,
+            "remaining": max(0, goal - completed),
+            "xp_earned": self.xp_today,
+            "habits": [
+                {
+                    "id": h.id,
+                    "name": h.name,
+                    "xp_reward": h.xp_reward,
+                    "completed": h.id in self.completed,
+                }
+                for h in self.habits
+            ],
+            "completed_habits": [h.name for h in self.habits if h.id in self.completed],
+        }
+
+    def to_stats(self) -> Dict[str, Any]:
+        """Estatísticas gerais no formato usado pelas telas de progresso"""
+        level_info = get_level_info(self.total_xp)
+        return {
+            "current_level": self.current_level,
+            "total_xp_earned": self.total_xp,
+            "current_streak": self.current_streak,
+            "longest_streak": self.longest_streak,
+            "days_since_start": self.days_since_start,
+            "habits_completed_today": self.completed_count,
+            "total_habits": self.total_habits,
+            "active_habits": len(self.habits),
+            "level_progress": level_info.progress,
+            "next_level_xp": level_info.xp_for_level,
+            "current_level_xp": level_info.xp_into_level,
+            "xp_to_next_level": level_info.xp_to_next_level,
+        }
+
+
+def _store(snapshot: TodaySnapshot) -> None:
+    window = local_day(snapshot.timezone)
+    if window.day != snapshot.day:
+        return
+
+    # Expira na meia-noite local do usuário
+    cache.set(
+        get_today_snapshot_cache_key(snapshot.telegram_user_id),
+        snapshot,
+        window.seconds_remaining(),
+        user_id=snapshot.telegram_user_id,
+    )
+
+
+def build_today_snapshot(db: Session, telegram_user_id: int) -> Optional[TodaySnapshot]:
+    """Monta o snapshot a partir do banco (usuário + hábitos com logs de hoje)"""
+    user = db.execute(
+        select(
+            User.id,
+            User.timezone,
+            User.total_xp_earned,
+            User.current_level,
+            User.current_streak,
+            User.longest_streak,
+            User.days_since_start,
+            User.daily_goal,
+        ).where(User.telegram_user_id == telegram_user_id)
+    ).first()
+    if user is None:
+        return None
+
+    today = local_day(user.timezone).day
+
+    rows = db.execute(
+        select(
+            *(getattr(Habit, field) for field in _HABIT_RECORD_FIELDS),
+            func.count(DailyLog.id).label("completed_count"),
+            func.coalesce(func.sum(DailyLog.xp_earned), 0).label("xp_today"),
+        )
+        .outerjoin(
+            DailyLog,
+            and_(
+                DailyLog.habit_id == Habit.id,
+                DailyLog.user_id == user.id,
+                DailyLog.log_date == today,
+                DailyLog.completed == True,
+            ),
+        )
+        .where(Habit.user_id == user.id)
+        .group_by(Habit.id)
+        .order_by(Habit.id)
+    ).all()
+
+    field_count = len(_HABIT_RECORD_FIELDS)
+    habits = []
+    completed = set()
+    xp_today = 0
+    for row in rows:
+        if row.completed_count:
+            completed.add(row.id)
+            xp_today += row.xp_today
+        if row.is_active:
+            habits.append(HabitRecord(*row[:field_count]))
+
+    return TodaySnapshot(
+        user_id=user.id,
+        telegram_user_id=telegram_user_id,
+        timezone=user.timezone,
+        day=today,
+        habits=tuple(habits),
+        completed=frozenset(completed),
+        total_habits=len(rows),
+        xp_today=xp_today,
+        total_xp=user.total_xp_earned or 0,
+        current_level=user.current_level or 1,
+        current_streak=user.current_streak or 0,
+        longest_streak=user.longest_streak or 0,
+        days_since_start=user.days_since_start or 0,
+        daily_goal=user.daily_goal or 0,
+    )
+
+
+def peek_today_snapshot(telegram_user_id: int) -> Optional[TodaySnapshot]:
+    """Retorna o snapshot de hoje apenas se já estiver no cache"""
+    snapshot = cache.get(get_today_snapshot_cache_key(telegram_user_id))
+    if snapshot is None or snapshot.day != local_day(snapshot.timezone).day:
+        return None
+    return snapshot
+
+
+def load_today_snapshot(db: Session, telegram_user_id: int) -> Optional[TodaySnapshot]:
+    """Retorna o snapshot de hoje do cache ou o monta a partir do banco"""
+    snapshot = peek_today_snapshot(telegram_user_id)
+    if snapshot is not None:
+        return snapshot
+
+    snapshot = build_today_snapshot(db, telegram_user_id)
+    if snapshot is not None:
+        _store(snapshot)
+    return snapshot
+
+
+async def get_today_snapshot(telegram_user_id: int) -> Optional[TodaySnapshot]:
+    """Versão para handlers: só acessa o banco (fora do event loop) em cache miss"""
+    snapshot = peek_today_snapshot(telegram_user_id)
+    if snapshot is not None:
+        return snapshot
+
+    from db.session import run_db
+
+    return await run_db(load_today_snapshot, telegram_user_id)
+
+
+def record_completions(
+    telegram_user_id: int, completed: Dict[int, Dict[str, int]], progress: Dict[str, Any]
+) -> None:
+    """
+    Write-through após conclusões: invalida o cache do usuário e regrava o
+    snapshot de hoje (se existir) com os novos totais, sem consultar o banco.
+
+    ``completed`` mapeia habit_id -> {xp_earned, current_streak,
+    total_completions}; ``progress`` é o retorno de ``_apply_user_progress``.
+    """
+    snapshot = peek_today_snapshot(telegram_user_id)
+    invalidate_user_cache(telegram_user_id)
+
+    if snapshot is None:
+        return
+
+    habits = tuple(
+        dataclasses.replace(
+            habit,
+            current_streak=completed[habit.id]["current_streak"],
+            longest_streak=max(habit.longest_streak or 0, completed[habit.id]["current_streak"]),
+            total_completions=completed[habit.id]["total_completions"],
+        )
+        if habit.id in completed
+        else habit
+        for habit in snapshot.habits
+    )
+
+    _store(
+        dataclasses.replace(
+            snapshot,
+            habits=habits,
+            completed=snapshot.completed | frozenset(completed),
+            xp_today=snapshot.xp_today + sum(item["xp_earned"] for item in completed.values()),
+            total_xp=progress["total_xp"],
+            current_level=progress["new_level"],
+            current_streak=progress["current_streak"],
+            longest_streak=max(snapshot.longest_streak, progress["current_streak"]),
+        )
+    )
@@ -0,0 +1,384 @@
+"""
+Tracing leve por update (spans compatíveis com OpenTelemetry)
+
+Cada update tratado por ``safe_handler``/``track_command`` e cada job do
+scheduler abre um span raiz; consultas SQL (eventos do engine), chamadas à
+API do Telegram (``TracedRequest``) e envios da fila de saída viram spans
+filhos. O span corrente fica numa ``ContextVar``, copiada por
+``asyncio.to_thread`` para a thread de ``run_db``.
+
+A amostragem é decidida na raiz (``TRACING_SAMPLE_RATE``): traces não
+amostrados custam só a troca da ``ContextVar`` e nenhum span filho é criado.
+Os spans concluídos vão para uma fila limitada consumida por uma thread,
+que grava lotes no formato OTLP/JSON (uma requisição
+``ExportTraceServiceRequest`` por linha) em ``TRACING_FILE`` e, se
+configurado, envia ao coletor OTLP/HTTP em ``TRACING_OTLP_ENDPOINT``.
+"""
+
+import functools
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from telegram.request import HTTPXRequest
+
+from config import (
+    APP_ENV,
+    APP_VERSION,
+    TRACING_FILE,
+    TRACING_OTLP_ENDPOINT,
+    TRACING_SAMPLE_RATE,
+)
+from utils.logging_config import get_logger
+from utils.observability import increment_metric
+
+logger = get_logger(__name__)
+
+SERVICE_NAME = "habit-bot"
+
+# SpanKind do OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+SPAN_KIND_CONSUMER = 5
+
+# Status do OTLP
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Spans aguardando exportação (excedente é descartado)
+EXPORT_QUEUE_SIZE = 10_000
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL_S = 2.0
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class Span:
+    """Span amostrado (gravado e exportado ao terminar)"""
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "name", "kind",
+        "start_ns", "end_ns", "attributes", "events", "status", "status_message",
+    )
+    recording = True
+
+    def __init__(self, name: str, kind: int, trace_id: str, parent_id: str = "", attributes=None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status = 0
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException):
+        """Marca o span com erro e registra o evento ``exception``"""
+        self.status = STATUS_ERROR
+        self.status_message = str(error)[:200]
+        self.events.append({
+            "timeUnixNano": str(time.time_ns()),
+            "name": "exception",
+            "attributes": [
+                _attribute("exception.type", type(error).__name__),
+                _attribute("exception.message", str(error)[:500]),
+            ],
+        })
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.events:
+            span["events"] = self.events
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+
+class _NonRecordingSpan:
+    """Span de trace não amostrado: todas as operações são no-op"""
+    recording = False
+    trace_id = span_id = ""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def record_exception(self, error: BaseException):
+        pass
+
+
+NON_RECORDING_SPAN = _NonRecordingSpan()
+
+
+class SpanExporter:
+    """Exporta spans em lotes numa thread (arquivo JSONL e/ou coletor OTLP/HTTP)"""
+
+    def __init__(
+        self,
+        path: Optional[str] = TRACING_FILE,
+        endpoint: Optional[str] = TRACING_OTLP_ENDPOINT,
+        max_queue: int = EXPORT_QUEUE_SIZE,
+        batch_size: int = EXPORT_BATCH_SIZE,
+        interval_s: float = EXPORT_INTERVAL_S,
+    ):
+        self.path = path
+        self.endpoint = endpoint
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._resource = {
+            "attributes": [
+                _attribute("service.name", SERVICE_NAME),
+                _attribute("service.version", APP_VERSION),
+                _attribute("deployment.environment", APP_ENV),
+            ]
+        }
+
+    def export(self, span: Span):
+        """Enfileira um span concluído (não bloqueia; descarta se a fila estiver cheia)"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            increment_metric("trace_spans_dropped")
+
+    def flush(self):
+        """Grava imediatamente os spans pendentes"""
+        batch = []
+        while True:
+            try:
+                span = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if span is not None:
+                batch.append(span)
+        self._write(batch)
+
+    def shutdown(self):
+        """Para a thread de exportação gravando o que estiver pendente"""
+        thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.interval_s
+            while len(batch) < self.batch_size:
+                try:
+                    span = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if span is None:
+                    self._write(batch)
+                    return
+                batch.append(span)
+            self._write(batch)
+
+    def _payload(self, batch: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": self._resource,
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [span.to_otlp() for span in batch],
+                }],
+            }]
+        }
+
+    def _write(self, batch: List[Span]):
+        if not batch:
+            return
+        body = json.dumps(self._payload(batch), ensure_ascii=False, separators=(",", ":"))
+        try:
+            if self.path:
+                with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                    f.write(body + "\n")
+            if self.endpoint:
+                request = urllib.request.Request(
+                    self.endpoint,
+                    data=body.encode("utf-8"),
+                    headers={"Content-Type": "application/json"},
+                    method="POST",
+                )
+                urllib.request.urlopen(request, timeout=5).close()
+            increment_metric("trace_spans_exported", len(batch))
+        except Exception as e:
+            increment_metric("trace_spans_dropped", len(batch))
+            logger.warning(f"Erro ao exportar {len(batch)} spans: {e}")
+
+
+_current: ContextVar[Optional[Any]] = ContextVar("trace_span", default=None)
+
+
+def current_span():
+    """Span em execução (None fora de um trace)"""
+    return _current.get()
+
+
+def is_recording() -> bool:
+    """Indica se há um span amostrado em execução"""
+    span = _current.get()
+    return span is not None and span.recording
+
+
+class Tracer:
+    """Cria spans com amostragem na raiz e os entrega ao exportador"""
+
+    def __init__(self, sample_rate: float = TRACING_SAMPLE_RATE, exporter=None, rng: Callable[[], float] = random.random):
+        self.sample_rate = sample_rate
+        self.exporter = exporter if exporter is not None else SpanExporter()
+        self._rng = rng
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def _start(self, name: str, kind: int, attributes, root: bool, parent):
+        if parent is None:
+            parent = _current.get()
+        if parent is None:
+            if not root or not self.enabled or self._rng() >= self.sample_rate:
+                return NON_RECORDING_SPAN
+            increment_metric("traces_sampled")
+            return Span(name, kind, os.urandom(16).hex(), attributes=attributes)
+        if not parent.recording:
+            return NON_RECORDING_SPAN
+        return Span(name, kind, parent.trace_id, parent.span_id, attributes)
+
+    def _end(self, span: Span, end_ns: Optional[int] = None):
+        span.end_ns = end_ns or time.time_ns()
+        if not span.status:
+            span.status = STATUS_OK
+        self.exporter.export(span)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        root: bool = True,
+        parent=None,
+    ) -> Iterator[Any]:
+        """
+        Abre um span filho do corrente (ou de ``parent``). Sem span corrente
+        abre uma raiz sujeita à amostragem; com ``root=False`` só grava
+        dentro de um trace já amostrado.
+        """
+        if not self.enabled:
+            yield NON_RECORDING_SPAN
+            return
+
+        span = self._start(name, kind, attributes, root, parent)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current.reset(token)
+            if span.recording:
+                self._end(span)
+
+    def record(self, name: str, start_ns: int, end_ns: int, kind: int = SPAN_KIND_INTERNAL, attributes=None):
+        """Registra um span já concluído como filho do corrente (se amostrado)"""
+        parent = _current.get()
+        if parent is None or not parent.recording:
+            return
+        span = Span(name, kind, parent.trace_id, parent.span_id, attributes)
+        span.start_ns = start_ns
+        self._end(span, end_ns)
+
+
+# Tracer global
+tracer = Tracer()
+
+
+def start_span(name: str, kind: int = SPAN_KIND_INTERNAL, attributes=None, root: bool = True, parent=None):
+    """Atalho para ``tracer.span``"""
+    return tracer.span(name, kind, attributes, root, parent)
+
+
+def record_span(name: str, start_ns: int, end_ns: int, kind: int = SPAN_KIND_INTERNAL, attributes=None):
+    """Atalho para ``tracer.record``"""
+    tracer.record(name, start_ns, end_ns, kind, attributes)
+
+
+def traced(name: Optional[str] = None, kind: int = SPAN_KIND_INTERNAL):
+    """Decorator que executa uma corrotina dentro de um span"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.span(span_name, kind):
+                return await func(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+def shutdown_tracing():
+    """Grava os spans pendentes (chamado no encerramento do bot)"""
+    if tracer.enabled:
+        tracer.exporter.shutdown()
+
+
+class TracedRequest(HTTPXRequest):
+    """Cliente HTTP do bot com um span por chamada à API do Telegram"""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        endpoint = url.rsplit("/", 1)[-1]
+        attributes = {"http.request.method": method, "telegram.method": endpoint}
+        with tracer.span(f"telegram {endpoint}", SPAN_KIND_CLIENT, attributes, root=False) as span:
+            status_code, payload = await super().do_request(url, method, *args, **kwargs)
+            span.set_attribute("http.response.status_code", status_code)
+            return status_code, payload
@@ -0,0 +1,165 @@
+"""
+Agregados materializados por usuário (tabela ``user_stats``)
+
+Contagens de hábitos, logs e badges usadas por /stats e /dashboard ficam em
+uma linha por usuário, atualizada por deltas nos caminhos de escrita
+(conclusão, CRUD de hábitos, concessão de badges) dentro da mesma transação.
+A linha é montada sob demanda se ainda não existir, e um job agendado
+reconcilia todas as linhas com as tabelas de origem.
+"""
+
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import case, exists, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models.models import Badge, DailyLog, Habit, User, UserStatsAggregate
+from utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _count(model, user_id, *criteria):
+    return (
+        select(func.count(model.id))
+        .where(model.user_id == user_id, *criteria)
+        .scalar_subquery()
+    )
+
+
+def _habit_counts(user_id):
+    return {
+        "total_habits": _count(Habit, user_id),
+        "active_habits": _count(Habit, user_id, Habit.is_active == True),
+    }
+
+
+def _aggregates(user_id, today):
+    """Contagens a partir das tabelas de origem (``user_id`` pode ser coluna)"""
+    return {
+        **_habit_counts(user_id),
+        "total_logs": _count(DailyLog, user_id),
+        "completed_logs": _count(DailyLog, user_id, DailyLog.completed == True),
+        "total_badges": _count(Badge, user_id),
+        "rare_badges": _count(Badge, user_id, Badge.is_rare == True),
+        "completed_today": _count(
+            DailyLog, user_id, DailyLog.log_date == today, DailyLog.completed == True
+        ),
+    }
+
+
+def rebuild_user_stats(db: Session, user_id: int, today: date) -> UserStatsAggregate:
+    """Recalcula a linha de agregados do usuário (sem commit)"""
+    aggregates = _aggregates(user_id, today)
+    row = db.execute(select(*(expr.label(name) for name, expr in aggregates.items()))).one()
+
+    return db.merge(
+        UserStatsAggregate(user_id=user_id, today_date=today, **row._asdict())
+    )
+
+
+def load_user_stats(
+    db: Session, user_id: int
+) -> Tuple[Optional[User], Optional[UserStatsAggregate]]:
+    """Usuário e seus agregados em uma leitura por chave primária"""
+    from utils.day_boundary import user_day
+
+    row = db.execute(
+        select(User, UserStatsAggregate)
+        .outerjoin(UserStatsAggregate, UserStatsAggregate.user_id == User.id)
+        .where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None, None
+
+    user, aggregate = row
+    if aggregate is None:
+        # Primeira leitura: monta a linha a partir das tabelas de origem
+        try:
+            aggregate = rebuild_user_stats(db, user_id, user_day(user).day)
+            db.commit()
+        except IntegrityError:
+            # Montada em paralelo por outra requisição
+            db.rollback()
+            aggregate = db.get(UserStatsAggregate, user_id)
+    return user, aggregate
+
+
+def today_completions(aggregate: UserStatsAggregate, today: date) -> int:
+    """Conclusões de hoje (zero se o contador ainda é de outro dia)"""
+    return aggregate.completed_today if aggregate.today_date == today else 0
+
+
+def record_completion_stats(db: Session, user_id: int, completions: int, today: date):
+    """Soma conclusões aos agregados (na transação da conclusão, sem commit)"""
+    db.execute(
+        update(UserStatsAggregate)
+        .where(UserStatsAggregate.user_id == user_id)
+        .values(
+            total_logs=UserStatsAggregate.total_logs + completions,
+            completed_logs=UserStatsAggregate.completed_logs + completions,
+            completed_today=case(
+                (
+                    UserStatsAggregate.today_date == today,
+                    UserStatsAggregate.completed_today + completions,
+                ),
+                else_=completions,
+            ),
+            today_date=today,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def record_badge_stats(db: Session, user_id: int, badges: int, rare: int):
+    """Soma badges concedidas aos agregados (sem commit)"""
+    db.execute(
+        update(UserStatsAggregate)
+        .where(UserStatsAggregate.user_id == user_id)
+        .values(
+            total_badges=UserStatsAggregate.total_badges + badges,
+            rare_badges=UserStatsAggregate.rare_badges + rare,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refresh_habit_counts(db: Session, user_id: int):
+    """Recontagem dos hábitos do usuário após CRUD (sem commit)"""
+    db.flush()
+    db.execute(
+        update(UserStatsAggregate)
+        .where(UserStatsAggregate.user_id == user_id)
+        .values(**_habit_counts(user_id))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refresh_all_user_stats(db: Session) -> int:
+    """
+    Reconcilia os agregados de todos os usuários com as tabelas de origem
+    (job agendado): cria as linhas ausentes e recalcula todas com um UPDATE
+    correlacionado. Retorna o número de linhas.
+    """
+    db.execute(
+        insert(UserStatsAggregate).from_select(
+            ["user_id"],
+            select(User.id).where(
+                ~exists().where(UserStatsAggregate.user_id == User.id)
+            ),
+        )
+    )
+
+    refreshed = db.execute(
+        update(UserStatsAggregate)
+        .values(
+            **_aggregates(UserStatsAggregate.user_id, UserStatsAggregate.today_date)
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+
+    logger.info(f"Agregados de {refreshed} usuários reconciliados")
+    return refreshed
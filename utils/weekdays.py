@@ -0,0 +1,68 @@
+"""
+Representação compacta dos dias da semana em bitmask
+
+Dias seguem a convenção do bot: 1=segunda ... 7=domingo. O bit do dia ``d``
+é ``1 << (d - 1)``; "todos os dias" é ``ALL_DAYS_MASK`` (127).
+"""
+
+from datetime import date, datetime
+from typing import Iterable, Optional, Union
+
+ALL_DAYS = "1,2,3,4,5,6,7"
+ALL_DAYS_MASK = 0b1111111
+
+# Nomes usados pelo CronTrigger do APScheduler (0=segunda)
+_CRON_DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+def day_bit(day: int) -> int:
+    """Retorna o bit de um dia (1=segunda, 7=domingo)"""
+    if not 1 <= day <= 7:
+        raise ValueError(f"Dia da semana inválido: {day}")
+    return 1 << (day - 1)
+
+
+def weekday_bit(when: Union[date, datetime, None] = None) -> int:
+    """Retorna o bit do dia da semana de uma data (padrão: hoje)"""
+    when = when or date.today()
+    return 1 << when.weekday()
+
+
+def parse_days(days: Optional[str]) -> list[int]:
+    """Converte "1,2,3" em [1, 2, 3] (None/vazio = todos os dias)"""
+    if not days or not days.strip():
+        return list(range(1, 8))
+    return [int(d) for d in days.replace(" ", "").split(",") if d]
+
+
+def days_to_mask(days: Union[str, Iterable[int], None]) -> int:
+    """Converte "1,2,3" (ou lista de dias) em bitmask"""
+    if days is None or isinstance(days, str):
+        days = parse_days(days)
+
+    mask = 0
+    for day in days:
+        mask |= day_bit(int(day))
+    return mask
+
+
+def mask_to_days(mask: int) -> str:
+    """Converte bitmask em "1,2,3" """
+    return ",".join(str(day) for day in mask_to_list(mask))
+
+
+def mask_to_list(mask: int) -> list[int]:
+    """Converte bitmask em lista de dias"""
+    return [day for day in range(1, 8) if mask & day_bit(day)]
+
+
+def is_scheduled(mask: Optional[int], when: Union[date, datetime, None] = None) -> bool:
+    """Verifica se o bitmask inclui o dia da semana informado"""
+    if mask is None:
+        return True
+    return bool(mask & weekday_bit(when))
+
+
+def mask_to_cron(mask: int) -> str:
+    """Converte bitmask para o day_of_week do CronTrigger ("mon,wed")"""
+    return ",".join(_CRON_DAY_NAMES[day - 1] for day in mask_to_list(mask))